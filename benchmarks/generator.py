@@ -0,0 +1,117 @@
+from dataclasses import dataclass
+from ipaddress import IPv4Address
+
+from pyecore.ecore import EObject
+
+from mc_openapi.bytes_uri import BytesURI
+from mc_openapi.doml_mc import DOMLVersion
+from mc_openapi.doml_mc.xmi_parser.doml_model import get_rset
+
+NS_PREFIX = "http://www.piacere-project.eu/doml/"
+
+
+@dataclass
+class ModelSize:
+    vms: int
+    networks: int
+    ifaces_per_vm: int
+    components: int
+    # Deployments are assigned to components round-robin, and their nodes
+    # to VMs, so components beyond the deployments are left undeployed.
+    deployments: int
+
+    @staticmethod
+    def from_elements(n_elements: int) -> "ModelSize":
+        """
+        Returns a size yielding roughly `n_elements` elements in the
+        intermediate model: each VM comes with an interface, a concrete VM,
+        a software component, its software interface and its deployment.
+        """
+        vms = max(1, n_elements // 6)
+        return ModelSize(
+            vms=vms,
+            networks=max(1, vms // 10),
+            ifaces_per_vm=1,
+            components=vms,
+            deployments=vms
+        )
+
+
+class _Factory:
+    def __init__(self, doml_version: DOMLVersion):
+        self.rset = get_rset(doml_version)
+
+    def __call__(self, package: str, cname: str, **kwargs) -> EObject:
+        eclass = self.rset.metamodel_registry[NS_PREFIX + package].getEClassifier(cname)
+        return eclass(**kwargs)
+
+
+def generate_model(doml_version: DOMLVersion, size: ModelSize) -> bytes:
+    """
+    Generates a DOMLX model of the given size satisfying all common
+    requirements: all VMs have an interface in the first network, every
+    component exposes an interface consumed by the next one, and all
+    abstract infrastructure elements are mapped to concrete ones.
+    """
+    mk = _Factory(doml_version)
+
+    model = mk("commons", "DOMLModel", name=f"bench_{size.vms}")
+    if doml_version != DOMLVersion.V1_0:
+        model.version = doml_version.value
+
+    infra = mk("infrastructure", "InfrastructureLayer", name="infra")
+    model.infrastructure = infra
+    network_class = infra.eClass.findEStructuralFeature("networks").eType.name
+    networks = []
+    for i in range(size.networks):
+        net = mk("infrastructure", network_class, name=f"net_{i}", protocol="tcp/ip", addressRange=f"10.{i % 256}.0.0/16")
+        infra.networks.append(net)
+        networks.append(net)
+
+    vms = []
+    addresses = iter(range(int(IPv4Address("10.0.0.1")), int(IPv4Address("10.255.255.255"))))
+    for i in range(size.vms):
+        vm = mk("infrastructure", "VirtualMachine", name=f"vm_{i}", os="ubuntu-20.04.3")
+        for j in range(size.ifaces_per_vm):
+            iface = mk("infrastructure", "NetworkInterface", name=f"vm_{i}_iface_{j}", endPoint=str(IPv4Address(next(addresses))))
+            iface.belongsTo = networks[0 if j == 0 else (i + j) % size.networks]
+            vm.ifaces.append(iface)
+        infra.nodes.append(vm)
+        vms.append(vm)
+
+    app = mk("application", "ApplicationLayer", name="app")
+    model.application = app
+    components = []
+    for i in range(size.components):
+        sc = mk("application", "SoftwareComponent", name=f"sc_{i}")
+        sc.exposedInterfaces.append(mk("application", "SoftwareInterface", name=f"sc_{i}_api", endPoint=f"/sc_{i}"))
+        if components:
+            sc.consumedInterfaces.append(components[-1].exposedInterfaces[0])
+        app.components.append(sc)
+        components.append(sc)
+
+    config = mk("commons", "Configuration", name="config")
+    model.configurations.append(config)
+    model.activeConfiguration = config
+    for i in range(size.deployments):
+        config.deployments.append(mk(
+            "commons", "Deployment",
+            component=components[i % size.components],
+            node=vms[i % size.vms]
+        ))
+
+    concr = mk("concrete", "ConcreteInfrastructure", name="concrete_infra")
+    model.concretizations.append(concr)
+    model.activeInfrastructure = concr
+    provider = mk("concrete", "RuntimeProvider", name="provider")
+    concr.providers.append(provider)
+    for vm in vms:
+        provider.vms.append(mk("concrete", "VirtualMachine", name=f"concrete_{vm.name}", maps=vm))
+    for net in networks:
+        provider.networks.append(mk("concrete", "Network", name=f"concrete_{net.name}", maps=net))
+
+    uri = BytesURI("bench.domlx")
+    resource = mk.rset.create_resource(uri)
+    resource.append(model)
+    resource.save()
+    return uri.getvalue()
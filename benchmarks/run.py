@@ -0,0 +1,147 @@
+"""
+Benchmarks the model checker on synthetic models of increasing size.
+
+Run with, e.g.::
+
+    python -m benchmarks.run --sizes 10 100 1000 --save baseline.json
+    python -m benchmarks.run --sizes 10 100 1000 --baseline baseline.json
+
+The second command exits with status 1 if some time regressed with respect
+to the saved baseline. With --startup, the time from importing the model
+checker to the end of the first check is measured in a fresh interpreter.
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+from mc_openapi.doml_mc import DOMLVersion, ModelChecker
+from mc_openapi.doml_mc.imc import Engine
+
+from .generator import ModelSize, generate_model
+
+
+def run_benchmark(
+    doml_version: DOMLVersion,
+    n_elements: int,
+    consistency_checks: bool,
+    engine: Engine,
+    timeout: int
+) -> dict:
+    xmi = generate_model(doml_version, ModelSize.from_elements(n_elements))
+    dmc = ModelChecker(xmi, doml_version)
+    results = dmc.check_common_requirements(
+        consistency_checks=consistency_checks, timeout=timeout, engine=engine
+    )
+    res, _ = results.summarize()
+    profile = results.profile
+    return {
+        "elements": len(dmc.intermediate_model),
+        "assertions": profile.assertions,
+        "result": res.name,
+        "phases": profile.phases,
+        "requirements": {req.name: req.time for req in profile.requirements},
+    }
+
+
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from mc_openapi.doml_mc import DOMLVersion, ModelChecker
+from mc_openapi.doml_mc.imc import Engine
+imported = time.perf_counter()
+dmc = ModelChecker(sys.stdin.buffer.read(), DOMLVersion(sys.argv[1]))
+res, _ = dmc.check_common_requirements(engine=Engine(sys.argv[2])).summarize()
+checked = time.perf_counter()
+print(json.dumps({"import": imported - start, "first_check": checked - imported, "result": res.name}))
+"""
+
+
+def run_startup_benchmark(doml_version: DOMLVersion, engine: Engine) -> dict:
+    xmi = generate_model(doml_version, ModelSize.from_elements(10))
+    out = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT, doml_version.value, engine.value],
+        input=xmi, capture_output=True, check=True
+    ).stdout
+    times = json.loads(out)
+    return {
+        "elements": None,
+        "assertions": None,
+        "result": times.pop("result"),
+        "phases": times,
+        "requirements": {},
+    }
+
+
+def compare(baseline: dict, current: dict, tolerance: float, min_delta: float) -> list[str]:
+    """
+    Returns a description of each time in `current` that is more than
+    `tolerance` (relative) and `min_delta` seconds slower than in `baseline`.
+    """
+    regressions = []
+    for key, run in current.items():
+        if key not in baseline:
+            continue
+        for section in ("phases", "requirements"):
+            for name, t in run[section].items():
+                old_t = baseline[key][section].get(name)
+                if old_t is not None and t > old_t * (1 + tolerance) and t - old_t > min_delta:
+                    regressions.append(f"{key} {name}: {old_t:.3f}s -> {t:.3f}s")
+        if run["result"] != baseline[key]["result"]:
+            regressions.append(f"{key}: result {baseline[key]['result']} -> {run['result']}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--versions", nargs="+", default=[v.value for v in DOMLVersion],
+                        choices=[v.value for v in DOMLVersion], help="DOML versions of the generated models")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10, 100, 1000, 5000],
+                        help="approximate numbers of elements of the generated models")
+    parser.add_argument("--consistency", action="store_true", help="also run with consistency checks")
+    parser.add_argument("--startup", action="store_true", help="also measure the time to the first check in a new process")
+    parser.add_argument("--engine", default=Engine.Z3.value, choices=[e.value for e in Engine])
+    parser.add_argument("--timeout", type=int, default=0, help="time budget of each check in seconds (0 for none)")
+    parser.add_argument("--save", help="save the results in this JSON file")
+    parser.add_argument("--baseline", help="compare the results with those saved in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="relative slowdown considered a regression")
+    parser.add_argument("--min-delta", type=float, default=0.05, help="slowdowns shorter than this many seconds are ignored")
+    args = parser.parse_args()
+
+    current = {}
+    for version in args.versions:
+        if args.startup:
+            key = f"{version}/startup"
+            run = run_startup_benchmark(DOMLVersion(version), Engine(args.engine))
+            current[key] = run
+            print(f"{key}: {run['result']}")
+            for name, t in run["phases"].items():
+                print(f"  {name:40} {t:8.3f}s")
+        for n_elements in args.sizes:
+            for consistency_checks in ([False, True] if args.consistency else [False]):
+                key = f"{version}/{n_elements}" + ("/consistency" if consistency_checks else "")
+                run = run_benchmark(DOMLVersion(version), n_elements, consistency_checks, Engine(args.engine), args.timeout)
+                current[key] = run
+                print(f"{key}: {run['elements']} elements, {run['assertions']} assertions, {run['result']}")
+                for name, t in run["phases"].items():
+                    print(f"  {name:40} {t:8.3f}s")
+                for name, t in run["requirements"].items():
+                    print(f"  {name:40} {t:8.3f}s")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(current, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, current, args.tolerance, args.min_delta)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,57 @@
+import os
+from functools import partial
+
 import connexion
 
+from .doml_mc.jobs import JobQueue
+from .doml_mc.portfolio import get_solver_configs
+from .doml_mc.result_cache import ResultCache
+from .doml_mc.session import SessionStore
+from .doml_mc.worker_pool import WorkerPool
+from .handlers import check_job, expired_job
+from .metrics import Metrics
+
 app = connexion.App(__name__, specification_dir='openapi/')
 app.add_api('model_checker.yaml')
 
 application = app.app
+
+# Worker processes shared by all requests, created once at startup.
+application.config["WORKER_POOL"] = WorkerPool(
+    size=int(os.environ.get("MC_POOL_SIZE", 2)),
+    max_tasks_per_worker=int(os.environ.get("MC_POOL_MAX_TASKS_PER_WORKER", 0)),
+    max_queue=int(os.environ.get("MC_POOL_MAX_QUEUE", 0))
+)
+
+# Whether models are also checked for consistency with the DOML metamodel.
+application.config["CONSISTENCY_CHECKS"] = os.environ.get("MC_CONSISTENCY_CHECKS", "false").lower() in ("1", "true", "yes")
+
+# Solver configurations racing on each requirement, if more than one.
+portfolio = [name.strip() for name in os.environ.get("MC_PORTFOLIO", "").split(",") if name.strip()]
+application.config["PORTFOLIO"] = get_solver_configs(portfolio) if len(portfolio) > 1 else None
+
+# Results of previous checks, looked up by model content.
+cache_size = int(os.environ.get("MC_CACHE_SIZE", 256))
+application.config["RESULT_CACHE"] = ResultCache(
+    max_size=cache_size,
+    db_path=os.environ.get("MC_CACHE_DB")
+) if cache_size > 0 else None
+
+# Models being edited, re-checked incrementally.
+application.config["SESSIONS"] = SessionStore(
+    max_sessions=int(os.environ.get("MC_MAX_SESSIONS", 64)),
+    ttl=float(os.environ.get("MC_SESSION_TTL", 3600))
+)
+
+# Checks run in the background for the /jobs endpoints.
+application.config["JOBS"] = JobQueue(
+    partial(check_job, application),
+    partial(expired_job, application),
+    workers=int(os.environ.get("MC_JOB_WORKERS", application.config["WORKER_POOL"].size)),
+    max_queue=int(os.environ.get("MC_JOB_MAX_QUEUE", 64)),
+    deadline=float(os.environ.get("MC_JOB_DEADLINE", 300)),
+    ttl=float(os.environ.get("MC_JOB_TTL", 600))
+)
+
+# Served in the Prometheus format by /metrics.
+application.config["METRICS"] = Metrics()
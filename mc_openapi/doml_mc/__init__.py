@@ -1,16 +1,11 @@
 from .mc import ModelChecker   # noqa: F401
 from .mc_result import MCResult, MCResults   # noqa: F401
 from .intermediate_model.metamodel import DOMLVersion, init_metamodels   # noqa: F401
-from .xmi_parser.doml_model import init_doml_rsets
-from .xmi_parser.special_parsers import init_special_parsers
+from .xmi_parser.doml_model import init_doml_rsets, init_eclass_indices   # noqa: F401
+from .xmi_parser.special_parsers import init_special_parsers   # noqa: F401
 
 __all__ = ["ModelChecker", "MCResult", "MCResults", "DOMLVersion"]
 
-# Load metamodels
-init_metamodels()
-
-# Load ecores
-init_doml_rsets()
-
-# Generate SpecialParsers
-init_special_parsers()
+# Metamodels, ecores and special parsers of each DOML version are loaded
+# the first time a model of that version is checked. The init_* functions
+# load them for all versions right away.
@@ -1,10 +1,47 @@
-from typing import TypeVar
-from collections.abc import Iterable
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, TypeVar
+from collections.abc import Iterable, Iterator
 
 
 _K = TypeVar("_K")
 _V = TypeVar("_V")
 
 
+# Loading an entry of a LazyDict may load entries of other LazyDicts.
+_lazy_lock = threading.RLock()
+
+
+class LazyDict(dict[_K, _V]):
+    """
+    A dict whose missing entries are loaded when first accessed with `[]`.
+    `load(key)` must add the entry for `key`, and may add entries to other
+    dicts loaded together with it.
+    """
+
+    def __init__(self, load: Callable[[_K], None]):
+        super().__init__()
+        self.load = load
+
+    def __missing__(self, key: _K) -> _V:
+        with _lazy_lock:
+            if not dict.__contains__(self, key):
+                self.load(key)
+        if not dict.__contains__(self, key):
+            raise KeyError(key)
+        return dict.get(self, key)
+
+
 def merge_dicts(it: Iterable[dict[_K, _V]]) -> dict[_K, _V]:
     return dict(kv for d in it for kv in d.items())
+
+
+@contextmanager
+def timed(times: dict[str, float], key: str) -> Iterator[None]:
+    """Adds the wall time spent in the block to `times[key]`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        times[key] = times.get(key, 0.0) + time.perf_counter() - start
@@ -1,3 +1,4 @@
+from collections.abc import Callable
 from typing import Optional
 
 from z3 import (
@@ -10,6 +11,7 @@ from .imc import (
     SMTEncoding, SMTSorts, Requirement, RequirementStore
 )
 from .intermediate_model import IntermediateModel, DOMLVersion
+from .model_graph import ModelGraph
 
 
 def get_consts(smtsorts: SMTSorts, consts: list[str]) -> list[ExprRef]:
@@ -180,6 +182,26 @@ def all_SoftwareComponents_deployed(smtenc: SMTEncoding, smtsorts: SMTSorts) ->
     )
 
 
+# (abstract element class, provider association, concrete element mapping)
+infrastructure_mappings = [
+    ("infrastructure_VirtualMachine", "concrete_RuntimeProvider::vms", "concrete_VirtualMachine::maps"),
+    ("infrastructure_Network", "concrete_RuntimeProvider::networks", "concrete_Network::maps"),
+    ("infrastructure_Storage", "concrete_RuntimeProvider::storages", "concrete_Storage::maps"),
+    ("infrastructure_FunctionAsAService", "concrete_RuntimeProvider::faas", "concrete_FunctionAsAService::maps"),
+]
+
+# (provider association, concrete element mapping)
+concrete_mappings = [
+    ("concrete_RuntimeProvider::vms", "concrete_VirtualMachine::maps"),
+    ("concrete_RuntimeProvider::vmImages", "concrete_VMImage::maps"),
+    ("concrete_RuntimeProvider::containerImages", "concrete_ContainerImage::maps"),
+    ("concrete_RuntimeProvider::networks", "concrete_Network::maps"),
+    ("concrete_RuntimeProvider::storages", "concrete_Storage::maps"),
+    ("concrete_RuntimeProvider::faas", "concrete_FunctionAsAService::maps"),
+    ("concrete_RuntimeProvider::group", "concrete_ComputingGroup::maps"),
+]
+
+
 def all_infrastructure_elements_deployed(smtenc: SMTEncoding, smtsorts: SMTSorts) -> ExprRef:
     def checkOneClass(ielem, concr, provider, celem, ielemClass, providerAssoc, celemAssoc):
         return And(
@@ -200,30 +222,10 @@ def all_infrastructure_elements_deployed(smtenc: SMTEncoding, smtsorts: SMTSorts
     return And(
         smtenc.element_class_fun(concr) == smtenc.classes["concrete_ConcreteInfrastructure"],
         Or(
-            checkOneClass(
-                ielem, concr, provider, celem,
-                "infrastructure_VirtualMachine",
-                "concrete_RuntimeProvider::vms",
-                "concrete_VirtualMachine::maps"
-            ),
-            checkOneClass(
-                ielem, concr, provider, celem,
-                "infrastructure_Network",
-                "concrete_RuntimeProvider::networks",
-                "concrete_Network::maps"
-            ),
-            checkOneClass(
-                ielem, concr, provider, celem,
-                "infrastructure_Storage",
-                "concrete_RuntimeProvider::storages",
-                "concrete_Storage::maps"
-            ),
-            checkOneClass(
-                ielem, concr, provider, celem,
-                "infrastructure_FunctionAsAService",
-                "concrete_RuntimeProvider::faas",
-                "concrete_FunctionAsAService::maps"
-            ),
+            *(
+                checkOneClass(ielem, concr, provider, celem, ielemClass, providerAssoc, celemAssoc)
+                for ielemClass, providerAssoc, celemAssoc in infrastructure_mappings
+            )
         )
     )
 
@@ -245,41 +247,10 @@ def all_concrete_map_something(smtenc: SMTEncoding, smtsorts: SMTSorts) -> ExprR
         smtenc.element_class_fun(concr) == smtenc.classes["concrete_ConcreteInfrastructure"],
         smtenc.association_rel(concr, smtenc.associations["concrete_ConcreteInfrastructure::providers"], provider),
         Or(
-            checkOneClass(
-                ielem, provider, celem,
-                "concrete_RuntimeProvider::vms",
-                "concrete_VirtualMachine::maps"
-            ),
-            checkOneClass(
-                ielem, provider, celem,
-                "concrete_RuntimeProvider::vmImages",
-                "concrete_VMImage::maps"
-            ),
-            checkOneClass(
-                ielem, provider, celem,
-                "concrete_RuntimeProvider::containerImages",
-                "concrete_ContainerImage::maps"
-            ),
-            checkOneClass(
-                ielem, provider, celem,
-                "concrete_RuntimeProvider::networks",
-                "concrete_Network::maps"
-            ),
-            checkOneClass(
-                ielem, provider, celem,
-                "concrete_RuntimeProvider::storages",
-                "concrete_Storage::maps"
-            ),
-            checkOneClass(
-                ielem, provider, celem,
-                "concrete_RuntimeProvider::faas",
-                "concrete_FunctionAsAService::maps"
-            ),
-            checkOneClass(
-                ielem, provider, celem,
-                "concrete_RuntimeProvider::group",
-                "concrete_ComputingGroup::maps"
-            ),
+            *(
+                checkOneClass(ielem, provider, celem, providerAssoc, celemAssoc)
+                for providerAssoc, celemAssoc in concrete_mappings
+            )
         )
     )
 
@@ -299,24 +270,23 @@ def get_user_friendly_name(
     return None
 
 
-def ed_vm_iface(solver: Solver, smtsorts: SMTSorts, intermediate_model: IntermediateModel) -> str:
-    vm = Const("vm", smtsorts.element_sort)
-    vm_name = get_user_friendly_name(intermediate_model, solver.model(), vm)
+def msg_vm_iface(vm_name: Optional[str]) -> str:
     if vm_name:
         return f"Virtual machine {vm_name} is connected to no network interface."
     else:
         return "A virtual machine is connected to no network interface."
 
 
-def ed_software_package_iface_net(solver: Solver, smtsorts: SMTSorts, intermediate_model: IntermediateModel) -> str:
-    asc_consumer, asc_exposer, siface = get_consts(
-        smtsorts,
-        ["asc_consumer", "asc_exposer", "siface"]
-    )
-    model = solver.model()
-    asc_consumer_name = get_user_friendly_name(intermediate_model, model, asc_consumer)
-    asc_exposer_name = get_user_friendly_name(intermediate_model, model, asc_exposer)
-    siface_name = get_user_friendly_name(intermediate_model, model, siface)
+def ed_vm_iface(solver: Solver, smtsorts: SMTSorts, intermediate_model: IntermediateModel) -> str:
+    vm = Const("vm", smtsorts.element_sort)
+    return msg_vm_iface(get_user_friendly_name(intermediate_model, solver.model(), vm))
+
+
+def msg_software_package_iface_net(
+    asc_consumer_name: Optional[str],
+    asc_exposer_name: Optional[str],
+    siface_name: Optional[str]
+) -> str:
     if asc_consumer_name and asc_exposer_name and siface_name:
         return (
             f"Software components '{asc_consumer_name}' and '{asc_exposer_name}' "
@@ -327,68 +297,204 @@ def ed_software_package_iface_net(solver: Solver, smtsorts: SMTSorts, intermedia
         return "A software package is deployed on a node that has no access to an interface it consumes."
 
 
-def ed_iface_uniq(solver: Solver, smtsorts: SMTSorts, intermediate_model: IntermediateModel) -> str:
-    ni1, ni2 = get_consts(smtsorts, ["ni1", "ni2"])
+def ed_software_package_iface_net(solver: Solver, smtsorts: SMTSorts, intermediate_model: IntermediateModel) -> str:
+    asc_consumer, asc_exposer, siface = get_consts(
+        smtsorts,
+        ["asc_consumer", "asc_exposer", "siface"]
+    )
     model = solver.model()
-    ni1_name = get_user_friendly_name(intermediate_model, model, ni1)
-    ni2_name = get_user_friendly_name(intermediate_model, model, ni2)
+    return msg_software_package_iface_net(
+        get_user_friendly_name(intermediate_model, model, asc_consumer),
+        get_user_friendly_name(intermediate_model, model, asc_exposer),
+        get_user_friendly_name(intermediate_model, model, siface)
+    )
+
+
+def msg_iface_uniq(ni1_name: Optional[str], ni2_name: Optional[str]) -> str:
     if ni1_name and ni2_name:
         return f"Network interfaces '{ni1_name}' and '{ni2_name}' share the same IP address."
     else:
         return "Two network interfaces share the same IP address."
 
 
-def ed_all_SoftwareComponents_deployed(solver: Solver, smtsorts: SMTSorts, intermediate_model: IntermediateModel) -> str:
-    sc = Const("sc", smtsorts.element_sort)
-    sc_name = get_user_friendly_name(intermediate_model, solver.model(), sc)
+def ed_iface_uniq(solver: Solver, smtsorts: SMTSorts, intermediate_model: IntermediateModel) -> str:
+    ni1, ni2 = get_consts(smtsorts, ["ni1", "ni2"])
+    model = solver.model()
+    return msg_iface_uniq(
+        get_user_friendly_name(intermediate_model, model, ni1),
+        get_user_friendly_name(intermediate_model, model, ni2)
+    )
+
+
+def msg_all_SoftwareComponents_deployed(sc_name: Optional[str]) -> str:
     if sc_name:
         return f"Software component '{sc_name}' is not deployed to any abstract infrastructure node."
     else:
         return "A software component is not deployed to any abstract infrastructure node."
 
 
-def ed_all_infrastructure_elements_deployed(solver: Solver, smtsorts: SMTSorts, intermediate_model: IntermediateModel) -> str:
-    ielem = Const("ielem", smtsorts.element_sort)
-    ielem_name = get_user_friendly_name(intermediate_model, solver.model(), ielem)
+def ed_all_SoftwareComponents_deployed(solver: Solver, smtsorts: SMTSorts, intermediate_model: IntermediateModel) -> str:
+    sc = Const("sc", smtsorts.element_sort)
+    return msg_all_SoftwareComponents_deployed(get_user_friendly_name(intermediate_model, solver.model(), sc))
+
+
+def msg_all_infrastructure_elements_deployed(ielem_name: Optional[str]) -> str:
     if ielem_name:
         return f"Abstract infrastructure element '{ielem_name}' has not been mapped to any element in the active concretization."
     else:
         return "An abstract infrastructure element has not been mapped to any element in the active concretization."
 
 
-def ed_all_concrete_map_something(solver: Solver, smtsorts: SMTSorts, intermediate_model: IntermediateModel) -> str:
-    celem = Const("celem", smtsorts.element_sort)
-    celem_name = get_user_friendly_name(intermediate_model, solver.model(), celem)
+def ed_all_infrastructure_elements_deployed(solver: Solver, smtsorts: SMTSorts, intermediate_model: IntermediateModel) -> str:
+    ielem = Const("ielem", smtsorts.element_sort)
+    return msg_all_infrastructure_elements_deployed(get_user_friendly_name(intermediate_model, solver.model(), ielem))
+
+
+def msg_all_concrete_map_something(celem_name: Optional[str]) -> str:
     if celem_name:
         return f"Concrete infrastructure element '{celem_name}' is mapped to no abstract infrastructure element."
     else:
         return "A concrete infrastructure element is mapped to no abstract infrastructure element."
 
 
+def ed_all_concrete_map_something(solver: Solver, smtsorts: SMTSorts, intermediate_model: IntermediateModel) -> str:
+    celem = Const("celem", smtsorts.element_sort)
+    return msg_all_concrete_map_something(get_user_friendly_name(intermediate_model, solver.model(), celem))
+
+
+# Native checks
+# They look for the same violations as the assertions above, and return
+# the error description of the first one they find, or None.
+
+def nc_vm_iface(graph: ModelGraph) -> Optional[str]:
+    for vm in graph.elements_of_class("infrastructure_VirtualMachine"):
+        if not graph.targets(vm, "infrastructure_ComputingNode::ifaces"):
+            return msg_vm_iface(graph.name(vm))
+    return None
+
+
+def mk_nc_software_package_iface_net(container_paths: list[list[str]]) -> Callable[[ModelGraph], Optional[str]]:
+    """
+    `container_paths` are the association paths from a node to the VMs
+    hosting the components deployed on it.
+    """
+    def node_networks(graph: ModelGraph, node: str) -> set[str]:
+        vms = {node}
+        for path in container_paths:
+            elems = {node}
+            for aname in path:
+                elems = {tgt for e in elems for tgt in graph.targets(e, aname)}
+            vms |= elems
+        return {
+            net
+            for vm in vms
+            for iface in graph.targets(vm, "infrastructure_ComputingNode::ifaces")
+            for net in graph.targets(iface, "infrastructure_NetworkInterface::belongsTo")
+        }
+
+    def component_networks(graph: ModelGraph, sc: str) -> set[str]:
+        return {
+            net
+            for deployment in graph.sources("commons_Deployment::component", sc)
+            for node in graph.targets(deployment, "commons_Deployment::node")
+            for net in node_networks(graph, node)
+        }
+
+    def nc_software_package_iface_net(graph: ModelGraph) -> Optional[str]:
+        for asc_consumer, e in graph.intermediate_model.items():
+            for siface in e.associations.get("application_SoftwareComponent::exposedInterfaces", ()):
+                for asc_exposer in graph.sources("application_SoftwareComponent::consumedInterfaces", siface):
+                    if not component_networks(graph, asc_consumer) & component_networks(graph, asc_exposer):
+                        return msg_software_package_iface_net(
+                            graph.name(asc_consumer), graph.name(asc_exposer), graph.name(siface)
+                        )
+        return None
+
+    return nc_software_package_iface_net
+
+
+nc_software_package_iface_net = mk_nc_software_package_iface_net([
+    ["infrastructure_Container::hosts"],
+    ["infrastructure_AutoScalingGroup::machineDefinition"],
+])
+
+nc_software_package_iface_net_v2_1 = mk_nc_software_package_iface_net([
+    ["infrastructure_Container::configs", "infrastructure_ContainerConfig::host"],
+    ["infrastructure_AutoScalingGroup::machineDefinition"],
+])
+
+
+def nc_iface_uniq(graph: ModelGraph) -> Optional[str]:
+    owners: dict[tuple[type, object], str] = {}
+    for ni in graph.intermediate_model:
+        for value in graph.attribute_values(ni, "infrastructure_NetworkInterface::endPoint"):
+            # Values of different types are different in the encoding, even if equal in Python.
+            other = owners.setdefault((type(value), value), ni)
+            if other != ni:
+                return msg_iface_uniq(graph.name(other), graph.name(ni))
+    return None
+
+
+def nc_all_SoftwareComponents_deployed(graph: ModelGraph) -> Optional[str]:
+    for sc in graph.elements_of_class("application_SoftwareComponent"):
+        if not any(
+            graph.targets(deployment, "commons_Deployment::node")
+            for deployment in graph.sources("commons_Deployment::component", sc)
+        ):
+            return msg_all_SoftwareComponents_deployed(graph.name(sc))
+    return None
+
+
+def nc_all_infrastructure_elements_deployed(graph: ModelGraph) -> Optional[str]:
+    for concr in graph.elements_of_class("concrete_ConcreteInfrastructure"):
+        providers = graph.targets(concr, "concrete_ConcreteInfrastructure::providers")
+        for ielemClass, providerAssoc, celemAssoc in infrastructure_mappings:
+            mapped = {
+                ielem
+                for provider in providers
+                for celem in graph.targets(provider, providerAssoc)
+                for ielem in graph.targets(celem, celemAssoc)
+            }
+            for ielem in graph.elements_of_class(ielemClass):
+                if ielem not in mapped:
+                    return msg_all_infrastructure_elements_deployed(graph.name(ielem))
+    return None
+
+
+def nc_all_concrete_map_something(graph: ModelGraph) -> Optional[str]:
+    for concr in graph.elements_of_class("concrete_ConcreteInfrastructure"):
+        for provider in graph.targets(concr, "concrete_ConcreteInfrastructure::providers"):
+            for providerAssoc, celemAssoc in concrete_mappings:
+                for celem in graph.targets(provider, providerAssoc):
+                    if not graph.targets(celem, celemAssoc):
+                        return msg_all_concrete_map_something(graph.name(celem))
+    return None
+
+
 RequirementLists = {
     DOMLVersion.V1_0: [
-        (vm_iface, "vm_iface", "All virtual machines must be connected to at least one network interface.", ed_vm_iface),
-        (software_package_iface_net, "software_package_iface_net", "All software packages can see the interfaces they need through a common network.", ed_software_package_iface_net),
-        (iface_uniq, "iface_uniq", "There are no duplicated interfaces.", ed_iface_uniq),
-        (all_SoftwareComponents_deployed, "all_SoftwareComponents_deployed", "All software components have been deployed to some node.", ed_all_SoftwareComponents_deployed),
-        (all_infrastructure_elements_deployed, "all_infrastructure_elements_deployed", "All abstract infrastructure elements are mapped to an element in the active concretization.", ed_all_infrastructure_elements_deployed),
-        (all_concrete_map_something, "all_concrete_map_something", "All elements in the active concretization are mapped to some abstract infrastructure element.", ed_all_concrete_map_something)
+        (vm_iface, "vm_iface", "All virtual machines must be connected to at least one network interface.", ed_vm_iface, nc_vm_iface),
+        (software_package_iface_net, "software_package_iface_net", "All software packages can see the interfaces they need through a common network.", ed_software_package_iface_net, nc_software_package_iface_net),
+        (iface_uniq, "iface_uniq", "There are no duplicated interfaces.", ed_iface_uniq, nc_iface_uniq),
+        (all_SoftwareComponents_deployed, "all_SoftwareComponents_deployed", "All software components have been deployed to some node.", ed_all_SoftwareComponents_deployed, nc_all_SoftwareComponents_deployed),
+        (all_infrastructure_elements_deployed, "all_infrastructure_elements_deployed", "All abstract infrastructure elements are mapped to an element in the active concretization.", ed_all_infrastructure_elements_deployed, nc_all_infrastructure_elements_deployed),
+        (all_concrete_map_something, "all_concrete_map_something", "All elements in the active concretization are mapped to some abstract infrastructure element.", ed_all_concrete_map_something, nc_all_concrete_map_something)
     ],
     DOMLVersion.V2_0: [
-        (vm_iface, "vm_iface", "All virtual machines must be connected to at least one network interface.", ed_vm_iface),
-        (software_package_iface_net, "software_package_iface_net", "All software packages can see the interfaces they need through a common network.", ed_software_package_iface_net),
-        (iface_uniq, "iface_uniq", "There are no duplicated interfaces.", ed_iface_uniq),
-        (all_SoftwareComponents_deployed, "all_SoftwareComponents_deployed", "All software components have been deployed to some node.", ed_all_SoftwareComponents_deployed),
-        (all_infrastructure_elements_deployed, "all_infrastructure_elements_deployed", "All abstract infrastructure elements are mapped to an element in the active concretization.", ed_all_infrastructure_elements_deployed),
-        (all_concrete_map_something, "all_concrete_map_something", "All elements in the active concretization are mapped to some abstract infrastructure element.", ed_all_concrete_map_something)
+        (vm_iface, "vm_iface", "All virtual machines must be connected to at least one network interface.", ed_vm_iface, nc_vm_iface),
+        (software_package_iface_net, "software_package_iface_net", "All software packages can see the interfaces they need through a common network.", ed_software_package_iface_net, nc_software_package_iface_net),
+        (iface_uniq, "iface_uniq", "There are no duplicated interfaces.", ed_iface_uniq, nc_iface_uniq),
+        (all_SoftwareComponents_deployed, "all_SoftwareComponents_deployed", "All software components have been deployed to some node.", ed_all_SoftwareComponents_deployed, nc_all_SoftwareComponents_deployed),
+        (all_infrastructure_elements_deployed, "all_infrastructure_elements_deployed", "All abstract infrastructure elements are mapped to an element in the active concretization.", ed_all_infrastructure_elements_deployed, nc_all_infrastructure_elements_deployed),
+        (all_concrete_map_something, "all_concrete_map_something", "All elements in the active concretization are mapped to some abstract infrastructure element.", ed_all_concrete_map_something, nc_all_concrete_map_something)
     ],
     DOMLVersion.V2_1: [
-        (vm_iface, "vm_iface", "All virtual machines must be connected to at least one network interface.", ed_vm_iface),
-        (software_package_iface_net_v2_1, "software_package_iface_net", "All software packages can see the interfaces they need through a common network.", ed_software_package_iface_net),
-        (iface_uniq, "iface_uniq", "There are no duplicated interfaces.", ed_iface_uniq),
-        (all_SoftwareComponents_deployed, "all_SoftwareComponents_deployed", "All software components have been deployed to some node.", ed_all_SoftwareComponents_deployed),
-        (all_infrastructure_elements_deployed, "all_infrastructure_elements_deployed", "All abstract infrastructure elements are mapped to an element in the active concretization.", ed_all_infrastructure_elements_deployed),
-        (all_concrete_map_something, "all_concrete_map_something", "All elements in the active concretization are mapped to some abstract infrastructure element.", ed_all_concrete_map_something)
+        (vm_iface, "vm_iface", "All virtual machines must be connected to at least one network interface.", ed_vm_iface, nc_vm_iface),
+        (software_package_iface_net_v2_1, "software_package_iface_net", "All software packages can see the interfaces they need through a common network.", ed_software_package_iface_net, nc_software_package_iface_net_v2_1),
+        (iface_uniq, "iface_uniq", "There are no duplicated interfaces.", ed_iface_uniq, nc_iface_uniq),
+        (all_SoftwareComponents_deployed, "all_SoftwareComponents_deployed", "All software components have been deployed to some node.", ed_all_SoftwareComponents_deployed, nc_all_SoftwareComponents_deployed),
+        (all_infrastructure_elements_deployed, "all_infrastructure_elements_deployed", "All abstract infrastructure elements are mapped to an element in the active concretization.", ed_all_infrastructure_elements_deployed, nc_all_infrastructure_elements_deployed),
+        (all_concrete_map_something, "all_concrete_map_something", "All elements in the active concretization are mapped to some abstract infrastructure element.", ed_all_concrete_map_something, nc_all_concrete_map_something)
     ],
 }
 
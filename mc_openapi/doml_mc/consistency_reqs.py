@@ -1,16 +1,120 @@
+from collections.abc import Callable
+from typing import Union
+
 from z3 import (
     Const, Consts, ExprRef, Solver,
     Exists, ForAll, Implies, And, Or, Not
 )
 
 from .intermediate_model import MetaModel
-from .intermediate_model.metamodel import get_subclasses_dict
+from .intermediate_model.metamodel import get_mangled_attribute_defaults, get_metamodel_index, get_subclasses_dict
 from .imc import (
     SMTEncoding, SMTSorts, Requirement, RequirementStore
 )
+from .model_graph import ModelGraph
 from .z3encoding.utils import Iff
 
 
+def adata_kind(v: Union[str, int, bool]) -> str:
+    """The constructor of the AttributeData encoding `v`, as in `encode_adata`."""
+    if type(v) is str:
+        return "ss"
+    elif type(v) is int:
+        return "int"
+    else:
+        return "bool"
+
+
+def has_attribute_type(v: Union[str, int, bool], type_: str) -> bool:
+    kind = adata_kind(v)
+    if type_ == "Boolean":
+        return kind == "bool"
+    elif type_ == "Integer":
+        return kind == "int"
+    elif type_ == "String":
+        return kind == "ss"
+    else:  # type_ == "GeneratorKind"
+        return kind == "ss" and v in ("IMAGE", "SCRIPT")
+
+
+def find_consistency_violations(graph: ModelGraph) -> set[str]:
+    """
+    Returns the names of the consistency requirements whose assertions are
+    satisfiable in the model of `graph`, i.e., which are violated.
+    They are all found in one pass over the elements, which is shared by
+    the native checks of all consistency requirements.
+    """
+    def find(graph: ModelGraph) -> set[str]:
+        mm = graph.metamodel
+        im = graph.intermediate_model
+        superclasses = get_metamodel_index(mm).superclasses
+        # Association -> (inverse association, requirement name) pairs.
+        inverses: dict[str, list[tuple[str, str]]] = {}
+        for an1, an2 in graph.inv_assoc:
+            inverses.setdefault(an1, []).append((an2, f"association_inverse {an1} {an2}"))
+            inverses.setdefault(an2, []).append((an1, f"association_inverse {an1} {an2}"))
+        # Class -> mandatory attributes and associations, inherited ones included.
+        mandatory: dict[str, tuple[list[str], list[str]]] = {}
+
+        violations: set[str] = set()
+        for ename, e in im.items():
+            sups = superclasses[e.class_]
+            if e.class_ not in mandatory:
+                mandatory[e.class_] = (
+                    [f"{sc}::{an}" for sc in sups for an, a in mm[sc].attributes.items() if a.multiplicity[0] == "1"],
+                    [f"{sc}::{an}" for sc in sups for an, a in mm[sc].associations.items() if a.multiplicity[0] == "1"],
+                )
+            mandatory_attrs, mandatory_assocs = mandatory[e.class_]
+
+            attrs = get_mangled_attribute_defaults(mm, e.class_) | e.attributes
+            for aname, values in attrs.items():
+                if not values:
+                    continue
+                owner, _, local = aname.partition("::")
+                mm_attr = mm[owner].attributes[local]
+                if owner not in sups or not all(has_attribute_type(v, mm_attr.type) for v in values):
+                    violations.add(f"attribute_st_types {aname}")
+                if mm_attr.multiplicity[1] == "1" and len({(adata_kind(v), v) for v in values}) > 1:
+                    violations.add(f"attribute_mult_ub {aname}")
+            for aname in mandatory_attrs:
+                if not attrs.get(aname):
+                    violations.add(f"attribute_mult_lb {aname}")
+
+            for aname, targets in e.associations.items():
+                if not targets:
+                    continue
+                owner, _, local = aname.partition("::")
+                mm_assoc = mm[owner].associations[local]
+                if owner not in sups or any(mm_assoc.class_ not in superclasses[im[t].class_] for t in targets):
+                    violations.add(f"association_st_classes {aname}")
+                if mm_assoc.multiplicity[1] == "1" and len(targets) > 1:
+                    violations.add(f"association_mult_ub {aname}")
+                for inv_name, req_name in inverses.get(aname, []):
+                    if any(ename not in im[t].associations.get(inv_name, ()) for t in targets):
+                        violations.add(req_name)
+            for aname in mandatory_assocs:
+                if not e.associations.get(aname):
+                    violations.add(f"association_mult_lb {aname}")
+        return violations
+
+    return graph.derive("consistency_violations", find)
+
+
+def consistency_requirement(
+    assertion: Callable[[SMTEncoding, SMTSorts], ExprRef],
+    name: str,
+    description: str,
+    error_msg: str
+) -> Requirement:
+    return Requirement(
+        assertion,
+        name,
+        description,
+        lambda _s, _m, _i: error_msg,
+        lambda graph: error_msg if name in find_consistency_violations(graph) else None
+    )
+
+
 def subclass_cond(smtenc: SMTEncoding, subclasses: set[str], elem: ExprRef) -> ExprRef:
     return Or(
         *(
@@ -53,11 +157,11 @@ def get_attribute_type_reqs(mm: MetaModel) -> RequirementStore:
                 )
 
             reqs.append(
-                Requirement(
+                consistency_requirement(
                     req_assertion,
                     f"attribute_st_types {cname}::{mm_attr.name}",
                     f"Attribute {mm_attr.name} from class {cname} must have type {mm_attr.type}.",
-                    lambda _s, _m, _i: f"Attribute {mm_attr.name} from class {cname} has a type different from {mm_attr.type}.",
+                    f"Attribute {mm_attr.name} from class {cname} has a type different from {mm_attr.type}.",
                 )
             )
     return RequirementStore(reqs)
@@ -95,20 +199,20 @@ def get_attribute_multiplicity_reqs(mm: MetaModel) -> RequirementStore:
             lb, ub = mm_attr.multiplicity
             if lb == "1":
                 reqs.append(
-                    Requirement(
+                    consistency_requirement(
                         req_assertion_lb,
                         f"attribute_mult_lb {cname}::{mm_attr.name}",
                         f"Attribute {mm_attr.name} from class {cname} must have at least one value.",
-                        lambda _s, _m, _i: f"Mandatory attribute {mm_attr.name} from class {cname} has no value.",
+                        f"Mandatory attribute {mm_attr.name} from class {cname} has no value.",
                     )
                 )
             if ub == "1":
                 reqs.append(
-                    Requirement(
+                    consistency_requirement(
                         req_assertion_ub,
                         f"attribute_mult_ub {cname}::{mm_attr.name}",
                         f"Attribute {mm_attr.name} from class {cname} must have at most one value.",
-                        lambda _s, _m, _i: f"Attribute {mm_attr.name} from class {cname} has more than one value.",
+                        f"Attribute {mm_attr.name} from class {cname} has more than one value.",
                     )
                 )
     return RequirementStore(reqs)
@@ -136,11 +240,11 @@ def get_association_type_reqs(mm: MetaModel) -> RequirementStore:
                 )
 
             reqs.append(
-                Requirement(
+                consistency_requirement(
                     req_assertion,
                     f"association_st_classes {cname}::{mm_assoc.name}",
                     f"Association {mm_assoc.name} from class {cname} must target class {mm_assoc.class_}.",
-                    lambda _s, _m, _i: f"Association {mm_assoc.name} from class {cname} has a class different from {mm_assoc.class_}.",
+                    f"Association {mm_assoc.name} from class {cname} has a class different from {mm_assoc.class_}.",
                 )
             )
     return RequirementStore(reqs)
@@ -175,20 +279,20 @@ def get_association_multiplicity_reqs(mm: MetaModel) -> RequirementStore:
             lb, ub = mm_assoc.multiplicity
             if lb == "1":
                 reqs.append(
-                    Requirement(
+                    consistency_requirement(
                         req_assertion_lb,
                         f"association_mult_lb {cname}::{mm_assoc.name}",
                         f"Association {mm_assoc.name} from class {cname} must have at least one target.",
-                        lambda _s, _m, _i: f"Mandatory association {mm_assoc.name} is missing from an element of class {cname}.",
+                        f"Mandatory association {mm_assoc.name} is missing from an element of class {cname}.",
                     )
                 )
             if ub == "1":
                 reqs.append(
-                    Requirement(
+                    consistency_requirement(
                         req_assertion_ub,
                         f"association_mult_ub {cname}::{mm_assoc.name}",
                         f"Association {mm_assoc.name} from class {cname} must have at most one target.",
-                        lambda _s, _m, _i: f"Association {mm_assoc.name} has more than one target in an element of class {cname}.",
+                        f"Association {mm_assoc.name} has more than one target in an element of class {cname}.",
                     )
                 )
     return RequirementStore(reqs)
@@ -208,11 +312,11 @@ def get_inverse_association_reqs(inv_assoc: list[tuple[str, str]]) -> Requiremen
             )
 
         reqs.append(
-            Requirement(
+            consistency_requirement(
                 req_assertion,
                 f"association_inverse {an1} {an2}",
                 f"Association {an1} must be the inverse of {an2}.",
-                lambda _s, _m, _i: f"Association {an1} is not the inverse of {an2}.",
+                f"Association {an1} is not the inverse of {an2}.",
             )
         )
     return RequirementStore(reqs)
@@ -1,25 +1,35 @@
-from collections.abc import Callable
-from dataclasses import dataclass
+import threading
+import time
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Optional, Union
 
 from z3 import (
-    Context, FuncDeclRef, Solver, ExprRef, SortRef, DatatypeSortRef, sat
+    Context, FuncDeclRef, Or, Solver, SolverFor, Tactic, ExprRef, SortRef, DatatypeSortRef, sat,
+    Z3_OP_DT_CONSTRUCTOR, Z3_OP_UNINTERPRETED, is_app, is_quantifier, is_var, parse_smt2_string
 )
 
+from ._utils import timed
 from .intermediate_model.doml_element import IntermediateModel
+from .model_graph import ModelGraph
 from .z3encoding.im_encoding import (
-    assert_im_associations_q, assert_im_attributes,
-    def_elem_class_f_and_assert_classes,
-    mk_elem_sort_dict, mk_stringsym_sort_dict
+    assert_im_associations_q, assert_im_associations_sparse,
+    assert_im_attributes, assert_im_classes, def_elem_class_f, define_im_attributes,
+    mk_elem_sort_dict, mk_stringsym_sort_dict, get_string_values
 )
 from .z3encoding.metamodel_encoding import (
     def_association_rel,
     def_attribute_rel,
+    def_attribute_table_rel,
     mk_association_sort_dict,
     mk_attribute_sort_dict, mk_class_sort_dict
 )
+from .z3encoding.datalog import DatalogCompiler, DatalogEngine
+from .z3encoding.grounding import Grounder, GroundingError, GroundingTimeout, ModelFacts
 from .z3encoding.types import Refs
 from .z3encoding.utils import mk_adata_sort
-from .mc_result import MCResult, MCResults
+from .mc_result import MCResult, MCResults, Profile, RequirementProfile
 
 
 @dataclass
@@ -50,6 +60,9 @@ class Requirement:
     assert_name: str
     description: str
     error_description: Callable[[Solver, SMTSorts, IntermediateModel], str]
+    # Checks the requirement by traversing the model, returning the error
+    # description if it is violated, or None if it is satisfied.
+    native_check: Optional[Callable[[ModelGraph], Optional[str]]] = None
 
 
 class RequirementStore:
@@ -70,54 +83,153 @@ class RequirementStore:
         return RequirementStore(self.requirements + other.requirements)
 
 
+class Engine(Enum):
+    Z3 = "z3"
+    # Requirements without a native check are still checked with Z3.
+    NATIVE = "native"
+    # Assertions grounded on the model and solved by Z3's SAT-based finite
+    # domain solver. Those that cannot be grounded are checked with Z3.
+    SAT = "sat"
+    # Assertions compiled into Datalog rules, evaluated bottom-up on the
+    # facts of the model. Those that cannot be compiled are checked with Z3.
+    DATALOG = "datalog"
+
+
+# Either the engine for all requirements, or a dict from requirement names
+# to engines, those not in it being checked with Z3.
+EngineSelection = Union[Engine, dict[str, Engine]]
+
+
+def selected_engine(req: Requirement, engine: EngineSelection) -> Engine:
+    if isinstance(engine, dict):
+        return engine.get(req.assert_name, Engine.Z3)
+    return engine
+
+
+def uses_native_engine(req: Requirement, engine: EngineSelection, max_violations: int = 1) -> bool:
+    """Native checks only find one violation: to find more, `req` is checked otherwise."""
+    return selected_engine(req, engine) == Engine.NATIVE and req.native_check is not None and max_violations == 1
+
+
+def skipped_profile(name: str, engine: EngineSelection) -> RequirementProfile:
+    """
+    The profile of requirement `name`, left unchecked at the deadline, with
+    the engine that `engine` selects for it. Requirements left by the native
+    engine are those it checks with Z3.
+    """
+    if isinstance(engine, dict):
+        engine = engine.get(name, Engine.Z3)
+    return RequirementProfile(name, (Engine.Z3 if engine == Engine.NATIVE else engine).value, 0.0)
+
+
+def check_requirement_natively(req: Requirement, graph: ModelGraph) -> tuple[tuple[MCResult, str], RequirementProfile]:
+    start = time.perf_counter()
+    err_msg = req.native_check(graph)
+    profile = RequirementProfile(req.assert_name, Engine.NATIVE.value, time.perf_counter() - start)
+    if err_msg is None:
+        return (MCResult.sat, ""), profile
+    else:
+        return (MCResult.unsat, err_msg), profile
+
+
+class AssociationEncoding(Enum):
+    # One quantified assertion per (source, target) element pair.
+    QUANTIFIED = "quantified"
+    # One quantified assertion per source element, listing only its links.
+    SPARSE = "sparse"
+
+
+class AttributeEncoding(Enum):
+    # One quantified assertion per element.
+    QUANTIFIED = "quantified"
+    # A function definition looking values up by element and attribute,
+    # without quantifiers.
+    TABLE = "table"
+
+
+@dataclass
+class SolverConfig:
+    """
+    A configuration of the Z3 solver checking requirements: its `params`,
+    as accepted by `Solver.set`, and the `tactic` it is made from, if any.
+    """
+    name: str
+    params: dict[str, Union[bool, int, float, str]] = field(default_factory=dict)
+    tactic: Optional[str] = None
+
+    def make_solver(self, ctx: Context) -> Solver:
+        solver = Tactic(self.tactic, ctx=ctx).solver() if self.tactic is not None else Solver(ctx=ctx)
+        for key, value in self.params.items():
+            solver.set(key, value)
+        return solver
+
+
+DEFAULT_SOLVER = SolverConfig("default")
+
+
+@dataclass
+class EncodedModel:
+    """
+    SMT-LIB2 form of the model assertions of an `IntermediateModelChecker`.
+    It is plain data, so it can be sent to worker processes cheaply.
+    """
+    assertion_names: list[str]
+    smt2: str
+
+
+class _AssertionRecorder:
+    """
+    Stands in for a Solver in the encoding functions, collecting the
+    assertions they make.
+    """
+    def __init__(self, ctx: Context):
+        self.ctx = ctx
+        self.assertions: list[tuple[ExprRef, str]] = []
+
+    def assert_and_track(self, assn: ExprRef, name: str):
+        self.assertions.append((assn, name))
+
+
 class IntermediateModelChecker:
-    def __init__(self, metamodel, inv_assoc, intermediate_model: IntermediateModel):
+    def __init__(
+        self,
+        metamodel,
+        inv_assoc,
+        intermediate_model: IntermediateModel,
+        assoc_encoding: AssociationEncoding = AssociationEncoding.SPARSE,
+        encoded_model: Optional[EncodedModel] = None,
+        retractable: bool = False,
+        attr_encoding: AttributeEncoding = AttributeEncoding.TABLE,
+        solver_config: SolverConfig = DEFAULT_SOLVER
+    ):
+        """
+        If `retractable` is true, the model is asserted in its own solver
+        scope, so that it can later be changed by `update_model`; this needs
+        the quantified attribute encoding.
+        The solver is built as `solver_config` says.
+        The time spent in each encoding step is recorded in `profile`.
+        """
         def instantiate_solver():
             self.z3Context = Context()
-            self.solver = Solver(ctx=self.z3Context)
-
-            class_sort, class_ = mk_class_sort_dict(self.metamodel, self.z3Context)
-            assoc_sort, assoc = mk_association_sort_dict(self.metamodel, self.z3Context)
-            attr_sort, attr = mk_attribute_sort_dict(self.metamodel, self.z3Context)
-            elem_sort, elem = mk_elem_sort_dict(self.intermediate_model, self.z3Context)
-            ss_sort, ss = mk_stringsym_sort_dict(self.intermediate_model, self.metamodel, self.z3Context)
-            AData = mk_adata_sort(ss_sort, self.z3Context)
-            elem_class_f = def_elem_class_f_and_assert_classes(
-                self.intermediate_model,
-                self.solver,
-                elem_sort,
-                elem,
-                class_sort,
-                class_
-            )
-            attr_rel = def_attribute_rel(
-                attr_sort,
-                elem_sort,
-                AData
-            )
-            assert_im_attributes(
-                attr_rel,
-                self.solver,
-                self.intermediate_model,
-                self.metamodel,
-                elem,
-                attr_sort,
-                attr,
-                AData,
-                ss
-            )
-            assoc_rel = def_association_rel(
-                assoc_sort,
-                elem_sort
-            )
-            assert_im_associations_q(
-                assoc_rel,
-                self.solver,
-                {k: v for k, v in self.intermediate_model.items()},
-                elem,
-                assoc_sort,
-                assoc,
-            )
+            self.solver = self.solver_config.make_solver(self.z3Context)
+
+            with timed(self.profile.phases, "encode_sorts"):
+                class_sort, class_ = mk_class_sort_dict(self.metamodel, self.z3Context)
+                assoc_sort, assoc = mk_association_sort_dict(self.metamodel, self.z3Context)
+                attr_sort, attr = mk_attribute_sort_dict(self.metamodel, self.z3Context)
+                elem_sort, elem = mk_elem_sort_dict(self.intermediate_model, self.z3Context)
+                ss_sort, ss = mk_stringsym_sort_dict(self.intermediate_model, self.metamodel, self.z3Context)
+                AData = mk_adata_sort(ss_sort, self.z3Context)
+                elem_class_f = def_elem_class_f(elem_sort, class_sort)
+                attr_rel = (def_attribute_table_rel if self.attr_encoding == AttributeEncoding.TABLE else def_attribute_rel)(
+                    attr_sort,
+                    elem_sort,
+                    AData
+                )
+                assoc_rel = def_association_rel(
+                    assoc_sort,
+                    elem_sort
+                )
             self.smt_encoding = SMTEncoding(
                 class_,
                 assoc,
@@ -137,27 +249,515 @@ class IntermediateModelChecker:
                 AData
             )
 
+            if self.attr_encoding == AttributeEncoding.TABLE:
+                # Not an assertion, so it is not part of `encoded_model` either.
+                with timed(self.profile.phases, "encode_attributes"):
+                    define_im_attributes(
+                        attr_rel,
+                        self.intermediate_model,
+                        self.metamodel,
+                        elem_sort,
+                        elem,
+                        attr_sort,
+                        attr,
+                        AData,
+                        ss
+                    )
+
+            if self.encoded_model is not None:
+                with timed(self.profile.phases, "load_encoding"):
+                    assertions = parse_smt2_string(
+                        self.encoded_model.smt2,
+                        sorts={
+                            "Class": class_sort,
+                            "Association": assoc_sort,
+                            "Attribute": attr_sort,
+                            "Element": elem_sort,
+                            "StringSym": ss_sort,
+                            "AttributeData": AData,
+                        },
+                        decls={
+                            "elem_class": elem_class_f,
+                            "attribute": attr_rel,
+                            "association": assoc_rel,
+                        },
+                        ctx=self.z3Context
+                    )
+                    for assn, name in zip(assertions, self.encoded_model.assertion_names):
+                        self.solver.assert_and_track(assn, name)
+            elif self.retractable:
+                self.element_facts = {
+                    ename: self.encode_elements({ename: e})
+                    for ename, e in self.intermediate_model.items()
+                }
+                self.assert_element_facts()
+            else:
+                self.assert_elements(self.intermediate_model, self.solver)
+            self.profile.assertions = len(self.solver.assertions())
+
+        if retractable and assoc_encoding != AssociationEncoding.SPARSE:
+            raise ValueError("Only the sparse association encoding can be retracted.")
+        if retractable and attr_encoding != AttributeEncoding.QUANTIFIED:
+            raise ValueError("Only the quantified attribute encoding can be retracted.")
         self.metamodel = metamodel
         self.inv_assoc = inv_assoc
         self.intermediate_model = intermediate_model
+        self.assoc_encoding = assoc_encoding
+        self.attr_encoding = attr_encoding
+        self.encoded_model = encoded_model
+        self.retractable = retractable
+        self.solver_config = solver_config
+        self.profile = Profile()
+        # Requirement expressions built in this checker's context, by id of
+        # the requirement. The requirement is kept so that its id is not reused.
+        self.expressions: dict[int, tuple[Requirement, ExprRef]] = {}
+        # Built on the first check with the SAT or Datalog engine.
+        self.facts: Optional[ModelFacts] = None
+        self.grounder: Optional[Grounder] = None
+        self.datalog: Optional[DatalogCompiler] = None
+        # Set by `interrupt`, to stop grounding and Datalog evaluation, which
+        # do not run in Z3.
+        self.interrupted = threading.Event()
         instantiate_solver()
 
-    def check_requirements(self, reqs: RequirementStore, timeout: int = 0) -> MCResults:
-        self.solver.set(timeout=(timeout * 1000))
+    def assert_elements(self, im: IntermediateModel, solver) -> None:
+        """
+        Asserts the classes, attributes and associations of the elements in
+        `im`, which must be a subset of the checked model.
 
-        results = []
-        for req in reqs.get_all_requirements():
-            self.solver.push()
-            self.solver.assert_and_track(
-                req.assert_callable(self.smt_encoding, self.smt_sorts),
-                req.assert_name
+        ### Effects
+        This procedure is effectful on `solver`.
+        """
+        with timed(self.profile.phases, "encode_classes"):
+            assert_im_classes(
+                self.smt_encoding.element_class_fun,
+                solver,
+                im,
+                self.smt_encoding.elements,
+                self.smt_encoding.classes
+            )
+        if self.attr_encoding == AttributeEncoding.QUANTIFIED:
+            with timed(self.profile.phases, "encode_attributes"):
+                assert_im_attributes(
+                    self.smt_encoding.attribute_rel,
+                    solver,
+                    im,
+                    self.metamodel,
+                    self.smt_encoding.elements,
+                    self.smt_sorts.attribute_sort,
+                    self.smt_encoding.attributes,
+                    self.smt_sorts.attr_data_sort,
+                    self.smt_encoding.str_symbols
+                )
+        with timed(self.profile.phases, "encode_associations"):
+            if self.assoc_encoding == AssociationEncoding.SPARSE:
+                assert_im_associations_sparse(
+                    self.smt_encoding.association_rel,
+                    solver,
+                    im,
+                    self.smt_encoding.elements,
+                    self.smt_sorts.element_sort,
+                    self.smt_sorts.association_sort,
+                    self.smt_encoding.associations,
+                )
+            else:
+                assert_im_associations_q(
+                    self.smt_encoding.association_rel,
+                    solver,
+                    {k: v for k, v in im.items()},
+                    self.smt_encoding.elements,
+                    self.smt_sorts.association_sort,
+                    self.smt_encoding.associations,
+                )
+
+    def encode_elements(self, im: IntermediateModel) -> list[tuple[ExprRef, str]]:
+        recorder = _AssertionRecorder(self.z3Context)
+        self.assert_elements(im, recorder)
+        return recorder.assertions
+
+    def assert_element_facts(self) -> None:
+        self.solver.push()
+        for facts in self.element_facts.values():
+            for assn, name in facts:
+                self.solver.assert_and_track(assn, name)
+
+    def update_model(self, intermediate_model: IntermediateModel) -> bool:
+        """
+        Replaces the checked model with `intermediate_model`, re-encoding
+        only the elements that changed and keeping the assertions of the
+        others. This is only possible if the checker is retractable and the
+        new model has the same elements and no new string values; otherwise,
+        nothing is done and False is returned.
+        """
+        if (
+            not self.retractable
+            or intermediate_model.keys() != self.intermediate_model.keys()
+            or not get_string_values(intermediate_model, self.metamodel)
+            <= self.smt_encoding.str_symbols.keys()
+        ):
+            return False
+
+        for ename, e in intermediate_model.items():
+            if e != self.intermediate_model[ename]:
+                self.element_facts[ename] = self.encode_elements({ename: e})
+        self.solver.pop()
+        self.assert_element_facts()
+        self.intermediate_model = intermediate_model
+        self.facts = None
+        self.grounder = None
+        self.datalog = None
+        return True
+
+    def export_encoding(self) -> EncodedModel:
+        """
+        Serializes the assertions encoding the intermediate model, so that
+        other checkers for the same model can load them instead of building
+        them again (see `encoded_model` in the constructor).
+        """
+        names = []
+        bodies = []
+        for assn in self.solver.assertions():
+            # assert_and_track stores each assertion as `tracker => body`.
+            tracker, body = assn.children()
+            names.append(tracker.decl().name())
+            bodies.append(f"(assert {body.sexpr()})")
+        return EncodedModel(names, "\n".join(bodies))
+
+    def requirement_expression(self, req: Requirement) -> ExprRef:
+        """
+        Returns the assertion of `req`, only building it the first time.
+        It does not depend on the model, so `update_model` keeps it valid.
+        """
+        key = id(req)
+        if key not in self.expressions:
+            self.expressions[key] = (req, req.assert_callable(self.smt_encoding, self.smt_sorts))
+        return self.expressions[key][1]
+
+    def requirement_scope(self, req: Requirement) -> Optional[set[str]]:
+        """
+        Returns the names of the classes, associations and attributes that
+        the assertion of `req` refers to, or None if it quantifies over them,
+        in which case it may depend on any of them.
+        """
+        scope_sorts = {
+            self.smt_sorts.class_sort,
+            self.smt_sorts.association_sort,
+            self.smt_sorts.attribute_sort
+        }
+        scope: set[str] = set()
+        visited: set[int] = set()
+        to_visit = [self.requirement_expression(req)]
+        while to_visit:
+            e = to_visit.pop()
+            if e.get_id() in visited:
+                continue
+            visited.add(e.get_id())
+            if is_quantifier(e):
+                to_visit.append(e.body())
+            elif is_var(e):
+                if e.sort() in scope_sorts:
+                    return None
+            elif is_app(e):
+                if e.num_args() == 0 and e.sort() in scope_sorts:
+                    if e.decl().kind() != Z3_OP_DT_CONSTRUCTOR:
+                        return None
+                    scope.add(e.decl().name())
+                to_visit.extend(e.children())
+        return scope
+
+    def witness_consts(self, req: Requirement) -> list[ExprRef]:
+        """
+        The free constants of the element sort in the assertion of `req`,
+        whose values are the elements making up a violation.
+        """
+        consts: dict[int, ExprRef] = {}
+        visited: set[int] = set()
+        to_visit = [self.requirement_expression(req)]
+        while to_visit:
+            e = to_visit.pop()
+            if e.get_id() in visited:
+                continue
+            visited.add(e.get_id())
+            if is_quantifier(e):
+                # Bound variables are de Bruijn indices in the body.
+                to_visit.append(e.body())
+            elif is_app(e):
+                if e.num_args() == 0 and e.decl().kind() == Z3_OP_UNINTERPRETED \
+                        and e.sort() == self.smt_sorts.element_sort:
+                    consts[e.get_id()] = e
+                to_visit.extend(e.children())
+        return sorted(consts.values(), key=str)
+
+    def describe_violations(
+        self,
+        req: Requirement,
+        solver: Solver,
+        max_violations: int = 1,
+        deadline: Optional[float] = None
+    ) -> list[str]:
+        """
+        Describes the violation of `req` in the model of `solver`, and up to
+        `max_violations - 1` others, each found by blocking the elements of
+        the previous ones and checking again, until no violation is left or
+        `deadline`, a `time.perf_counter()` value, passes.
+        The blocking clauses are added to `solver`, in the scope of the check.
+        """
+        descriptions = [req.error_description(solver, self.smt_sorts, self.intermediate_model)]
+        consts = self.witness_consts(req) if max_violations > 1 else []
+        while consts and len(descriptions) < max_violations:
+            model = solver.model()
+            solver.add(Or([c != model.eval(c, model_completion=True) for c in consts]))
+            if deadline is not None:
+                remaining_ms = int((deadline - time.perf_counter()) * 1000)
+                if remaining_ms <= 0:
+                    break
+                solver.set(timeout=remaining_ms)
+            if solver.check() != sat:
+                break
+            descriptions.append(req.error_description(solver, self.smt_sorts, self.intermediate_model))
+        return descriptions
+
+    @staticmethod
+    def violations_result(descriptions: list[str]) -> tuple[MCResult, str]:
+        """The result of a requirement with the violations of `descriptions`, if any."""
+        if not descriptions:
+            return MCResult.sat, ""
+        # Violations differing in elements not named by the description read the same.
+        return MCResult.unsat, " ".join(dict.fromkeys(descriptions))
+
+    def check_z3_requirement(
+        self,
+        req: Requirement,
+        timeout_ms: int = 0,
+        max_violations: int = 1
+    ) -> tuple[tuple[MCResult, str], RequirementProfile]:
+        """
+        Checks `req` with Z3, for at most `timeout_ms` milliseconds (0 for no
+        limit), describing up to `max_violations` violations.
+        """
+        self.solver.set(timeout=timeout_ms)
+        start = time.perf_counter()
+        self.solver.push()
+        self.solver.assert_and_track(self.requirement_expression(req), req.assert_name)
+        res = self.solver.check()
+        if res == sat:
+            descriptions = self.describe_violations(
+                req, self.solver, max_violations, start + timeout_ms / 1000 if timeout_ms > 0 else None
+            )
+            result = self.violations_result(descriptions)
+        else:
+            descriptions = []
+            result = MCResult.from_z3result(res, flipped=True), ""
+        statistics = self.solver.statistics()
+        self.solver.pop()
+        return result, RequirementProfile(
+            req.assert_name,
+            Engine.Z3.value,
+            time.perf_counter() - start,
+            {key: statistics.get_key_value(key) for key in statistics.keys()}
+            | ({"violations": len(descriptions)} if max_violations > 1 else {}),
+            self.solver_config.name
+        )
+
+    def interrupt(self):
+        """
+        Interrupts the Z3 check running in the context of this checker, if
+        any, and the grounding and Datalog evaluation of the SAT and Datalog
+        engines until the end of `iter_requirements`.
+        """
+        self.interrupted.set()
+        self.z3Context.interrupt()
+
+    def close(self):
+        """
+        Releases the resources that outlive a check, once this checker is no
+        longer used. There are none here: subclasses that keep threads or
+        processes, such as `PortfolioChecker`, override it.
+        """
+        pass
+
+    def walker_args(self) -> tuple:
+        """The arguments of the `AssertionWalker`s of the SAT and Datalog engines."""
+        if self.facts is None:
+            self.facts = ModelFacts(
+                self.intermediate_model,
+                self.metamodel,
+                self.smt_encoding.elements,
+                self.smt_encoding.classes,
+                self.smt_encoding.associations,
+                self.smt_encoding.attributes,
+                self.smt_sorts.attr_data_sort,
+                self.smt_encoding.str_symbols
+            )
+        return (
+            self.facts,
+            self.smt_encoding.element_class_fun,
+            self.smt_encoding.association_rel,
+            self.smt_encoding.attribute_rel,
+            self.smt_sorts.attr_data_sort
+        )
+
+    def check_sat_requirement(
+        self,
+        req: Requirement,
+        timeout_ms: int = 0,
+        max_violations: int = 1
+    ) -> tuple[tuple[MCResult, str], RequirementProfile]:
+        """
+        Checks `req` by grounding its assertion on the model (see `Grounder`)
+        and solving the resulting formula with Z3's SAT-based finite domain
+        solver, for at most `timeout_ms` milliseconds (0 for no limit).
+        Its free constants get the same values as with `check_z3_requirement`,
+        so the error descriptions, up to `max_violations`, are built in the
+        same way.
+        """
+        start = time.perf_counter()
+        if self.grounder is None:
+            self.grounder = Grounder(*self.walker_args())
+        try:
+            formula = self.grounder.ground(
+                self.requirement_expression(req),
+                start + timeout_ms / 1000 if timeout_ms > 0 else None,
+                self.interrupted
             )
-            res = self.solver.check()
-            results.append((
-                MCResult.from_z3result(res, flipped=True),
-                req.error_description(self.solver, self.smt_sorts, self.intermediate_model)
-                if res == sat else ""
-            ))
-            self.solver.pop()
-
-        return MCResults(results)
+        except GroundingError:
+            return self.check_z3_requirement(req, timeout_ms, max_violations)
+        except GroundingTimeout:
+            return (MCResult.dontknow, ""), RequirementProfile(req.assert_name, Engine.SAT.value, time.perf_counter() - start)
+        grounding_time = time.perf_counter() - start
+
+        solver = SolverFor("QF_FD", ctx=self.z3Context)
+        if timeout_ms > 0:
+            solver.set(timeout=max(1, timeout_ms - int(grounding_time * 1000)))
+        solver.add(formula)
+        res = solver.check()
+        if res == sat:
+            descriptions = self.describe_violations(
+                req, solver, max_violations, start + timeout_ms / 1000 if timeout_ms > 0 else None
+            )
+            result = self.violations_result(descriptions)
+        else:
+            descriptions = []
+            result = MCResult.from_z3result(res, flipped=True), ""
+        statistics = solver.statistics()
+        return result, RequirementProfile(
+            req.assert_name,
+            Engine.SAT.value,
+            time.perf_counter() - start,
+            {key: statistics.get_key_value(key) for key in statistics.keys()} | {"grounding time": grounding_time}
+            | ({"violations": len(descriptions)} if max_violations > 1 else {})
+        )
+
+    def check_datalog_requirement(
+        self,
+        req: Requirement,
+        timeout_ms: int = 0,
+        max_violations: int = 1
+    ) -> tuple[tuple[MCResult, str], RequirementProfile]:
+        """
+        Checks `req` by compiling its assertion into Datalog rules (see
+        `DatalogCompiler`) and evaluating them on the facts of the model,
+        for at most `timeout_ms` milliseconds (0 for no limit).
+        All violations are derived at once: the first `max_violations` with
+        different elements are described, each from a model of its values.
+        """
+        start = time.perf_counter()
+        if self.datalog is None:
+            self.datalog = DatalogCompiler(*self.walker_args())
+        try:
+            strata, head = self.datalog.compile(self.requirement_expression(req))
+            engine = DatalogEngine(
+                self.datalog.edb(),
+                self.datalog.constructors,
+                start + timeout_ms / 1000 if timeout_ms > 0 else None,
+                self.interrupted
+            )
+            violations = engine.evaluate(strata).get("violation", set())
+
+            # Violations with the same elements count as one, as with `describe_violations`.
+            positions = [i for i, const in enumerate(head) if const.sort() == self.smt_sorts.element_sort]
+            witnesses: dict[tuple, tuple] = {}
+            for violation in sorted(violations):
+                witnesses.setdefault(tuple(violation[i] for i in positions), violation)
+                if len(witnesses) == max_violations:
+                    break
+            witness_values = [[self.datalog.value(value) for value in violation] for violation in witnesses.values()]
+        except GroundingError:
+            return self.check_z3_requirement(req, timeout_ms, max_violations)
+        except GroundingTimeout:
+            return (MCResult.dontknow, ""), RequirementProfile(req.assert_name, Engine.DATALOG.value, time.perf_counter() - start)
+
+        descriptions = []
+        for values in witness_values:
+            witness = Solver(ctx=self.z3Context)
+            for const, value in zip(head, values):
+                witness.add(const == value)
+            witness.check()
+            descriptions.append(req.error_description(witness, self.smt_sorts, self.intermediate_model))
+        result = self.violations_result(descriptions)
+        return result, RequirementProfile(
+            req.assert_name,
+            Engine.DATALOG.value,
+            time.perf_counter() - start,
+            {
+                "rules": sum(len(rules) for rules in strata),
+                "derived tuples": sum(len(engine.relations[pred]) for pred in {rule.head.pred for rules in strata for rule in rules}),
+                "joins": engine.joins
+            } | ({"violations": len(descriptions)} if max_violations > 1 else {})
+        )
+
+    def iter_requirements(
+        self,
+        reqs: RequirementStore,
+        timeout: int = 0,
+        engine: EngineSelection = Engine.Z3,
+        deadline: Optional[float] = None,
+        max_violations: int = 1
+    ) -> Iterator[tuple[tuple[MCResult, str], RequirementProfile]]:
+        """
+        Yields the result and profile of each requirement as soon as it is checked.
+        Each Z3 check is limited to `timeout` seconds, and ends by `deadline`,
+        a `time.time()` value. Requirements left at the deadline are dontknow.
+        The description of a violated requirement covers up to `max_violations`
+        violations found within the same limits.
+        """
+        self.interrupted.clear()
+        graph = None
+        for req in reqs.get_all_requirements():
+            if uses_native_engine(req, engine, max_violations):
+                if graph is None:
+                    graph = ModelGraph(self.intermediate_model, self.metamodel, self.inv_assoc)
+                yield check_requirement_natively(req, graph)
+                continue
+
+            selected = selected_engine(req, engine)
+            timeout_ms = timeout * 1000
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    yield (MCResult.dontknow, ""), skipped_profile(req.assert_name, engine)
+                    continue
+                if timeout > 0:
+                    remaining = min(remaining, timeout)
+                timeout_ms = max(1, int(remaining * 1000))
+            if selected == Engine.SAT:
+                yield self.check_sat_requirement(req, timeout_ms, max_violations)
+            elif selected == Engine.DATALOG:
+                yield self.check_datalog_requirement(req, timeout_ms, max_violations)
+            else:
+                yield self.check_z3_requirement(req, timeout_ms, max_violations)
+
+    def check_requirements(
+        self,
+        reqs: RequirementStore,
+        timeout: int = 0,
+        engine: EngineSelection = Engine.Z3,
+        deadline: Optional[float] = None,
+        max_violations: int = 1
+    ) -> MCResults:
+        results = []
+        profile = Profile(dict(self.profile.phases), self.profile.assertions)
+        for result, req_profile in self.iter_requirements(reqs, timeout, engine, deadline, max_violations):
+            results.append(result)
+            profile.requirements.append(req_profile)
+        return MCResults(results, profile)
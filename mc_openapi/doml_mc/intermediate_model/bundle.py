@@ -0,0 +1,20 @@
+"""
+Regenerates the metamodel bundle in `mc_openapi/assets`, which must be done
+whenever a `doml_meta_*.yaml` file, the `metamodel` module or the package
+version changes::
+
+    python -m mc_openapi.doml_mc.intermediate_model.bundle
+
+A stale bundle is not used: metamodels are then loaded from YAML.
+"""
+import os
+
+from ... import assets
+from .metamodel import BUNDLE_NAME, build_metamodel_bundle
+
+
+if __name__ == "__main__":
+    path = os.path.join(os.path.dirname(assets.__file__), BUNDLE_NAME)
+    with open(path, "wb") as f:
+        f.write(build_metamodel_bundle())
+    print(f"Written {path}")
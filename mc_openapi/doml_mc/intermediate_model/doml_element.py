@@ -1,5 +1,7 @@
 from typing import Union, Optional
 from dataclasses import dataclass
+import hashlib
+import json
 
 from .metamodel import (
     MetaModel,
@@ -65,3 +67,22 @@ def reciprocate_inverse_associations(
                     im[atgt].associations[inv_dict[aname]] = im[
                         atgt
                     ].associations.get(inv_dict[aname], set()) | {ename}
+
+
+def fingerprint(im: IntermediateModel) -> str:
+    """
+    Returns a digest of the contents of `im` that does not depend on the
+    ordering of elements, attribute values and association targets.
+    Models that only differ in their XMI formatting have the same fingerprint.
+    """
+    canonical = sorted(
+        [
+            ename,
+            elem.class_,
+            elem.user_friendly_name,
+            sorted([aname, sorted(repr(v) for v in avalues)] for aname, avalues in elem.attributes.items()),
+            sorted([aname, sorted(atgts)] for aname, atgts in elem.associations.items()),
+        ]
+        for ename, elem in im.items()
+    )
+    return hashlib.sha256(json.dumps(canonical).encode()).hexdigest()
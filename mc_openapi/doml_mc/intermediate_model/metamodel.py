@@ -1,13 +1,14 @@
 from dataclasses import dataclass
-from typing import cast, Literal, Optional, Union
+from typing import Literal, Optional, Union
 from enum import Enum
+import hashlib
+import pickle
 
 import importlib.resources as ilres
 import yaml
-import networkx as nx
 
-from ... import assets
-from .._utils import merge_dicts
+from ... import __version__, assets
+from .._utils import LazyDict, merge_dicts
 
 
 class DOMLVersion(Enum):
@@ -53,8 +54,33 @@ class DOMLAssociation:
 MetaModel = dict[str, DOMLClass]
 InverseAssociation = list[tuple[str, str]]
 
-MetaModels: dict[DOMLVersion, MetaModel] = {}
-InverseAssociations: dict[DOMLVersion, InverseAssociation] = {}
+
+@dataclass
+class MetaModelIndex:
+    """
+    Lookup tables compiled from a metamodel, so that mangling names and
+    collecting defaults need not walk up the superclass chain.
+    """
+    # (class, attribute name) -> mangled name, also for inherited attributes.
+    attribute_names: dict[tuple[str, str], str]
+    # (class, association name) -> mangled name, also for inherited associations.
+    association_names: dict[tuple[str, str], str]
+    # class -> mangled defaults of its attributes, inherited ones included.
+    attribute_defaults: dict[str, dict[str, list[Union[str, int, bool]]]]
+    # class -> the class and its subclasses.
+    subclasses: dict[str, set[str]]
+    # class -> the class and its superclasses.
+    superclasses: dict[str, set[str]]
+
+
+# The metamodel of each DOML version is loaded the first time it is needed,
+# from the bundle if it is up to date, else from its YAML file.
+MetaModels: dict[DOMLVersion, MetaModel] = LazyDict(lambda ver: load_metamodel(ver))
+InverseAssociations: dict[DOMLVersion, InverseAssociation] = LazyDict(lambda ver: load_metamodel(ver))
+MetaModelIndices: dict[DOMLVersion, MetaModelIndex] = LazyDict(lambda ver: load_metamodel(ver))
+# Indices of the metamodels in use, by id. The metamodel is kept alongside
+# its index, so that its id cannot be reused.
+_indices_by_id: dict[int, tuple[MetaModel, MetaModelIndex]] = {}
 
 
 def parse_metamodel(mmdoc: dict) -> MetaModel:
@@ -151,28 +177,117 @@ def parse_inverse_associations(doc: dict) -> list[tuple[str, str]]:
     ]
 
 
-def init_metamodels():
-    global MetaModels, InverseAssociations
+# Pickled MetaModels, InverseAssociations and MetaModelIndices,
+# generated by `python -m mc_openapi.doml_mc.intermediate_model.bundle`.
+BUNDLE_NAME = "doml_meta.bundle"
+# Must change whenever the pickled classes do.
+BUNDLE_FORMAT = 1
+# Raised by unpickling a bundle that is truncated, or that refers to classes
+# or attributes that changed.
+_UNPICKLING_ERRORS = (pickle.UnpicklingError, EOFError, ImportError, AttributeError, KeyError, TypeError, ValueError)
+_bundle: Optional[dict] = None
+
+
+def read_metamodel_doc(ver: DOMLVersion) -> bytes:
+    return ilres.read_binary(assets, f"doml_meta_{ver.value}.yaml")
+
+
+def metamodel_digest(mmdoc: bytes) -> str:
+    """
+    The digest of `mmdoc` and of the code compiling it, i.e., this module
+    and the package version: the bundle is only used if they all match.
+    """
+    digest = hashlib.sha256(mmdoc)
+    with open(__file__, "rb") as f:
+        digest.update(f.read())
+    digest.update(__version__.encode())
+    return digest.hexdigest()
+
+
+def compile_metamodel(mmdoc: bytes) -> tuple[MetaModel, InverseAssociation, MetaModelIndex]:
+    doc = yaml.load(mmdoc, getattr(yaml, "CLoader", yaml.Loader))
+    mm = parse_metamodel(doc)
+    return mm, parse_inverse_associations(doc), build_metamodel_index(mm)
+
+
+def build_metamodel_bundle() -> bytes:
+    versions = {}
     for ver in DOMLVersion:
-        mmdoc = yaml.load(ilres.read_text(assets, f"doml_meta_{ver.value}.yaml"), yaml.Loader)
-        MetaModels[ver] = parse_metamodel(mmdoc)
-        InverseAssociations[ver] = parse_inverse_associations(mmdoc)
+        mmdoc = read_metamodel_doc(ver)
+        versions[ver.value] = (metamodel_digest(mmdoc), pickle.dumps(compile_metamodel(mmdoc)))
+    return pickle.dumps({"format": BUNDLE_FORMAT, "versions": versions})
+
+
+def get_metamodel_bundle() -> dict:
+    """
+    Returns the versions in the bundle, as (YAML digest, pickled metamodel)
+    pairs, or an empty dict if the bundle is missing or of another format.
+    """
+    global _bundle
+    if _bundle is None:
+        try:
+            bundle = pickle.loads(ilres.read_binary(assets, BUNDLE_NAME))
+            _bundle = bundle["versions"] if bundle.get("format") == BUNDLE_FORMAT else {}
+        except (OSError, *_UNPICKLING_ERRORS):
+            _bundle = {}
+    return _bundle
+
+
+def load_metamodel(ver: DOMLVersion) -> None:
+    mmdoc = read_metamodel_doc(ver)
+    digest, pickled = get_metamodel_bundle().get(ver.value, (None, None))
+    compiled = None
+    if digest == metamodel_digest(mmdoc):
+        try:
+            compiled = pickle.loads(pickled)
+        except _UNPICKLING_ERRORS:
+            pass
+    mm, inv_assocs, index = compiled if compiled is not None else compile_metamodel(mmdoc)
+    _indices_by_id[id(mm)] = (mm, index)
+    dict.__setitem__(MetaModelIndices, ver, index)
+    dict.__setitem__(InverseAssociations, ver, inv_assocs)
+    dict.__setitem__(MetaModels, ver, mm)
 
 
-def _find_association_class(
-    mm: MetaModel,
-    cname: str,
-    aname: str,
-) -> DOMLClass:
-    c = mm[cname]
-    if aname in c.associations:
-        return c
-    elif c.superclass is None:
-        raise AssociationNotFound(
-            f"Association {aname} not found in subclasses of {cname}."
-        )
-    else:
-        return _find_association_class(mm, c.superclass, aname)
+def init_metamodels():
+    """Loads the metamodels of all DOML versions right away."""
+    for ver in DOMLVersion:
+        MetaModels[ver]
+
+
+def build_metamodel_index(mm: MetaModel) -> MetaModelIndex:
+    attribute_names: dict[tuple[str, str], str] = {}
+    association_names: dict[tuple[str, str], str] = {}
+    attribute_defaults: dict[str, dict[str, list[Union[str, int, bool]]]] = {}
+    subclasses: dict[str, set[str]] = {cname: set() for cname in mm}
+    superclasses: dict[str, set[str]] = {}
+    for cname in mm:
+        c: Optional[DOMLClass] = mm[cname]
+        chain = []
+        while c is not None:
+            chain.append(c)
+            c = mm[c.superclass] if c.superclass is not None else None
+        superclasses[cname] = {c.name for c in chain}
+        for c in chain:
+            subclasses[c.name].add(cname)
+        # Attributes declared closer to `cname` take precedence.
+        defaults = {}
+        for c in reversed(chain):
+            for aname, a in c.attributes.items():
+                attribute_names[cname, aname] = f"{c.name}::{aname}"
+                if a.default is not None:
+                    defaults[f"{c.name}::{aname}"] = a.default
+            for aname in c.associations:
+                association_names[cname, aname] = f"{c.name}::{aname}"
+        attribute_defaults[cname] = defaults
+    return MetaModelIndex(attribute_names, association_names, attribute_defaults, subclasses, superclasses)
+
+
+def get_metamodel_index(mm: MetaModel) -> MetaModelIndex:
+    """Returns the index of `mm`, building it the first time."""
+    if id(mm) not in _indices_by_id:
+        _indices_by_id[id(mm)] = (mm, build_metamodel_index(mm))
+    return _indices_by_id[id(mm)][1]
 
 
 def get_mangled_association_name(
@@ -180,74 +295,38 @@ def get_mangled_association_name(
     cname: str,
     aname: str,
 ) -> str:
-    return f"{_find_association_class(mm, cname, aname).name}::{aname}"
+    try:
+        return get_metamodel_index(mm).association_names[cname, aname]
+    except KeyError:
+        raise AssociationNotFound(
+            f"Association {aname} not found in subclasses of {cname}."
+        )
 
 
 def get_mangled_attribute_defaults(
     mm: MetaModel,
     cname: str,
 ) -> dict[str, list[Union[str, int, bool]]]:
-    c = mm[cname]
-    defaults = {
-        f"{cname}::{aname}": a.default
-        for aname, a in c.attributes.items()
-        if a.default is not None
-    }
-    if c.superclass is None:
-        return defaults
-    else:
-        return get_mangled_attribute_defaults(mm, c.superclass) | defaults
+    """The returned dict is shared: do not modify it."""
+    return get_metamodel_index(mm).attribute_defaults[cname]
 
 
-def _find_attribute_class(
+def get_mangled_attribute_name(
     mm: MetaModel,
     cname: str,
     aname: str,
-) -> DOMLClass:
-    c = mm[cname]
-    if aname in c.attributes:
-        return c
-    elif c.superclass is None:
+) -> str:
+    try:
+        return get_metamodel_index(mm).attribute_names[cname, aname]
+    except KeyError:
         raise AttributeNotFound(
             f"Attribute {aname} not found in subclasses of {cname}."
         )
-    else:
-        return _find_attribute_class(mm, c.superclass, aname)
-
-
-def get_mangled_attribute_name(
-    mm: MetaModel,
-    cname: str,
-    aname: str,
-) -> str:
-    return f"{_find_attribute_class(mm, cname, aname).name}::{aname}"
 
 
 def get_subclasses_dict(mm: MetaModel) -> dict[str, set[str]]:
-    inherits_dg = nx.DiGraph(
-        [
-            (c.name, c.superclass)
-            for c in mm.values()
-            if c.superclass is not None
-        ]
-    )
-    inherits_dg.add_nodes_from(mm)
-    inherits_dg_trans = cast(
-        nx.DiGraph, nx.transitive_closure(inherits_dg, reflexive=True)
-    )
-    return {cname: set(inherits_dg_trans.predecessors(cname)) for cname in mm}
+    return {cname: set(subs) for cname, subs in get_metamodel_index(mm).subclasses.items()}
 
 
 def get_superclasses_dict(mm: MetaModel) -> dict[str, set[str]]:
-    inherits_dg = nx.DiGraph(
-        [
-            (c.name, c.superclass)
-            for c in mm.values()
-            if c.superclass is not None
-        ]
-    )
-    inherits_dg.add_nodes_from(mm)
-    inherits_dg_trans = cast(
-        nx.DiGraph, nx.transitive_closure(inherits_dg, reflexive=True)
-    )
-    return {cname: set(inherits_dg_trans.successors(cname)) for cname in mm}
+    return {cname: set(sups) for cname, sups in get_metamodel_index(mm).superclasses.items()}
@@ -0,0 +1,175 @@
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from enum import Enum
+from typing import Callable, Optional
+
+from .mc_result import MCResults
+
+
+class JobState(Enum):
+    queued = 1
+    running = 2
+    done = 3
+    failed = 4
+    cancelled = 5
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    """
+    A model check run in the background by a `JobQueue`.
+    Once finished, it holds the `results` of the check, or the `error`
+    that prevented it.
+    """
+
+    def __init__(self, xmi_model: bytes, deadline: float):
+        self.id = uuid.uuid4().hex
+        self.xmi_model = xmi_model
+        self.state = JobState.queued
+        self.results: Optional[MCResults] = None
+        self.error: Optional[str] = None
+        # Times from `time.monotonic()`.
+        self.deadline = deadline
+        self.finished_at: Optional[float] = None
+        self._finished = threading.Event()
+        self._cancelled = threading.Event()
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline of the job."""
+        return max(0.0, self.deadline - time.monotonic())
+
+    def is_cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def is_finished(self) -> bool:
+        return self._finished.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Waits at most `timeout` seconds for the job to finish."""
+        return self._finished.wait(timeout)
+
+    def wait_futures(self, futures: list[Future], poll_interval: float = 0.1) -> bool:
+        """
+        Waits for `futures` to complete, unless the job is cancelled or its
+        deadline passes first. Returns whether they all completed.
+        """
+        not_done = set(futures)
+        while not_done and not self.is_cancelled() and self.remaining() > 0:
+            _, not_done = wait(not_done, timeout=min(poll_interval, self.remaining()))
+        return not not_done
+
+    def _finish(self, state: JobState):
+        # A job cancelled while it was starting could finish twice.
+        if self.is_finished():
+            return
+        self.state = state
+        self.finished_at = time.monotonic()
+        self.xmi_model = b""
+        self._finished.set()
+
+
+class JobQueue:
+    """
+    Runs jobs with `run` on `workers` threads, so that HTTP requests need
+    not wait for their checks to complete.
+
+    ### Parameters
+     - `run` checks the model of a job and returns its results. It should
+       give up soon after the job is cancelled or its deadline passes;
+     - `expired` returns the results of a job whose deadline passed before
+       it could start, without checking its model;
+     - `workers` is the number of jobs run at the same time;
+     - `max_queue` is the maximum number of jobs not yet finished.
+       Submitting more raises `JobQueueFull`. 0 means unbounded;
+     - `deadline` is the number of seconds after submission by which a job
+       must finish. Jobs still queued by then are not run, and their results
+       are those of `expired`;
+     - finished jobs are kept for `ttl` seconds, and at most `max_finished`
+       of them, dropping the oldest first.
+    """
+
+    def __init__(
+        self,
+        run: Callable[[Job], MCResults],
+        expired: Callable[[Job], MCResults],
+        workers: int,
+        max_queue: int = 0,
+        deadline: float = 300,
+        ttl: float = 600,
+        max_finished: int = 256
+    ):
+        self.run = run
+        self.expired = expired
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.ttl = ttl
+        self.max_finished = max_finished
+        self.lock = threading.Lock()
+        self.jobs: dict[str, Job] = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mc-job")
+
+    def _expire(self):
+        now = time.monotonic()
+        finished = sorted(
+            (job for job in self.jobs.values() if job.is_finished()),
+            key=lambda job: job.finished_at
+        )
+        for i, job in enumerate(finished):
+            if now - job.finished_at > self.ttl or len(finished) - i > self.max_finished:
+                del self.jobs[job.id]
+
+    def submit(self, xmi_model: bytes) -> Job:
+        with self.lock:
+            self._expire()
+            unfinished = sum(1 for job in self.jobs.values() if not job.is_finished())
+            if self.max_queue > 0 and unfinished >= self.max_queue:
+                raise JobQueueFull("Too many jobs are waiting to be checked, try again later.")
+            job = Job(xmi_model, time.monotonic() + self.deadline)
+            self.jobs[job.id] = job
+        self._executor.submit(self._run, job)
+        return job
+
+    def _run(self, job: Job):
+        if job.is_cancelled():
+            return
+        expired = job.remaining() <= 0
+        if not expired:
+            job.state = JobState.running
+        try:
+            results = self.expired(job) if expired else self.run(job)
+        except Exception as e:
+            job.error = str(e)
+            job._finish(JobState.failed)
+            return
+        if job.is_cancelled():
+            job._finish(JobState.cancelled)
+        else:
+            job.results = results
+            job._finish(JobState.done)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.lock:
+            self._expire()
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancels a job and forgets it. A running job stops waiting for its
+        checks, and interrupts those running in the worker pool.
+        """
+        with self.lock:
+            job = self.jobs.pop(job_id, None)
+        if job is None:
+            return False
+        job._cancelled.set()
+        if job.state == JobState.queued:
+            job._finish(JobState.cancelled)
+        return True
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
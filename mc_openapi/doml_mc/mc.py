@@ -1,15 +1,29 @@
+import math
+import time
 from typing import Optional
-from joblib import parallel_backend, Parallel, delayed
-from multiprocessing import TimeoutError
+from collections.abc import Iterator
+from contextlib import closing, nullcontext
+from concurrent.futures import Future, as_completed, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from functools import cache
 
 from .intermediate_model.metamodel import (
     DOMLVersion,
     MetaModels,
     InverseAssociations
 )
-from .xmi_parser.doml_model import parse_doml_model
-from .mc_result import MCResult, MCResults
-from .imc import RequirementStore, IntermediateModelChecker
+from .xmi_parser.doml_model import XMIParser, parse_doml_model
+from ._utils import timed
+from .mc_result import MCResult, MCResults, Profile, RequirementProfile
+from .intermediate_model import IntermediateModel
+from .imc import (
+    EncodedModel, Engine, EngineSelection, RequirementStore, IntermediateModelChecker, SolverConfig,
+    check_requirement_natively, skipped_profile, uses_native_engine
+)
+from .model_graph import ModelGraph
+from .portfolio import PortfolioChecker
+from .requirement_costs import requirement_costs
+from .worker_pool import CancelFlag, WorkerPool
 from .common_reqs import CommonRequirements
 from .consistency_reqs import (
     get_attribute_type_reqs,
@@ -20,47 +34,484 @@ from .consistency_reqs import (
 )
 
 
+@cache
+def get_requirements(doml_version: DOMLVersion, consistency_checks: bool) -> RequirementStore:
+    """
+    The stores are built once per version, and shared: do not modify them.
+    Sharing the same `Requirement` objects also lets checkers reuse the
+    expressions they built for them.
+    """
+    req_store = CommonRequirements[doml_version]
+    if consistency_checks:
+        metamodel = MetaModels[doml_version]
+        req_store = req_store \
+            + get_attribute_type_reqs(metamodel) \
+            + get_attribute_multiplicity_reqs(metamodel) \
+            + get_association_type_reqs(metamodel) \
+            + get_association_multiplicity_reqs(metamodel) \
+            + get_inverse_association_reqs(InverseAssociations[doml_version])
+    return req_store
+
+
+def make_checker(
+    metamodel,
+    inv_assoc,
+    intermediate_model: IntermediateModel,
+    portfolio: Optional[list[SolverConfig]] = None,
+    encoded_model: Optional[EncodedModel] = None
+) -> IntermediateModelChecker:
+    """A checker racing the solver configurations of `portfolio`, if any."""
+    if portfolio:
+        return PortfolioChecker(metamodel, inv_assoc, intermediate_model, portfolio, encoded_model)
+    return IntermediateModelChecker(metamodel, inv_assoc, intermediate_model, encoded_model=encoded_model)
+
+
+def check_requirements_worker(
+    doml_version: DOMLVersion,
+    intermediate_model: IntermediateModel,
+    encoded_model: EncodedModel,
+    consistency_checks: bool,
+    req_indices: list[int],
+    timeout: int = 0,
+    deadline: Optional[float] = None,
+    portfolio: Optional[list[SolverConfig]] = None,
+    engine: EngineSelection = Engine.Z3,
+    max_violations: int = 1,
+    cancel_flag: Optional[CancelFlag] = None
+) -> MCResults:
+    """
+    Checks the requirements of `get_requirements` at `req_indices` on a model
+    whose encoding has already been built. It only takes plain data, so it can
+    run in a WorkerPool.
+    `deadline` is a `time.time()` value, shared by the parent process.
+    Checks with Z3, SAT or Datalog are interrupted once `cancel_flag` is set.
+    """
+    imc = make_checker(
+        MetaModels[doml_version], InverseAssociations[doml_version], intermediate_model, portfolio, encoded_model
+    )
+    reqs = get_requirements(doml_version, consistency_checks).get_all_requirements()
+    with closing(imc), cancel_flag.watch(imc.interrupt) if cancel_flag is not None else nullcontext():
+        return imc.check_requirements(
+            RequirementStore([reqs[i] for i in req_indices]),
+            timeout=timeout, engine=engine, deadline=deadline, max_violations=max_violations
+        )
+
+
+# Seconds that a process waits after the deadline for the results of its
+# workers, which stop checking at the deadline.
+RESULT_GRACE = 0.5
+
+
+def unchecked_results(names: list[str], engine: EngineSelection = Engine.Z3) -> MCResults:
+    """Results for requirements that were not checked before the deadline by the engines of `engine`."""
+    return MCResults(
+        [(MCResult.dontknow, "")] * len(names),
+        Profile(requirements=[skipped_profile(name, engine) for name in names])
+    )
+
+
+class PendingResults:
+    """
+    The results of checking the requirements of a `ModelChecker`, some of
+    which may still be computed by the workers of a pool, in `futures`.
+    """
+
+    def __init__(
+        self,
+        req_names: list[str],
+        profile: Profile,
+        native_results: dict[int, tuple[MCResult, str]],
+        native_profiles: dict[int, RequirementProfile],
+        z3_indices: list[int],
+        deadline: Optional[float] = None,
+        engine: EngineSelection = Engine.Z3,
+        max_violations: int = 1
+    ):
+        self.req_names = req_names
+        self.profile = profile
+        self.native_results = native_results
+        self.native_profiles = native_profiles
+        self.z3_indices = z3_indices
+        # A `time.time()` value.
+        self.deadline = deadline
+        # Selects the engine of the requirements at `z3_indices`, which may
+        # be checked with the SAT engine instead of Z3.
+        self.engine = engine
+        # Violations described for each violated requirement, at most.
+        self.max_violations = max_violations
+        self.futures: list[Future] = []
+        # The indices of the requirements checked by each future.
+        self.slices: list[list[int]] = []
+        # Interrupts the futures still running when cancelled.
+        self.cancel_flag = CancelFlag()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, if any."""
+        return None if self.deadline is None else max(0.0, self.deadline - time.time())
+
+    def merge(self, z3_results: MCResults, indices: Optional[list[int]] = None) -> MCResults:
+        """
+        Merges the results of the requirements at `indices`, by default
+        `z3_indices`, with the native ones.
+        """
+        n_reqs = len(self.req_names)
+        indices = self.z3_indices if indices is None else indices
+        profile = self.profile
+        results = self.native_results | dict(zip(indices, z3_results.results))
+        req_profiles = self.native_profiles | dict(zip(indices, z3_results.profile.requirements))
+        for phase, time_ in z3_results.profile.phases.items():
+            profile.phases[phase] = profile.phases.get(phase, 0.0) + time_
+        profile.assertions = max(profile.assertions, z3_results.profile.assertions)
+        profile.requirements = [req_profiles[i] for i in range(n_reqs)]
+        return MCResults([results[i] for i in range(n_reqs)], profile)
+
+    def timed_out(self) -> MCResults:
+        """
+        The results of the futures that completed, the requirements of the
+        others, and those never submitted, being dontknow.
+        """
+        ret = MCResults([])
+        for future, indices in zip(self.futures, self.slices):
+            if future.done() and not future.cancelled() and future.exception() is None:
+                ret.add_results(future.result())
+            else:
+                ret.add_results(unchecked_results([self.req_names[i] for i in indices], self.engine))
+        submitted = {i for indices in self.slices for i in indices}
+        unsubmitted = [i for i in self.z3_indices if i not in submitted]
+        ret.add_results(unchecked_results([self.req_names[i] for i in unsubmitted], self.engine))
+        return self.merge(ret, [i for indices in self.slices for i in indices] + unsubmitted)
+
+    def done(self) -> bool:
+        return all(future.done() for future in self.futures)
+
+    def cancel(self):
+        """
+        Cancels the futures that did not start, and interrupts the Z3 checks
+        of those running, which then end soon with their results so far.
+        """
+        for future in self.futures:
+            future.cancel()
+        self.cancel_flag.set()
+
+    def result(self) -> MCResults:
+        """
+        The merged results, once all `futures` are done.
+        Raises the exception of the first future that failed, if any.
+        """
+        ret = MCResults([])
+        for future in self.futures:
+            ret.add_results(future.result())
+        return self.merge(ret, [i for indices in self.slices for i in indices])
+
+
+# Requirements expected to take less than this many seconds are grouped in
+# a task, so that they do not each pay the overhead of loading the encoding.
+MIN_TASK_TIME = 0.05
+
+
+def schedule_reqs(names: list[str], workers: int) -> list[list[int]]:
+    """
+    Groups the positions of `names` into tasks for `workers` workers, which
+    take them from a queue as they become free.
+    Tasks come by decreasing expected time, from `requirement_costs`, so that
+    the longest checks start first, and requirements never checked before
+    are expected to be the longest. Cheap requirements are grouped in tasks
+    of about half the share of each worker, so that the workers can still
+    balance their load.
+    """
+    times = [requirement_costs.mean_time(name) for name in names]
+    target = max(MIN_TASK_TIME, sum(t for t in times if t is not None) / (2 * max(1, workers)))
+    tasks: list[list[int]] = []
+    task_time = 0.0
+    for i in sorted(range(len(names)), key=lambda i: -math.inf if times[i] is None else -times[i]):
+        if not tasks or task_time >= target:
+            tasks.append([])
+            task_time = 0.0
+        tasks[-1].append(i)
+        task_time += math.inf if times[i] is None else times[i]
+    return tasks
+
+
 class ModelChecker:
-    def __init__(self, xmi_model: bytes, doml_version: Optional[DOMLVersion] = None):
-        self.intermediate_model, self.doml_version = parse_doml_model(xmi_model, doml_version)
+    def __init__(
+        self,
+        xmi_model: bytes,
+        doml_version: Optional[DOMLVersion] = None,
+        parser: XMIParser = XMIParser.STREAMING,
+        portfolio: Optional[list[SolverConfig]] = None
+    ):
+        """
+        With a `portfolio` of solver configurations, each requirement is
+        checked with all of them at once, and the first to answer wins.
+        """
+        self.portfolio = portfolio
+        self.parse_phases: dict[str, float] = {}
+        with timed(self.parse_phases, "parse"):
+            self.intermediate_model, self.doml_version = parse_doml_model(xmi_model, doml_version, parser)
         self.metamodel = MetaModels[self.doml_version]
         self.inv_assoc = InverseAssociations[self.doml_version]
 
-    def check_common_requirements(self, threads: int = 1, consistency_checks: bool = False, timeout: Optional[int] = None) -> MCResults:
+    def deadline(self, timeout: Optional[float]) -> Optional[float]:
+        """
+        The `time.time()` by which a check with a budget of `timeout` seconds
+        must end. The budget covers parsing the model, which is already done.
+        """
+        if not timeout:
+            return None
+        return time.time() + timeout - self.parse_phases.get("parse", 0.0)
+
+    def check_natively(
+        self,
+        consistency_checks: bool,
+        engine: EngineSelection,
+        timeout: Optional[float] = None,
+        max_violations: int = 1
+    ) -> PendingResults:
+        """
+        Checks the requirements for which `engine` selects the native engine,
+        unless more than one violation is to be found.
+        The others are left to be checked with Z3, at `z3_indices`, within
+        the deadline of the returned `PendingResults`.
+        """
+        reqs = get_requirements(self.doml_version, consistency_checks).get_all_requirements()
+        pending = PendingResults(
+            [req.assert_name for req in reqs], Profile(dict(self.parse_phases)), {}, {}, [],
+            deadline=self.deadline(timeout), engine=engine, max_violations=max_violations
+        )
+        graph = ModelGraph(self.intermediate_model, self.metamodel, self.inv_assoc)
+        for i, req in enumerate(reqs):
+            if uses_native_engine(req, engine, max_violations):
+                pending.native_results[i], pending.native_profiles[i] = check_requirement_natively(req, graph)
+            else:
+                pending.z3_indices.append(i)
+        return pending
+
+    def encode(self, pending: PendingResults) -> IntermediateModelChecker:
+        """A checker of the model, to be closed once done with it."""
+        imc = make_checker(self.metamodel, self.inv_assoc, self.intermediate_model, self.portfolio)
+        pending.profile.phases |= imc.profile.phases
+        pending.profile.assertions = imc.profile.assertions
+        return imc
+
+    def submit_z3_requirements(
+        self,
+        pending: PendingResults,
+        pool: WorkerPool,
+        tasks: list[list[int]],
+        consistency_checks: bool = False
+    ):
+        """
+        Encodes the model and submits the requirements at `pending.z3_indices`
+        to `pool`, grouped into `tasks` of positions in `z3_indices`, adding
+        their futures to `pending`.
+        If `pool` is full, the tasks already submitted are cancelled.
+        """
+        # Workers load the encoding built here instead of rebuilding it.
+        with closing(self.encode(pending)) as imc, timed(pending.profile.phases, "export_encoding"):
+            encoded_model = imc.export_encoding()
+        try:
+            for task in tasks:
+                indices = [pending.z3_indices[k] for k in task]
+                pending.futures.append(pool.submit(
+                    check_requirements_worker,
+                    self.doml_version, self.intermediate_model, encoded_model,
+                    consistency_checks, indices, 0, pending.deadline, self.portfolio, pending.engine,
+                    pending.max_violations, pending.cancel_flag
+                ))
+                pending.slices.append(indices)
+        except BaseException:
+            pending.cancel()
+            raise
+
+    def submit_common_requirements(
+        self,
+        pool: WorkerPool,
+        threads: int = 1,
+        consistency_checks: bool = False,
+        timeout: Optional[float] = None,
+        engine: EngineSelection = Engine.Z3,
+        max_violations: int = 1
+    ) -> PendingResults:
+        """
+        Checks the requirements for which `engine` selects the native engine,
+        and submits the others to `pool`, scheduled by `schedule_reqs` for
+        `threads` workers, without waiting for them.
+        The workers stop checking requirements `timeout` seconds after the
+        model started being parsed.
+        """
+        assert self.metamodel and self.inv_assoc
+        pending = self.check_natively(consistency_checks, engine, timeout, max_violations)
+        if pending.z3_indices:
+            tasks = schedule_reqs([pending.req_names[i] for i in pending.z3_indices], threads)
+            self.submit_z3_requirements(pending, pool, tasks, consistency_checks)
+        return pending
+
+    def iter_common_requirements(
+        self,
+        consistency_checks: bool = False,
+        timeout: Optional[float] = None,
+        pool: Optional[WorkerPool] = None,
+        engine: EngineSelection = Engine.Z3,
+        profile: Optional[Profile] = None,
+        max_violations: int = 1
+    ) -> Iterator[tuple[int, tuple[MCResult, str], RequirementProfile]]:
+        """
+        Yields the index in `get_requirements` of each requirement, with its
+        result and profile, as soon as it is checked.
+        Natively checked requirements come first. The others are checked by
+        increasing expected cost in `requirement_costs`. If `pool` is given,
+        each of them is a separate task, and they come in order of completion.
+        Those not checked within the `timeout` budget are dontknow.
+        The phases of parsing and encoding the model are added to `profile`.
+        Violated requirements describe up to `max_violations` violations.
+        Closing the iterator cancels the tasks that did not start yet, and
+        interrupts the Z3 checks of those running in `pool`.
+        """
         assert self.metamodel and self.inv_assoc
-        req_store = CommonRequirements[self.doml_version]
-        if consistency_checks:
-            req_store = req_store \
-                + get_attribute_type_reqs(self.metamodel) \
-                + get_attribute_multiplicity_reqs(self.metamodel) \
-                + get_association_type_reqs(self.metamodel) \
-                + get_association_multiplicity_reqs(self.metamodel) \
-                + get_inverse_association_reqs(self.inv_assoc)
-
-        def worker(rfrom: int, rto: int):
-            imc = IntermediateModelChecker(self.metamodel, self.inv_assoc, self.intermediate_model)
-            rs = RequirementStore(req_store.get_all_requirements()[rfrom:rto])
-            return imc.check_requirements(rs)
+        pending = self.check_natively(consistency_checks, engine, timeout, max_violations)
+        if profile is not None:
+            pending.profile = profile
+            profile.phases |= self.parse_phases
+        for i in sorted(pending.native_results):
+            yield i, pending.native_results[i], pending.native_profiles[i]
+        if not pending.z3_indices:
+            return
+
+        reqs = get_requirements(self.doml_version, consistency_checks).get_all_requirements()
+        order = requirement_costs.order([reqs[i].assert_name for i in pending.z3_indices])
+        pending.z3_indices = [pending.z3_indices[k] for k in order]
+
+        if pool is None:
+            with closing(self.encode(pending)) as imc, closing(imc.iter_requirements(
+                RequirementStore([reqs[i] for i in pending.z3_indices]),
+                engine=pending.engine, deadline=pending.deadline, max_violations=max_violations
+            )) as z3_results:
+                for i, (result, req_profile) in zip(pending.z3_indices, z3_results):
+                    requirement_costs.record(req_profile.name, req_profile.time, result[0])
+                    yield i, result, req_profile
+            return
+
+        self.submit_z3_requirements(pending, pool, [[k] for k in range(len(pending.z3_indices))], consistency_checks)
+        indices = dict(zip(pending.futures, pending.z3_indices))
+        remaining = pending.remaining()
+        try:
+            for future in as_completed(pending.futures, timeout=None if remaining is None else remaining + RESULT_GRACE):
+                results = future.result()
+                result, req_profile = results.results[0], results.profile.requirements[0]
+                requirement_costs.record(req_profile.name, req_profile.time, result[0])
+                yield indices.pop(future), result, req_profile
+        except FutureTimeoutError:
+            unchecked = sorted(indices.values())
+            timed_out = unchecked_results([reqs[i].assert_name for i in unchecked], pending.engine)
+            yield from zip(unchecked, timed_out.results, timed_out.profile.requirements)
+        finally:
+            pending.cancel()
+
+    def check_common_requirements(
+        self,
+        threads: int = 1,
+        consistency_checks: bool = False,
+        timeout: Optional[float] = None,
+        pool: Optional[WorkerPool] = None,
+        engine: EngineSelection = Engine.Z3,
+        fail_fast: bool = False,
+        max_violations: int = 1
+    ) -> MCResults:
+        """
+        If `pool` is given, requirements are checked by its workers, grouped
+        into tasks by `schedule_reqs` for `threads` workers. Otherwise,
+        `threads > 1` starts a new pool of processes for this call only.
+        Requirements for which `engine` selects the native engine are checked
+        here, and the model is only encoded for Z3 if some requirements remain.
+        The profile of the results includes the time spent parsing the model.
+
+        `timeout` is the budget in seconds of the whole check, including
+        parsing and encoding the model. Each Z3 check gets the budget left,
+        and the requirements not checked by then are dontknow, while those
+        already checked keep their result.
+
+        With `fail_fast`, checking stops at the first violated requirement, and
+        the results only include the requirements checked until then.
+        Requirements are then checked one by one, by the workers of `pool`
+        if given, else in this process.
+
+        The description of each violated requirement covers up to
+        `max_violations` of its violations, found with the solver of its
+        check. Further violations are searched within the same `timeout`
+        budget, and those found by then are kept.
+        """
+        assert self.metamodel and self.inv_assoc
+        if fail_fast:
+            return self.check_until_violation(consistency_checks, timeout, pool, engine, max_violations)
+        if pool is not None:
+            pending = self.submit_common_requirements(pool, threads, consistency_checks, timeout, engine, max_violations)
+            return self.wait_results(pending)
+
+        pending = self.check_natively(consistency_checks, engine, timeout, max_violations)
+        if not pending.z3_indices:
+            return pending.merge(MCResults([]))
 
         if threads <= 1:
-            imc = IntermediateModelChecker(self.metamodel, self.inv_assoc, self.intermediate_model)
-            reqs = imc.check_requirements(req_store, timeout=(0 if timeout is None else timeout))
-            return reqs
-        else:
-            def split_reqs(n_reqs: int, n_split: int):
-                slice_size = n_reqs // n_split
-                rto = 0
-                while rto < n_reqs:
-                    rfrom = rto
-                    rto = min(rfrom + slice_size, n_reqs)
-                    yield rfrom, rto
-
-            try:
-                with parallel_backend('loky', n_jobs=threads):
-                    results = Parallel(timeout=timeout)(delayed(worker)(rfrom, rto) for rfrom, rto in split_reqs(len(req_store), threads))
-                ret = MCResults([])
-                for res in results:
-                    ret.add_results(res)
-                return ret
-            except TimeoutError:
-                return MCResults([(MCResult.dontknow, "")])
+            reqs = get_requirements(self.doml_version, consistency_checks).get_all_requirements()
+            with closing(self.encode(pending)) as imc:
+                z3_results = imc.check_requirements(
+                    RequirementStore([reqs[i] for i in pending.z3_indices]),
+                    engine=pending.engine, deadline=pending.deadline, max_violations=max_violations
+                )
+            # The phases of imc are already in the profile.
+            z3_results.profile.phases = {}
+            results = pending.merge(z3_results)
+            requirement_costs.record_results(results)
+            return results
+
+        # A pool of processes for this call only.
+        pool = WorkerPool(threads)
+        try:
+            tasks = schedule_reqs([pending.req_names[i] for i in pending.z3_indices], threads)
+            self.submit_z3_requirements(pending, pool, tasks, consistency_checks)
+            return self.wait_results(pending)
+        finally:
+            # Tasks still running stop checking at the deadline.
+            pool.shutdown(wait=False)
+
+    @staticmethod
+    def wait_results(pending: PendingResults) -> MCResults:
+        """
+        Waits for the futures of `pending` until its deadline, returning the
+        results of those done, and dontknow for the requirements of the others.
+        """
+        remaining = pending.remaining()
+        try:
+            _, not_done = wait(pending.futures, timeout=None if remaining is None else remaining + RESULT_GRACE)
+        finally:
+            pending.cancel()
+        if not_done:
+            return pending.timed_out()
+        results = pending.result()
+        requirement_costs.record_results(results)
+        return results
+
+    def check_until_violation(
+        self,
+        consistency_checks: bool = False,
+        timeout: Optional[float] = None,
+        pool: Optional[WorkerPool] = None,
+        engine: EngineSelection = Engine.Z3,
+        max_violations: int = 1
+    ) -> MCResults:
+        """
+        Checks requirements until one is violated, cancelling those left.
+        Tasks already running in `pool` are interrupted, and their results ignored.
+        """
+        profile = Profile()
+        checked: dict[int, tuple[tuple[MCResult, str], RequirementProfile]] = {}
+        with closing(self.iter_common_requirements(
+            consistency_checks, timeout, pool, engine, profile, max_violations
+        )) as results:
+            for i, result, req_profile in results:
+                checked[i] = result, req_profile
+                if result[0] == MCResult.unsat:
+                    break
+        order = sorted(checked)
+        profile.requirements = [checked[i][1] for i in order]
+        return MCResults([checked[i][0] for i in order], profile)
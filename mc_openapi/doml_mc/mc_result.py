@@ -1,4 +1,6 @@
+from dataclasses import asdict, dataclass, field
 from enum import Enum
+from typing import Optional
 from z3 import CheckSatResult, sat, unsat, unknown
 
 
@@ -24,11 +26,36 @@ class MCResult(Enum):
         return MCResult.dontknow
 
 
+@dataclass
+class RequirementProfile:
+    name: str
+    engine: str
+    # Wall time in seconds.
+    time: float
+    # Z3 statistics of the check, if done with Z3.
+    statistics: dict[str, float] = field(default_factory=dict)
+    # Name of the solver configuration that answered, if done with Z3.
+    solver: str = ""
+
+
+@dataclass
+class Profile:
+    # Wall time in seconds of parsing and encoding the model.
+    phases: dict[str, float] = field(default_factory=dict)
+    # Number of assertions encoding the model.
+    assertions: int = 0
+    requirements: list[RequirementProfile] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
 class MCResults:
     dontknow_msg = "Timed out: unable to check some requirements."
 
-    def __init__(self, results: list[tuple[MCResult, str]]):
+    def __init__(self, results: list[tuple[MCResult, str]], profile: Optional[Profile] = None):
         self.results = results
+        self.profile = Profile() if profile is None else profile
 
     def summarize(self) -> tuple[MCResult, str]:
         some_unsat = any(res == MCResult.unsat for res, _ in self.results)
@@ -37,15 +64,36 @@ class MCResults:
         if some_unsat:
             err_msg = " ".join(msg for res, msg in self.results if res == MCResult.unsat)
             if some_dontknow:
-                err_msg = err_msg + MCResults.dontknow_msg
+                err_msg = err_msg + " " + self.dontknow_message()
             return MCResult.unsat, err_msg
         elif some_dontknow:
-            return MCResult.dontknow, MCResults.dontknow_msg
+            return MCResult.dontknow, self.dontknow_message()
         else:
             return MCResult.sat, "All requirements satisfied."
 
+    def timed_out_requirements(self) -> list[str]:
+        """
+        The names of the requirements that could not be checked, if known,
+        i.e., if the profile has an entry for each result.
+        """
+        if len(self.profile.requirements) != len(self.results):
+            return []
+        return [
+            req.name for req, (res, _) in zip(self.profile.requirements, self.results)
+            if res == MCResult.dontknow
+        ]
+
+    def dontknow_message(self) -> str:
+        names = self.timed_out_requirements()
+        if not names:
+            return MCResults.dontknow_msg
+        return f"Timed out: unable to check requirements {', '.join(names)}."
+
     def add_result(self, result: tuple[MCResult, str]):
         self.results.append(result)
 
     def add_results(self, results: "MCResults"):
         self.results.extend(results.results)
+        for phase, time in results.profile.phases.items():
+            self.profile.phases[phase] = self.profile.phases.get(phase, 0.0) + time
+        self.profile.requirements.extend(results.profile.requirements)
@@ -0,0 +1,58 @@
+from typing import Callable, Optional, TypeVar
+
+from .intermediate_model.doml_element import IntermediateModel, Values
+from .intermediate_model.metamodel import InverseAssociation, MetaModel, get_mangled_attribute_defaults
+
+_T = TypeVar("_T")
+
+
+class ModelGraph:
+    """
+    Indexes an intermediate model so that requirements can be checked by
+    traversing it directly, without encoding it for Z3.
+    Its queries have the same meaning as the relations of the SMT encoding:
+    classes are exact (no subclassing), and attributes include the defaults
+    from the metamodel.
+    """
+
+    def __init__(self, intermediate_model: IntermediateModel, metamodel: MetaModel, inv_assoc: InverseAssociation):
+        self.intermediate_model = intermediate_model
+        self.metamodel = metamodel
+        self.inv_assoc = inv_assoc
+        self.by_class: dict[str, list[str]] = {}
+        for ename, e in intermediate_model.items():
+            self.by_class.setdefault(e.class_, []).append(ename)
+        # Built on first use for each association.
+        self.inverse: dict[str, dict[str, list[str]]] = {}
+        # Results of passes over the whole model shared by several requirements.
+        self.derived: dict[str, object] = {}
+
+    def derive(self, key: str, compute: Callable[["ModelGraph"], _T]) -> _T:
+        """Returns `compute(self)`, only calling it the first time for `key`."""
+        if key not in self.derived:
+            self.derived[key] = compute(self)
+        return self.derived[key]  # type: ignore[return-value]
+
+    def elements_of_class(self, cname: str) -> list[str]:
+        return self.by_class.get(cname, [])
+
+    def targets(self, ename: str, aname: str) -> set[str]:
+        return self.intermediate_model[ename].associations.get(aname, set())
+
+    def sources(self, aname: str, ename: str) -> list[str]:
+        if aname not in self.inverse:
+            inv: dict[str, list[str]] = {}
+            for src, e in self.intermediate_model.items():
+                for tgt in e.associations.get(aname, ()):
+                    inv.setdefault(tgt, []).append(src)
+            self.inverse[aname] = inv
+        return self.inverse[aname].get(ename, [])
+
+    def attribute_values(self, ename: str, aname: str) -> Values:
+        e = self.intermediate_model[ename]
+        if aname in e.attributes:
+            return e.attributes[aname]
+        return get_mangled_attribute_defaults(self.metamodel, e.class_).get(aname, [])
+
+    def name(self, ename: str) -> Optional[str]:
+        return self.intermediate_model[ename].user_friendly_name
@@ -0,0 +1,124 @@
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait
+from typing import Optional
+
+from z3 import Solver
+
+from .intermediate_model import IntermediateModel
+from .imc import DEFAULT_SOLVER, EncodedModel, IntermediateModelChecker, Requirement, SolverConfig
+from .mc_result import MCResult, RequirementProfile
+
+# Solver configurations that can be part of a portfolio, by name.
+SOLVER_CONFIGS: dict[str, SolverConfig] = {
+    config.name: config for config in [
+        DEFAULT_SOLVER,
+        # Without model-based quantifier instantiation, relying on E-matching.
+        SolverConfig("no_mbqi", {"smt.mbqi": False}),
+        # Without relevancy filtering of the terms to instantiate quantifiers with.
+        SolverConfig("no_relevancy", {"smt.relevancy": 0}),
+        # Quantifier instantiations are tried on a larger set of ground terms.
+        SolverConfig("eager_qi", {"smt.qi.eager_threshold": 100.0}),
+    ]
+}
+
+
+def get_solver_configs(names: list[str]) -> list[SolverConfig]:
+    """The configurations named in `names`, raising ValueError for unknown ones."""
+    unknown = [name for name in names if name not in SOLVER_CONFIGS]
+    if unknown:
+        raise ValueError(f"Unknown solver configurations: {', '.join(unknown)}.")
+    return [SOLVER_CONFIGS[name] for name in names]
+
+
+class PortfolioChecker(IntermediateModelChecker):
+    """
+    An `IntermediateModelChecker` that checks each requirement with Z3 in all
+    `configs` at once, each in its own context and thread.
+    The first definitive answer wins, and the other checks are interrupted;
+    the profile of the requirement names the configuration that answered.
+    """
+    # Seconds between interruptions of the checks that lost the race.
+    INTERRUPT_INTERVAL = 0.01
+
+    def __init__(
+        self,
+        metamodel,
+        inv_assoc,
+        intermediate_model: IntermediateModel,
+        configs: list[SolverConfig],
+        encoded_model: Optional[EncodedModel] = None
+    ):
+        super().__init__(
+            metamodel, inv_assoc, intermediate_model,
+            encoded_model=encoded_model, solver_config=configs[0]
+        )
+        if len(configs) > 1 and encoded_model is None:
+            encoded_model = self.export_encoding()
+        self.others = [
+            IntermediateModelChecker(
+                metamodel, inv_assoc, intermediate_model,
+                encoded_model=encoded_model, solver_config=config
+            )
+            for config in configs[1:]
+        ]
+        self.executor = ThreadPoolExecutor(max_workers=len(configs), thread_name_prefix="mc-portfolio")
+
+    def check_z3_requirement(
+        self,
+        req: Requirement,
+        timeout_ms: int = 0,
+        max_violations: int = 1
+    ) -> tuple[tuple[MCResult, str], RequirementProfile]:
+        checkers = [self] + self.others
+        scopes = [checker.solver.num_scopes() for checker in checkers]
+        futures = {
+            self.executor.submit(IntermediateModelChecker.check_z3_requirement, checker, req, timeout_ms, max_violations): checker
+            for checker in checkers
+        }
+        answer = None
+        try:
+            for future in as_completed(futures):
+                if future.exception() is not None:
+                    continue
+                result, req_profile = future.result()
+                if result[0] != MCResult.dontknow:
+                    answer = result, req_profile
+                    break
+        finally:
+            self.stop(futures)
+            for checker, n_scopes in zip(checkers, scopes):
+                self.reset(checker, n_scopes)
+        if answer is None:
+            # All configurations gave up: report the one of this checker.
+            answer = next(future for future, checker in futures.items() if checker is self).result()
+        return answer
+
+    def interrupt(self):
+        super().interrupt()
+        for checker in self.others:
+            checker.z3Context.interrupt()
+
+    def close(self):
+        self.executor.shutdown()
+
+    @staticmethod
+    def stop(futures: dict[Future, IntermediateModelChecker]):
+        """Interrupts the checks of `futures` until they all end."""
+        not_done = {future for future in futures if not future.done()}
+        while not_done:
+            # An interruption is lost if it comes just before the check
+            # starts: repeat it until the check ends.
+            for future in not_done:
+                futures[future].z3Context.interrupt()
+            _, not_done = wait(not_done, timeout=PortfolioChecker.INTERRUPT_INTERVAL)
+
+    @staticmethod
+    def reset(checker: IntermediateModelChecker, n_scopes: int):
+        """
+        Makes `checker` usable again after its check was interrupted: an
+        interruption outside a check would make the next `push` fail, until
+        some check runs in the same context. A push that failed so still
+        opened a scope.
+        """
+        Solver(ctx=checker.z3Context).check()
+        while checker.solver.num_scopes() > n_scopes:
+            checker.solver.pop()
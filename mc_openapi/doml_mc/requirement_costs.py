@@ -0,0 +1,59 @@
+import threading
+from typing import Optional
+
+from .mc_result import MCResult, MCResults
+
+
+class RequirementCosts:
+    """
+    The check time and failure rate of each requirement, over the checks done
+    by this process, used to check first the requirements that are most likely
+    to fail for the time they take, and to start the longest checks first.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Requirement name -> [checks, total time in seconds, failures].
+        self.stats: dict[str, list] = {}
+
+    def record(self, name: str, time: float, result: MCResult):
+        with self.lock:
+            stats = self.stats.setdefault(name, [0, 0.0, 0])
+            stats[0] += 1
+            stats[1] += time
+            stats[2] += result == MCResult.unsat
+
+    def record_results(self, results: MCResults):
+        # Results and profiles are only aligned if no check timed out.
+        if len(results.profile.requirements) == len(results.results):
+            for req, (res, _) in zip(results.profile.requirements, results.results):
+                # Requirements left at the deadline were not checked at all.
+                if res != MCResult.dontknow or req.time > 0:
+                    self.record(req.name, req.time, res)
+
+    def mean_time(self, name: str) -> Optional[float]:
+        """The mean time of checking the requirement, or None if it never was."""
+        with self.lock:
+            checks, time, _ = self.stats.get(name, (0, 0.0, 0))
+        return time / checks if checks > 0 else None
+
+    def expected_cost(self, name: str) -> float:
+        """
+        The mean time of checking the requirement, divided by the (smoothed)
+        probability that it fails: checking requirements by increasing
+        expected cost finds a failing one soonest.
+        Requirements never checked come first, to learn their cost.
+        """
+        with self.lock:
+            checks, time, failures = self.stats.get(name, (0, 0.0, 0))
+        if checks == 0:
+            return 0.0
+        return (time / checks) / ((failures + 1) / (checks + 2))
+
+    def order(self, names: list[str]) -> list[int]:
+        """The positions of `names`, by increasing expected cost."""
+        costs = [self.expected_cost(name) for name in names]
+        return sorted(range(len(names)), key=lambda i: costs[i])
+
+
+requirement_costs = RequirementCosts()
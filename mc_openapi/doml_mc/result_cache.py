@@ -0,0 +1,118 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from .intermediate_model.doml_element import IntermediateModel, fingerprint
+from .intermediate_model.metamodel import DOMLVersion
+from .mc_result import MCResult, MCResults
+
+
+def _dump_results(results: MCResults) -> str:
+    return json.dumps([[res.name, msg] for res, msg in results.results])
+
+
+def _load_results(value: str) -> MCResults:
+    return MCResults([(MCResult[res], msg) for res, msg in json.loads(value)])
+
+
+def model_hash(xmi_model: bytes) -> str:
+    return hashlib.sha256(xmi_model).hexdigest()
+
+
+def requirements_hash(req_names: list[str]) -> str:
+    return hashlib.sha256("\n".join(req_names).encode()).hexdigest()
+
+
+class LRUBackend:
+    """In-memory storage for `ResultCache`."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: OrderedDict[str, str] = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: str):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+class SQLiteBackend:
+    """On-disk storage for `ResultCache`, shared by all server processes."""
+
+    def __init__(self, path: str, max_size: int):
+        self.max_size = max_size
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self.conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put(self, key: str, value: str):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO results (key, value, last_used) VALUES (?, ?, ?)",
+            (key, value, time.time())
+        )
+        self.conn.execute(
+            "DELETE FROM results WHERE key NOT IN "
+            "(SELECT key FROM results ORDER BY last_used DESC LIMIT ?)",
+            (self.max_size,)
+        )
+
+
+class ResultCache:
+    """
+    Caches model checking results by model content, DOML version and
+    checked requirements, evicting the least recently used entries beyond
+    `max_size`. If `db_path` is given, entries are stored in an SQLite
+    database there, so they survive server restarts.
+    """
+
+    def __init__(self, max_size: int, db_path: Optional[str] = None):
+        self.lock = threading.Lock()
+        if db_path:
+            self.backend = SQLiteBackend(db_path, max_size)
+        else:
+            self.backend = LRUBackend(max_size)
+
+    @staticmethod
+    def key(xmi_model: bytes, doml_version: DOMLVersion, req_names: list[str]) -> str:
+        return f"xmi:{model_hash(xmi_model)}:{doml_version.value}:{requirements_hash(req_names)}"
+
+    @staticmethod
+    def model_key(im: IntermediateModel, doml_version: DOMLVersion, req_names: list[str]) -> str:
+        """
+        Like `key`, but based on the parsed model, so that semantically
+        identical models share their entry even if their XMI differs.
+        """
+        return f"im:{fingerprint(im)}:{doml_version.value}:{requirements_hash(req_names)}"
+
+    def get(self, key: str) -> Optional[MCResults]:
+        with self.lock:
+            value = self.backend.get(key)
+        return None if value is None else _load_results(value)
+
+    def put(self, key: str, results: MCResults):
+        # Timeouts depend on load, so they are not worth remembering.
+        if any(res == MCResult.dontknow for res, _ in results.results):
+            return
+        with self.lock:
+            self.backend.put(key, _dump_results(results))
@@ -0,0 +1,222 @@
+import threading
+import time
+import uuid
+from functools import cache
+from typing import Optional
+
+from .intermediate_model.doml_element import DOMLElement, IntermediateModel
+from .intermediate_model.metamodel import (
+    DOMLVersion,
+    MetaModel,
+    MetaModels,
+    InverseAssociations,
+    get_mangled_attribute_defaults
+)
+from .xmi_parser.doml_model import parse_doml_model
+from .mc import get_requirements
+from .mc_result import MCResult, MCResults, Profile
+from .imc import (
+    AttributeEncoding, Engine, EngineSelection, IntermediateModelChecker, Requirement, RequirementStore,
+    check_requirement_natively, uses_native_engine
+)
+from .model_graph import ModelGraph
+
+
+def changed_symbols(old_im: IntermediateModel, new_im: IntermediateModel, mm: MetaModel) -> set[str]:
+    """
+    Returns the names of the classes, attributes and associations whose
+    relations differ between `old_im` and `new_im`.
+    """
+    def effective_attributes(e: DOMLElement):
+        return get_mangled_attribute_defaults(mm, e.class_) | e.attributes
+
+    changed: set[str] = set()
+    for ename in old_im.keys() | new_im.keys():
+        old_e, new_e = old_im.get(ename), new_im.get(ename)
+        if old_e == new_e:
+            continue
+        old_attrs = effective_attributes(old_e) if old_e else {}
+        new_attrs = effective_attributes(new_e) if new_e else {}
+        old_assocs = old_e.associations if old_e else {}
+        new_assocs = new_e.associations if new_e else {}
+        if old_e is None or new_e is None or old_e.class_ != new_e.class_:
+            changed |= {e.class_ for e in (old_e, new_e) if e}
+        changed |= {
+            aname for aname in old_attrs.keys() | new_attrs.keys()
+            if old_attrs.get(aname) != new_attrs.get(aname)
+        }
+        changed |= {
+            aname for aname in old_assocs.keys() | new_assocs.keys()
+            if old_assocs.get(aname) != new_assocs.get(aname)
+        }
+    return changed
+
+
+class MalformedModel(Exception):
+    pass
+
+
+@cache
+def get_requirement_scopes(doml_version: DOMLVersion, consistency_checks: bool) -> list[Optional[set[str]]]:
+    """
+    The scopes of the requirements of `get_requirements` (see
+    `IntermediateModelChecker.requirement_scope`). They do not depend on the
+    model, so they are computed once, on a model with a single element.
+    """
+    mm = MetaModels[doml_version]
+    im = {"scope": DOMLElement("scope", next(iter(mm)), {}, {}, None)}
+    imc = IntermediateModelChecker(mm, InverseAssociations[doml_version], im)
+    return [imc.requirement_scope(req) for req in get_requirements(doml_version, consistency_checks).get_all_requirements()]
+
+
+class CheckSession:
+    """
+    Keeps a model and its solver between checks, so that new versions of the
+    model are checked incrementally. Each update only re-encodes the elements
+    that changed, and only re-checks the requirements referring to classes,
+    attributes or associations that changed, plus those that were violated.
+    The others keep their previous result: this relies on requirements only
+    finding violations among elements related by the symbols they mention,
+    which is the case for the common and consistency requirements.
+    The solver is only built once some requirement is checked with Z3.
+    Each check, including parsing the model, takes at most `timeout` seconds
+    (0 for no limit): requirements not checked by then are dontknow.
+    If a check fails, the session keeps the previous model and results.
+    """
+
+    def __init__(
+        self,
+        xmi_model: bytes,
+        doml_version: Optional[DOMLVersion] = None,
+        consistency_checks: bool = False,
+        timeout: float = 0,
+        engine: EngineSelection = Engine.Z3
+    ):
+        self.id = uuid.uuid4().hex
+        self.consistency_checks = consistency_checks
+        self.timeout = timeout
+        self.engine = engine
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.imc: Optional[IntermediateModelChecker] = None
+        deadline = self.deadline()
+        im, doml_version = self.parse(xmi_model, doml_version)
+        self.reset(im, doml_version, deadline)
+
+    def deadline(self) -> Optional[float]:
+        """The `time.time()` by which a check starting now must end."""
+        return time.time() + self.timeout if self.timeout else None
+
+    @staticmethod
+    def parse(xmi_model: bytes, doml_version: Optional[DOMLVersion]) -> tuple[IntermediateModel, DOMLVersion]:
+        try:
+            return parse_doml_model(xmi_model, doml_version)
+        except Exception as e:
+            raise MalformedModel(str(e)) from e
+
+    def reset(self, im: IntermediateModel, doml_version: DOMLVersion, deadline: Optional[float]):
+        """Checks all requirements on `im`, of another version than the previous model."""
+        # The solver of the previous version cannot encode `im`.
+        self.imc = None
+        req_store = get_requirements(doml_version, self.consistency_checks)
+        results = self.check(im, doml_version, req_store.get_all_requirements(), deadline)
+        self.doml_version = doml_version
+        self.req_store = req_store
+        self.scopes = get_requirement_scopes(doml_version, self.consistency_checks)
+        self.intermediate_model = im
+        self.results = results
+        self.checked = results
+        self.rechecked = [req.assert_name for req in req_store.get_all_requirements()]
+
+    def check(
+        self,
+        im: IntermediateModel,
+        doml_version: DOMLVersion,
+        reqs: list[Requirement],
+        deadline: Optional[float]
+    ) -> MCResults:
+        """
+        Checks `reqs` on `im`, by `deadline`. If some are not checked natively,
+        the solver of the session is updated to `im`, or built the first time.
+        If the check fails, the solver is dropped, being in an unknown state.
+        """
+        if all(uses_native_engine(req, self.engine) for req in reqs):
+            graph = ModelGraph(im, MetaModels[doml_version], InverseAssociations[doml_version])
+            checked = [check_requirement_natively(req, graph) for req in reqs]
+            return MCResults(
+                [result for result, _ in checked],
+                Profile(requirements=[req_profile for _, req_profile in checked])
+            )
+
+        try:
+            if self.imc is None or not self.imc.update_model(im):
+                self.imc = IntermediateModelChecker(
+                    MetaModels[doml_version], InverseAssociations[doml_version], im,
+                    retractable=True, attr_encoding=AttributeEncoding.QUANTIFIED
+                )
+            return self.imc.check_requirements(RequirementStore(reqs), engine=self.engine, deadline=deadline)
+        except BaseException:
+            self.imc = None
+            raise
+
+    def update(self, xmi_model: bytes) -> MCResults:
+        self.last_used = time.monotonic()
+        deadline = self.deadline()
+        im, doml_version = self.parse(xmi_model, None)
+        if doml_version != self.doml_version:
+            self.reset(im, doml_version, deadline)
+            return self.results
+
+        changed = changed_symbols(self.intermediate_model, im, MetaModels[doml_version])
+        to_check = [
+            i for i, (scope, (res, _)) in enumerate(zip(self.scopes, self.results.results))
+            if changed and (scope is None or scope & changed or res != MCResult.sat)
+        ]
+        reqs = self.req_store.get_all_requirements()
+        checked = self.check(im, doml_version, [reqs[i] for i in to_check], deadline)
+        results = list(self.results.results)
+        req_profiles = list(self.results.profile.requirements)
+        for i, result, req_profile in zip(to_check, checked.results, checked.profile.requirements):
+            results[i] = result
+            req_profiles[i] = req_profile
+        self.intermediate_model = im
+        self.results = MCResults(results, Profile(dict(checked.profile.phases), checked.profile.assertions, req_profiles))
+        self.checked = checked
+        self.rechecked = [reqs[i].assert_name for i in to_check]
+        return self.results
+
+
+class SessionStore:
+    """
+    Holds at most `max_sessions` sessions, dropping the least recently used
+    one when full and those unused for more than `ttl` seconds.
+    """
+
+    def __init__(self, max_sessions: int, ttl: float):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.sessions: dict[str, CheckSession] = {}
+
+    def _expire(self):
+        now = time.monotonic()
+        for sid, session in list(self.sessions.items()):
+            if now - session.last_used > self.ttl:
+                del self.sessions[sid]
+
+    def add(self, session: CheckSession):
+        with self.lock:
+            self._expire()
+            if len(self.sessions) >= self.max_sessions:
+                oldest = min(self.sessions.values(), key=lambda s: s.last_used)
+                del self.sessions[oldest.id]
+            self.sessions[session.id] = session
+
+    def get(self, sid: str) -> Optional[CheckSession]:
+        with self.lock:
+            self._expire()
+            return self.sessions.get(sid)
+
+    def remove(self, sid: str) -> bool:
+        with self.lock:
+            return self.sessions.pop(sid, None) is not None
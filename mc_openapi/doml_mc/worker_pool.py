@@ -0,0 +1,145 @@
+import multiprocessing
+import threading
+from collections.abc import Iterator
+from concurrent.futures import Future
+from contextlib import contextmanager
+from functools import partial
+from multiprocessing.connection import wait
+from typing import Callable
+
+from joblib.externals.loky import ProcessPoolExecutor
+
+
+class PoolFull(Exception):
+    pass
+
+
+def _warm_up():
+    # They are loaded lazily otherwise, by the first task of each version.
+    from . import init_doml_rsets, init_eclass_indices, init_metamodels, init_special_parsers
+    init_metamodels()
+    init_doml_rsets()
+    init_special_parsers()
+    init_eclass_indices()
+
+
+def _noop():
+    pass
+
+
+class _Worker:
+    """A worker process of a `WorkerPool`, with its own executor so that it can be replaced alone."""
+
+    def __init__(self):
+        self.executor = ProcessPoolExecutor(max_workers=1, initializer=_warm_up)
+        # The process is spawned on the first submission: do it now.
+        self.executor.submit(_noop)
+        self.in_flight = 0
+        self.submitted = 0
+
+
+class WorkerPool:
+    """
+    A long-lived pool of worker processes that have already initialized the
+    model checker, so that submitting work to it does not pay process startup
+    and metamodel loading.
+    Each task goes to the worker with the fewest tasks in flight.
+
+    ### Parameters
+     - `size` is the number of worker processes;
+     - `max_tasks_per_worker` makes the pool replace each process after it
+       was submitted that many tasks, once they are done: processes are
+       replaced one at a time, and never outnumber `size` while busy.
+       0 means never;
+     - `max_queue` is the maximum number of tasks waiting for a free worker.
+       Submitting more raises `PoolFull`. 0 means unbounded.
+    """
+
+    def __init__(self, size: int, max_tasks_per_worker: int = 0, max_queue: int = 0):
+        self.size = size
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._shut_down = False
+        self._workers = [_Worker() for _ in range(size)]
+
+    def _worn_out(self, worker: _Worker) -> bool:
+        return self.max_tasks_per_worker > 0 and worker.submitted >= self.max_tasks_per_worker
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        with self._lock:
+            if self.max_queue > 0 and self._in_flight >= self.size + self.max_queue:
+                raise PoolFull("The model checker is overloaded, try again later.")
+            # Workers waiting to be replaced only get tasks if all do.
+            worker = min(self._workers, key=lambda w: (self._worn_out(w), w.in_flight))
+            self._in_flight += 1
+            worker.in_flight += 1
+            worker.submitted += 1
+            future = worker.executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(partial(self._task_done, worker))
+        return future
+
+    def _task_done(self, worker: _Worker, _future: Future):
+        with self._lock:
+            self._in_flight -= 1
+            worker.in_flight -= 1
+            if worker.in_flight == 0 and self._worn_out(worker) and not self._shut_down:
+                # Idle: its process exits right away.
+                worker.executor.shutdown(wait=False)
+                self._workers[self._workers.index(worker)] = _Worker()
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            self._shut_down = True
+        for worker in self._workers:
+            worker.executor.shutdown(wait=wait)
+
+
+class CancelFlag:
+    """
+    A flag set to stop the tasks of a check that run in worker processes:
+    they watch it and interrupt their solvers once it is set.
+    It is the read end of a pipe, which can be pickled to processes of any
+    pool, and it is set by closing the write end: watchers then read the end
+    of the pipe, as they also do if the process owning the flag dies.
+    """
+    # Seconds between interruptions, once the flag is set.
+    INTERRUPT_INTERVAL = 0.05
+
+    def __init__(self):
+        self._reader, self._writer = multiprocessing.Pipe(duplex=False)
+
+    def __getstate__(self):
+        # A copy of the write end would keep the pipe open.
+        return {"_reader": self._reader}
+
+    def is_set(self) -> bool:
+        return self._reader.poll()
+
+    def set(self):
+        self._writer.close()
+
+    @contextmanager
+    def watch(self, interrupt: Callable[[], None]) -> Iterator[None]:
+        """
+        Calls `interrupt` while the flag is set, until the end of the block.
+        An interruption is lost if it comes just before a check starts:
+        it is repeated until the block ends.
+        """
+        stop_reader, stop_writer = multiprocessing.Pipe(duplex=False)
+
+        def interrupt_once_set():
+            if stop_reader not in wait([self._reader, stop_reader]):
+                interrupt()
+                while not stop_reader.poll(CancelFlag.INTERRUPT_INTERVAL):
+                    interrupt()
+
+        watcher = threading.Thread(target=interrupt_once_set, name="mc-cancel", daemon=True)
+        watcher.start()
+        try:
+            yield
+        finally:
+            stop_writer.close()
+            watcher.join()
+            stop_reader.close()
@@ -1,3 +1,5 @@
+from enum import Enum
+from io import BytesIO
 from typing import Optional, Tuple
 import copy
 import importlib.resources as ilres
@@ -8,27 +10,60 @@ from mc_openapi.bytes_uri import BytesURI
 from pyecore.ecore import EObject
 from pyecore.resources import ResourceSet
 
+from .._utils import LazyDict
 from ..intermediate_model.doml_element import IntermediateModel, reciprocate_inverse_associations
 from ..intermediate_model.metamodel import DOMLVersion, MetaModels, InverseAssociations
-from .ecore import ELayerParser
+from .ecore import EClassIndex, ELayerParser, mk_eclass_index
 from .special_parsers import SpecialParsers
+from .streaming import RawLayerParser, XMIStreamReader
 
 
-doml_rsets = {}
-def init_doml_rsets():  # noqa: E302
-    global doml_rsets
+class XMIParser(Enum):
+    """How DOMLX documents are read."""
+    # lxml's iterparse, without building the document tree nor pyecore objects.
+    STREAMING = "streaming"
+    # pyecore's XMI resources, as a fallback for documents using features
+    # the streaming parser does not support.
+    PYECORE = "pyecore"
+
+
+DOML_NS_URI = "http://www.piacere-project.eu/doml"
+
+def load_doml_rset(ver: DOMLVersion) -> None:
+    rset = ResourceSet()
+    resource = rset.get_resource(BytesURI(
+        "doml", bytes=ilres.read_binary(assets, f"doml_{ver.value}.ecore")
+    ))
+    doml_metamodel = resource.contents[0]
+
+    rset.metamodel_registry[doml_metamodel.nsURI] = doml_metamodel
+    for subp in doml_metamodel.eSubpackages:
+        rset.metamodel_registry[subp.nsURI] = subp
+
+    dict.__setitem__(doml_rsets, ver, rset)
+
+
+def load_eclass_index(ver: DOMLVersion) -> None:
+    doml_metamodel = doml_rsets[ver].metamodel_registry[DOML_NS_URI]
+    dict.__setitem__(EClassIndices, ver, mk_eclass_index(
+        [doml_metamodel] + list(doml_metamodel.eSubpackages), SpecialParsers[ver]
+    ))
+
+
+# Ecores are loaded the first time a model of their version is parsed.
+doml_rsets: dict[DOMLVersion, ResourceSet] = LazyDict(load_doml_rset)
+EClassIndices: dict[DOMLVersion, EClassIndex] = LazyDict(load_eclass_index)
+
+
+def init_doml_rsets():
+    """Loads the ecores of all DOML versions right away."""
     for ver in DOMLVersion:
-        rset = ResourceSet()
-        resource = rset.get_resource(BytesURI(
-            "doml", bytes=ilres.read_binary(assets, f"doml_{ver.value}.ecore")
-        ))
-        doml_metamodel = resource.contents[0]
+        doml_rsets[ver]
 
-        rset.metamodel_registry[doml_metamodel.nsURI] = doml_metamodel
-        for subp in doml_metamodel.eSubpackages:
-            rset.metamodel_registry[subp.nsURI] = subp
 
-        doml_rsets[ver] = rset
+def init_eclass_indices():
+    for ver in DOMLVersion:
+        EClassIndices[ver]
 
 
 def get_rset(doml_version: DOMLVersion) -> ResourceSet:
@@ -44,7 +79,11 @@ def parse_xmi_model(raw_model: bytes, doml_version: DOMLVersion) -> EObject:
 
 
 def infer_domlx_version(raw_model: bytes) -> DOMLVersion:
-    root = etree.fromstring(raw_model)
+    # Only the root element is needed, so stop at its start tag.
+    for _, root in etree.iterparse(BytesIO(raw_model), events=("start",)):
+        break
+    else:
+        raise RuntimeError("Supplied with malformed DOMLX model.")
     if root.tag == "{http://www.piacere-project.eu/doml/commons}DOMLModel":
         if "version" in root.attrib:
             v_str = root.attrib["version"]
@@ -61,23 +100,37 @@ def infer_domlx_version(raw_model: bytes) -> DOMLVersion:
         raise RuntimeError("Supplied with malformed DOMLX model.")
 
 
-def parse_doml_model(raw_model: bytes, doml_version: Optional[DOMLVersion]) -> Tuple[IntermediateModel, DOMLVersion]:
+def parse_doml_model(
+    raw_model: bytes,
+    doml_version: Optional[DOMLVersion],
+    parser: XMIParser = XMIParser.STREAMING
+) -> Tuple[IntermediateModel, DOMLVersion]:
     if doml_version is None:
         doml_version = infer_domlx_version(raw_model)
 
-    model = parse_xmi_model(raw_model, doml_version)
+    if parser == XMIParser.STREAMING:
+        model = XMIStreamReader(get_rset(doml_version)).read(raw_model)
+        elp = RawLayerParser(MetaModels[doml_version], SpecialParsers[doml_version], EClassIndices[doml_version])
+
+        def get_layer(name: str):
+            return model.refs.get(name)
+    else:
+        model = parse_xmi_model(raw_model, doml_version)
+        elp = ELayerParser(MetaModels[doml_version], SpecialParsers[doml_version], EClassIndices[doml_version])
+
+        def get_layer(name: str):
+            return getattr(model, name)
 
-    elp = ELayerParser(MetaModels[doml_version], SpecialParsers[doml_version])
-    if model.application:
-        elp.parse_elayer(model.application)
-    if model.infrastructure:
-        elp.parse_elayer(model.infrastructure)
+    if get_layer("application"):
+        elp.parse_elayer(get_layer("application"))
+    if get_layer("infrastructure"):
+        elp.parse_elayer(get_layer("infrastructure"))
     else:
         raise RuntimeError("Abstract infrastructure layer is missing.")
-    if model.activeConfiguration:
-        elp.parse_elayer(model.activeConfiguration)
-    if model.activeInfrastructure:
-        im = elp.parse_elayer(model.activeInfrastructure)
+    if get_layer("activeConfiguration"):
+        elp.parse_elayer(get_layer("activeConfiguration"))
+    if get_layer("activeInfrastructure"):
+        im = elp.parse_elayer(get_layer("activeInfrastructure"))
     else:
         raise RuntimeError("No active concrete infrastructure layer has been specified.")
 
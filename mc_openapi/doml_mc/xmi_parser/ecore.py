@@ -1,4 +1,5 @@
 import sys
+from dataclasses import dataclass
 from typing import Callable, Optional
 
 from pyecore.ecore import EEnumLiteral, EObject, EOrderedSet, EClass
@@ -38,58 +39,144 @@ class SpecialParser:
         return parser(avalue)
 
 
+@dataclass
+class EAttributeInfo:
+    name: str
+    # The value pyecore gives to the attribute when it is not set.
+    unset: object
+    # The special parser of the attribute, if any.
+    special: Optional[Callable[[Values], Attributes]]
+
+
+@dataclass
+class EClassInfo:
+    """What parsing an object of an EClass needs to know about it."""
+    mm_class: str
+    attributes: list[EAttributeInfo]
+    # Names of the references, and whether they are single-valued.
+    references: list[tuple[str, bool]]
+    has_name: bool
+
+
+EClassIndex = dict[EClass, EClassInfo]
+
+
+def mk_eclass_info(eClass: EClass, special_parser: Optional[SpecialParser] = None) -> EClassInfo:
+    mm_class = ELayerParser.mangle_eclass_name(eClass)
+    return EClassInfo(
+        mm_class=mm_class,
+        attributes=[
+            EAttributeInfo(
+                name=eAttr.name,
+                unset=[] if eAttr.many else eAttr.get_default_value(),
+                special=special_parser.parsers.get((mm_class, eAttr.name)) if special_parser else None
+            )
+            for eAttr in eClass.eAllAttributes()
+        ],
+        references=[(eRef.name, eRef.upper == 1) for eRef in eClass.eAllReferences()],
+        has_name=eClass.findEStructuralFeature("name") is not None
+    )
+
+
+def mk_eclass_index(epackages, special_parser: Optional[SpecialParser] = None) -> EClassIndex:
+    return {
+        eClass: mk_eclass_info(eClass, special_parser)
+        for epackage in epackages
+        for eClass in epackage.eClassifiers
+        if isinstance(eClass, EClass)
+    }
+
+
 class ELayerParser:
-    def __init__(self, mm: MetaModel, special_parser=None):
+    def __init__(self, mm: MetaModel, special_parser=None, eclass_index: Optional[EClassIndex] = None):
         self.mm = mm
         self.special_parser = special_parser
+        # Classes missing from the index are added the first time they are met.
+        self.eclass_index = eclass_index if eclass_index is not None else {}
         self.im: dict[str, "DOMLElement"] = {}
-        self.visited: set[int] = set()
-        self.nextUniqueId = 0
+        self.visited: dict[int, str] = {}
+        self.used_names: set[str] = set()
+        self.child_indices: dict[tuple[int, str], dict[int, int]] = {}
 
     def parse_elayer(self, doc: EObject) -> IntermediateModel:
         self.parse_eobject(doc)
         return self.im
 
+    def containment_path(self, doc: EObject) -> list[str]:
+        container = doc.eContainer()
+        if container is None:
+            return []
+        feature = doc.eContainmentFeature()
+        if feature.many:
+            key = (id(container), feature.name)
+            if key not in self.child_indices:
+                self.child_indices[key] = {id(child): i for i, child in enumerate(container.eGet(feature))}
+            step = f"{feature.name}_{self.child_indices[key][id(doc)]}"
+        else:
+            step = feature.name
+        return self.containment_path(container) + [step]
+
+    def element_name(self, doc: EObject) -> str:
+        """
+        Names elements after their containment path from the model root,
+        so that parsing the same model always yields the same names.
+        """
+        name = "elem_" + ("_".join(self.containment_path(doc)) or "root")
+        unique_name, n = name, 1
+        while unique_name in self.used_names:
+            unique_name = f"{name}_{n}"
+            n += 1
+        self.used_names.add(unique_name)
+        return unique_name
+
+    def get_eclass_info(self, eClass: EClass) -> EClassInfo:
+        info = self.eclass_index.get(eClass)
+        if info is None:
+            info = self.eclass_index[eClass] = mk_eclass_info(eClass, self.special_parser)
+        return info
+
+    def add_attribute_value(self, raw_attrs: Attributes, attr: EAttributeInfo, val) -> None:
+        if val is not None:
+            if attr.special is not None:
+                raw_attrs |= attr.special(val)
+            else:
+                if isinstance(val, str) or isinstance(val, int) or isinstance(val, bool):
+                    raw_attrs[attr.name] = [val]
+                elif isinstance(val, EEnumLiteral):
+                    raw_attrs[attr.name] = [str(val)]
+                elif isinstance(val, (EOrderedSet, list)):
+                    raw_attrs[attr.name] = [str(v) if isinstance(v, EEnumLiteral) else v for v in val]
+                else:
+                    print("Attribute", attr.name, "has value", val, "of unexpected type.", file=sys.stderr)
+
     def parse_eobject(self, doc: EObject) -> str:
         doc_id = id(doc)
-        name = "elem_" + str(doc_id)
         if doc_id in self.visited:
-            return name
-        self.visited.add(doc_id)
+            return self.visited[doc_id]
+        name = self.element_name(doc)
+        self.visited[doc_id] = name
 
-        mm_class = ELayerParser.mangle_eclass_name(doc.eClass)
+        info = self.get_eclass_info(doc.eClass)
 
         # Get all attributes
         raw_attrs: Attributes = {}
-        for eAttr in doc.eClass.eAllAttributes():
-            val = getattr(doc, eAttr.name)
-            if val is not None:
-                if self.special_parser and self.special_parser.is_special(mm_class, eAttr.name):
-                    raw_attrs |= self.special_parser.parse_special(mm_class, eAttr.name, val)
-                else:
-                    if isinstance(val, str) or isinstance(val, int) or isinstance(val, bool):
-                        raw_attrs[eAttr.name] = [val]
-                    elif isinstance(val, EEnumLiteral):
-                        raw_attrs[eAttr.name] = [str(val)]
-                    elif isinstance(val, EOrderedSet):
-                        raw_attrs[eAttr.name] = [str(v) if isinstance(v, EEnumLiteral) else v for v in val]
-                    else:
-                        print("Attribute", eAttr.name, "has value", val, "of unexpected type.", file=sys.stderr)
-        attrs = parse_attributes(raw_attrs, mm_class, self.mm)
+        for attr in info.attributes:
+            self.add_attribute_value(raw_attrs, attr, getattr(doc, attr.name))
+        attrs = parse_attributes(raw_attrs, info.mm_class, self.mm)
 
         # Get all references and process them
         raw_assocs: Associations = {}
-        for eRef in doc.eClass.eAllReferences():
-            targets = getattr(doc, eRef.name)
+        for ref_name, single in info.references:
+            targets = getattr(doc, ref_name)
             if targets:
-                if eRef.upper == 1:
-                    raw_assocs[eRef.name] = {self.parse_eobject(targets)}
+                if single:
+                    raw_assocs[ref_name] = {self.parse_eobject(targets)}
                 else:
-                    raw_assocs[eRef.name] = {self.parse_eobject(t) for t in targets}
-        assocs = parse_associations(raw_assocs, mm_class, self.mm)
+                    raw_assocs[ref_name] = {self.parse_eobject(t) for t in targets}
+        assocs = parse_associations(raw_assocs, info.mm_class, self.mm)
 
         self.im[name] = DOMLElement(
-            id_=name, class_=mm_class, attributes=attrs, associations=assocs,
+            id_=name, class_=info.mm_class, attributes=attrs, associations=assocs,
             user_friendly_name=ELayerParser.get_user_friendly_name(doc)
         )
         return name
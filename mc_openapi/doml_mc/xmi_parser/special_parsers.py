@@ -1,13 +1,11 @@
 from ipaddress import ip_address, ip_network
 
 from .ecore import SpecialParser
+from .._utils import LazyDict
 from ..intermediate_model.metamodel import DOMLVersion, MetaModels
 from ..intermediate_model.doml_element import Attributes
 
 
-SpecialParsers: dict[DOMLVersion, SpecialParser] = {}
-
-
 def parse_network_address_range(arange: str) -> Attributes:
     ipnet = ip_network(arange)
     return {"address_lb": [int(ipnet[0])], "address_ub": [int(ipnet[-1])]}
@@ -38,28 +36,35 @@ def parse_cidr(arange: str) -> Attributes:
     return attrs
 
 
+attribute_parsers = {
+    DOMLVersion.V1_0: {
+        ("infrastructure_Network", "addressRange"): parse_network_address_range,
+        ("infrastructure_NetworkInterface", "endPoint"): parse_iface_address,
+        ("commons_FProperty", "value"): parse_fproperty,
+    },
+    DOMLVersion.V2_0: {
+        ("infrastructure_Network", "addressRange"): parse_network_address_range,
+        ("infrastructure_NetworkInterface", "endPoint"): parse_iface_address,
+        ("infrastructure_ComputingNode", "memory_mb"): parse_memory_mb,
+        ("commons_FProperty", "value"): parse_fproperty,
+    },
+    DOMLVersion.V2_1: {
+        ("infrastructure_Network", "addressRange"): parse_cidr,
+        ("infrastructure_NetworkInterface", "endPoint"): parse_iface_address,
+        ("infrastructure_ComputingNode", "memory_mb"): parse_memory_mb,
+        ("commons_FProperty", "value"): parse_fproperty,
+    },
+}
+
+
+def load_special_parser(ver: DOMLVersion) -> None:
+    # SpecialParser extends the dict it is given with subclasses.
+    dict.__setitem__(SpecialParsers, ver, SpecialParser(MetaModels[ver], dict(attribute_parsers[ver])))
+
+
+SpecialParsers: dict[DOMLVersion, SpecialParser] = LazyDict(load_special_parser)
+
+
 def init_special_parsers():
-    global SpecialParsers
-    assert len(MetaModels) > 0
-
-    attribute_parsers = {
-        DOMLVersion.V1_0: {
-            ("infrastructure_Network", "addressRange"): parse_network_address_range,
-            ("infrastructure_NetworkInterface", "endPoint"): parse_iface_address,
-            ("commons_FProperty", "value"): parse_fproperty,
-        },
-        DOMLVersion.V2_0: {
-            ("infrastructure_Network", "addressRange"): parse_network_address_range,
-            ("infrastructure_NetworkInterface", "endPoint"): parse_iface_address,
-            ("infrastructure_ComputingNode", "memory_mb"): parse_memory_mb,
-            ("commons_FProperty", "value"): parse_fproperty,
-        },
-        DOMLVersion.V2_1: {
-            ("infrastructure_Network", "addressRange"): parse_cidr,
-            ("infrastructure_NetworkInterface", "endPoint"): parse_iface_address,
-            ("infrastructure_ComputingNode", "memory_mb"): parse_memory_mb,
-            ("commons_FProperty", "value"): parse_fproperty,
-        },
-    }
     for ver in DOMLVersion:
-        SpecialParsers[ver] = SpecialParser(MetaModels[ver], attribute_parsers[ver])
+        SpecialParsers[ver]
@@ -0,0 +1,243 @@
+import re
+from io import BytesIO
+from typing import Optional, Union
+
+from lxml import etree
+from pyecore.ecore import EAttribute, EClass, EReference
+from pyecore.resources import ResourceSet
+
+from ..intermediate_model.doml_element import (
+    Associations, Attributes, DOMLElement, parse_associations, parse_attributes
+)
+from .ecore import ELayerParser
+
+XSI_TYPE = "{http://www.w3.org/2001/XMLSchema-instance}type"
+XSI_NIL = "{http://www.w3.org/2001/XMLSchema-instance}nil"
+XMI_URL = "http://www.omg.org/XMI"
+
+
+class RawObject:
+    """
+    What the streaming parser keeps of an XMI element: much lighter than
+    the EObject pyecore would build for it.
+    """
+    __slots__ = ("eclass", "container", "feature", "index", "values", "refs")
+
+    def __init__(self, eclass: EClass, container: Optional["RawObject"], feature: Optional[EReference], index: int):
+        self.eclass = eclass
+        self.container = container
+        self.feature = feature
+        # Position among the objects contained by `container` in `feature`.
+        self.index = index
+        # Attribute values as Python values, or lists of them if many-valued.
+        self.values: dict[str, Union[object, list]] = {}
+        # Referenced objects, or lists of them if many-valued.
+        self.refs: dict[str, Union["RawObject", list["RawObject"]]] = {}
+
+    def add_ref(self, ref: EReference, target: "RawObject") -> None:
+        """Sets or adds `target` to `ref`, updating its opposite like pyecore does."""
+        if ref.many:
+            targets = self.refs.setdefault(ref.name, [])
+            if target not in targets:
+                targets.append(target)
+        else:
+            self.refs[ref.name] = target
+        opposite = ref.eOpposite
+        if opposite is not None:
+            if opposite.many:
+                sources = target.refs.setdefault(opposite.name, [])
+                if self not in sources:
+                    sources.append(self)
+            else:
+                target.refs[opposite.name] = self
+
+
+class XMIStreamReader:
+    """
+    Reads an XMI document with lxml's `iterparse`, keeping only a
+    `RawObject` for each element instead of the document tree.
+    Features and types are looked up in the ecore metamodels of `rset`.
+    """
+
+    def __init__(self, rset: ResourceSet):
+        self.rset = rset
+        self.nsmap: dict[Optional[str], str] = {}
+        self.root: Optional[RawObject] = None
+        self.ids: dict[str, RawObject] = {}
+        self.features: dict[tuple[int, str], Union[EAttribute, EReference]] = {}
+        # References are resolved after reading, in document order.
+        self.later: list[tuple[RawObject, EReference, str]] = []
+
+    def get_eclass(self, ns_uri: str, cname: str) -> EClass:
+        epackage = self.rset.metamodel_registry.get(ns_uri)
+        eclass = epackage.getEClassifier(cname) if epackage is not None else None
+        if eclass is None:
+            raise RuntimeError(f"Unknown type {cname} in namespace {ns_uri}.")
+        return eclass
+
+    def get_feature(self, eclass: EClass, name: str) -> Union[EAttribute, EReference]:
+        key = (id(eclass), name)
+        if key not in self.features:
+            feature = eclass.findEStructuralFeature(name)
+            if feature is None:
+                raise RuntimeError(f"Feature {name} does not exist for type {eclass.name}.")
+            self.features[key] = feature
+        return self.features[key]
+
+    def set_value(self, obj: RawObject, eattr: EAttribute, value: str, from_tag: bool = False) -> None:
+        if eattr.many:
+            values = obj.values.setdefault(eattr.name, [])
+            if from_tag:
+                values.append(eattr.eType.from_string(value))
+            else:
+                values.extend(eattr.eType.from_string(v) for v in value.split())
+        else:
+            obj.values[eattr.name] = eattr.eType.from_string(value)
+
+    def read_features(self, obj: RawObject, attrib) -> None:
+        for key, value in attrib.items():
+            qname = etree.QName(key)
+            if qname.namespace is not None:
+                if key == f"{{{XMI_URL}}}id":
+                    self.ids[value] = obj
+                continue
+            feature = self.get_feature(obj.eclass, qname.localname)
+            if isinstance(feature, EAttribute):
+                self.set_value(obj, feature, value)
+                if feature.iD:
+                    self.ids[value] = obj
+            else:
+                self.later.append((obj, feature, value))
+
+    def read(self, raw_model: bytes) -> RawObject:
+        # Objects, or attributes of the enclosing object for many-valued
+        # attributes written as elements.
+        stack: list[Union[RawObject, EAttribute, None]] = []
+        for event, elem in etree.iterparse(BytesIO(raw_model), events=("start", "end"), remove_comments=True):
+            if event == "start":
+                if self.root is None:
+                    self.nsmap = dict(elem.nsmap)
+                    qname = etree.QName(elem)
+                    self.root = RawObject(self.get_eclass(qname.namespace, qname.localname), None, None, 0)
+                    self.read_features(self.root, elem.attrib)
+                    stack.append(self.root)
+                    continue
+
+                parent = stack[-1]
+                if not isinstance(parent, RawObject):
+                    raise RuntimeError(f"Unexpected element {elem.tag} in attribute value.")
+                feature = self.get_feature(parent.eclass, etree.QName(elem).localname)
+                if isinstance(feature, EAttribute):
+                    stack.append(feature)
+                    continue
+                if elem.get(XSI_NIL) is not None:
+                    stack.append(None)
+                    continue
+                if elem.get("href") is not None:
+                    raise RuntimeError("References to external resources are not supported.")
+
+                xsi_type = elem.get(XSI_TYPE) or elem.get(f"{{{XMI_URL}}}type")
+                if xsi_type:
+                    prefix, _, cname = xsi_type.rpartition(":")
+                    eclass = self.get_eclass(self.nsmap.get(prefix or None), cname)
+                else:
+                    eclass = feature.eType
+                siblings = parent.refs.get(feature.name) if feature.many else None
+                obj = RawObject(eclass, parent, feature, len(siblings) if siblings else 0)
+                parent.add_ref(feature, obj)
+                self.read_features(obj, elem.attrib)
+                stack.append(obj)
+            else:
+                top = stack.pop()
+                if isinstance(top, EAttribute):
+                    self.set_value(stack[-1], top, elem.text or "", from_tag=True)
+                # The element is no longer needed: free it and its predecessors.
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+
+        if self.root is None:
+            raise RuntimeError("Supplied with malformed DOMLX model.")
+        for obj, ref, value in self.later:
+            paths = value.split() if ref.many else [value.split()[-1]] if value.strip() else []
+            for path in paths:
+                obj.add_ref(ref, self.resolve(path))
+        return self.root
+
+    def resolve(self, path: str) -> RawObject:
+        uri, _, fragment = path.rpartition("#")
+        if uri:
+            raise RuntimeError("References to external resources are not supported.")
+        if not fragment.startswith("/"):
+            if fragment not in self.ids:
+                raise RuntimeError(f"Unknown object {fragment}.")
+            return self.ids[fragment]
+        if fragment[2:] in self.ids:
+            return self.ids[fragment[2:]]
+
+        if re.match(r"^/\d+", fragment):
+            fragment = fragment[fragment.index("/", 1):] if "/" in fragment[1:] else ""
+        obj = self.root
+        for step in (s for s in fragment.split("/") if s):
+            if not step.startswith("@"):
+                raise RuntimeError(f"Unsupported reference {path}.")
+            fname, _, index = step[1:].partition(".")
+            target = obj.refs.get(fname)
+            if index:
+                if not isinstance(target, list):
+                    raise RuntimeError(f"Unknown object {path}.")
+                if index.isdigit():
+                    if int(index) >= len(target):
+                        raise RuntimeError(f"Unknown object {path}.")
+                    target = target[int(index)]
+                else:
+                    target = next((t for t in target if t.values.get("name") == index), None)
+            if not isinstance(target, RawObject):
+                raise RuntimeError(f"Unknown object {path}.")
+            obj = target
+        return obj
+
+
+class RawLayerParser(ELayerParser):
+    """
+    An `ELayerParser` working on the `RawObject`s of `XMIStreamReader`.
+    It yields the same intermediate model as `ELayerParser` on the EObjects
+    pyecore loads from the same document.
+    """
+
+    def containment_path(self, doc: RawObject) -> list[str]:
+        if doc.container is None:
+            return []
+        step = f"{doc.feature.name}_{doc.index}" if doc.feature.many else doc.feature.name
+        return self.containment_path(doc.container) + [step]
+
+    def parse_eobject(self, doc: RawObject) -> str:
+        doc_id = id(doc)
+        if doc_id in self.visited:
+            return self.visited[doc_id]
+        name = self.element_name(doc)
+        self.visited[doc_id] = name
+
+        info = self.get_eclass_info(doc.eclass)
+
+        raw_attrs: Attributes = {}
+        for attr in info.attributes:
+            self.add_attribute_value(raw_attrs, attr, doc.values.get(attr.name, attr.unset))
+        attrs = parse_attributes(raw_attrs, info.mm_class, self.mm)
+
+        raw_assocs: Associations = {}
+        for ref_name, single in info.references:
+            targets = doc.refs.get(ref_name)
+            if targets:
+                if single:
+                    raw_assocs[ref_name] = {self.parse_eobject(targets)}
+                else:
+                    raw_assocs[ref_name] = {self.parse_eobject(t) for t in targets}
+        assocs = parse_associations(raw_assocs, info.mm_class, self.mm)
+
+        user_friendly_name = doc.values.get("name") if info.has_name else None
+        self.im[name] = DOMLElement(
+            id_=name, class_=info.mm_class, attributes=attrs, associations=assocs,
+            user_friendly_name=user_friendly_name
+        )
+        return name
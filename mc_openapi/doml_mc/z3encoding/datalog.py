@@ -0,0 +1,459 @@
+import threading
+import time
+from dataclasses import dataclass
+from itertools import count
+from typing import Optional, Union
+
+from z3 import (
+    And,
+    ExprRef,
+    Or,
+    SortRef,
+    Z3_OP_DT_CONSTRUCTOR,
+    Z3_OP_DT_IS,
+    Z3_OP_UNINTERPRETED,
+    is_and,
+    is_bool,
+    is_distinct,
+    is_eq,
+    is_false,
+    is_implies,
+    is_int_value,
+    is_not,
+    is_or,
+    is_quantifier,
+    is_true,
+)
+
+from .grounding import AssertionWalker, GroundingError, GroundingTimeout
+
+
+@dataclass(frozen=True)
+class Var:
+    """A variable of a rule, identified by the id of the constant it stands for."""
+    id: int
+
+
+# Rule arguments are variables or the ids of values in `ModelFacts`.
+Term = Union[Var, int]
+
+
+@dataclass(frozen=True)
+class Atom:
+    pred: str
+    args: tuple[Term, ...]
+    negated: bool = False
+
+
+@dataclass(frozen=True)
+class Test:
+    """
+    A built-in condition: `eq` and `neq` compare their two arguments, and
+    `is` (`not is`) holds if its argument is (not) made by constructor
+    `constructor`. An `eq` test with one argument bound binds the other one.
+    """
+    kind: str
+    args: tuple[Term, ...]
+    constructor: int = 0
+
+
+Literal = Union[Atom, Test]
+
+
+@dataclass
+class Rule:
+    head: Atom
+    body: list[Literal]
+
+
+def term_vars(terms) -> set[Var]:
+    return {t for t in terms if isinstance(t, Var)}
+
+
+class DatalogEngine:
+    """
+    Evaluates stratified Datalog programs bottom-up on the relations of
+    `edb`, which map predicate names to sets of tuples of value ids.
+    `constructors` maps value ids to the ids of their constructors.
+    Each stratum may only use the negation of the predicates of the strata
+    before it; rules within a stratum may be recursive, and are evaluated
+    semi-naively, joining each rule with the tuples derived in the previous
+    round only.
+    """
+    # Joins between checks of the deadline and of interruptions.
+    DEADLINE_INTERVAL = 1000
+
+    def __init__(
+        self,
+        edb: dict[str, set[tuple]],
+        constructors: dict[int, int],
+        deadline: Optional[float] = None,
+        interrupted: Optional[threading.Event] = None
+    ):
+        self.relations: dict[str, set[tuple]] = dict(edb)
+        self.constructors = constructors
+        # (predicate, bound positions) -> (relation size, index).
+        self.indexes: dict[tuple[str, tuple[int, ...]], tuple[int, dict[tuple, list[tuple]]]] = {}
+        self.deadline = deadline
+        # Stops the evaluation once set, as the deadline does.
+        self.interrupted = interrupted
+        self.joins = 0
+
+    def evaluate(self, strata: list[list[Rule]]) -> dict[str, set[tuple]]:
+        for rules in strata:
+            self.evaluate_stratum(rules)
+        return self.relations
+
+    def evaluate_stratum(self, rules: list[Rule]):
+        preds = {rule.head.pred for rule in rules}
+        for pred in preds:
+            self.relations.setdefault(pred, set())
+        delta = {pred: set() for pred in preds}
+        for rule in rules:
+            delta[rule.head.pred] |= self.fire(rule)
+        while any(delta.values()):
+            for pred, tuples in delta.items():
+                self.relations[pred] |= tuples
+            new: dict[str, set[tuple]] = {pred: set() for pred in preds}
+            for rule in rules:
+                for i, lit in enumerate(rule.body):
+                    if isinstance(lit, Atom) and not lit.negated and delta.get(lit.pred):
+                        new[rule.head.pred] |= self.fire(rule, i, delta[lit.pred])
+            delta = {pred: tuples - self.relations[pred] for pred, tuples in new.items()}
+
+    def index(self, pred: str, positions: tuple[int, ...]) -> dict[tuple, list[tuple]]:
+        relation = self.relations.get(pred, set())
+        size, index = self.indexes.get((pred, positions), (-1, {}))
+        if size != len(relation):
+            index = {}
+            for tpl in relation:
+                index.setdefault(tuple(tpl[p] for p in positions), []).append(tpl)
+            self.indexes[pred, positions] = (len(relation), index)
+        return index
+
+    def order(self, rule: Rule, first: Optional[int]) -> list[int]:
+        """
+        The order in which to join the body of `rule`: tests and negations
+        as soon as their variables are bound, and then the atom with the most
+        bound arguments, starting from atom `first` if given.
+        """
+        order = [] if first is None else [first]
+        bound = set() if first is None else term_vars(rule.body[first].args)
+        left = [i for i in range(len(rule.body)) if i != first]
+        while left:
+            best = None
+            for i in left:
+                lit = rule.body[i]
+                free = term_vars(lit.args) - bound
+                if isinstance(lit, Test) and (not free or (lit.kind == "eq" and len(free) == 1 and len(lit.args) == 2)):
+                    best = i
+                    break
+                if isinstance(lit, Atom) and lit.negated and not free:
+                    best = i
+                    break
+                if isinstance(lit, Atom) and not lit.negated:
+                    score = (len(lit.args) - len(free), -len(self.relations.get(lit.pred, ())))
+                    if best is None or score > best_score:
+                        best, best_score = i, score
+            if best is None:
+                raise GroundingError(f"Rule for {rule.head.pred} is not range-restricted.")
+            order.append(best)
+            bound |= term_vars(rule.body[best].args)
+            left.remove(best)
+        return order
+
+    def fire(self, rule: Rule, delta_at: Optional[int] = None, delta: Optional[set[tuple]] = None) -> set[tuple]:
+        """The head tuples derived by `rule`, with the atom at `delta_at` restricted to `delta`."""
+        bindings: list[dict[Var, int]] = [{}]
+        if delta_at is not None:
+            bindings = [
+                b for tpl in delta
+                if (b := self.unify(rule.body[delta_at].args, tpl, {})) is not None
+            ]
+        for i in self.order(rule, delta_at)[0 if delta_at is None else 1:]:
+            lit = rule.body[i]
+            joined = []
+            for b in bindings:
+                self.joins += 1
+                if self.joins % self.DEADLINE_INTERVAL == 0 and (
+                    self.deadline is not None and time.perf_counter() > self.deadline
+                    or self.interrupted is not None and self.interrupted.is_set()
+                ):
+                    raise GroundingTimeout()
+                joined.extend(self.join(lit, b))
+            bindings = joined
+            if not bindings:
+                return set()
+        return {tuple(b[t] if isinstance(t, Var) else t for t in rule.head.args) for b in bindings}
+
+    @staticmethod
+    def unify(args: tuple[Term, ...], tpl: tuple, binding: dict[Var, int]) -> Optional[dict[Var, int]]:
+        out = None
+        for arg, value in zip(args, tpl):
+            if isinstance(arg, Var):
+                bound = binding.get(arg) if out is None else out.get(arg)
+                if bound is None:
+                    if out is None:
+                        out = dict(binding)
+                    out[arg] = value
+                elif bound != value:
+                    return None
+            elif arg != value:
+                return None
+        return binding if out is None else out
+
+    def join(self, lit: Literal, binding: dict[Var, int]) -> list[dict[Var, int]]:
+        values = [binding.get(t) if isinstance(t, Var) else t for t in lit.args]
+        if isinstance(lit, Test):
+            if lit.kind in ("is", "not is"):
+                is_ = self.constructors[values[0]] == lit.constructor
+                return [binding] if is_ == (lit.kind == "is") else []
+            a, b = values
+            if lit.kind == "eq" and (a is None or b is None):
+                var = lit.args[0] if a is None else lit.args[1]
+                return [binding | {var: b if a is None else a}]
+            return [binding] if (a == b) == (lit.kind == "eq") else []
+        positions = tuple(p for p, v in enumerate(values) if v is not None)
+        matches = self.index(lit.pred, positions).get(tuple(values[p] for p in positions), [])
+        if lit.negated:
+            return [] if matches else [binding]
+        if len(positions) == len(values):
+            return [binding] if matches else []
+        return [b for tpl in matches if (b := self.unify(lit.args, tpl, binding)) is not None]
+
+
+class DatalogCompiler(AssertionWalker):
+    """
+    Compiles requirement assertions into stratified Datalog programs over
+    the relations of `facts`: `association` and `attribute` triples, the
+    `elem_class` pairs of elements and classes, and a `domain` relation
+    for each sort, holding its values (see `AssertionWalker.domain`).
+    The tuples of the `violation` predicate of a program are the values of
+    the free constants of the assertion that satisfy it, in `head` order.
+
+    Each disjunct of a formula is a rule, whose conjuncts are atoms or tests,
+    while nested disjunctions, quantifiers and negations of compound formulas
+    become predicates of their own, over their free constants. Their rules
+    start with the atoms of the enclosing rule on the same variables, which
+    any tuple of use to it satisfies, so that they only derive those tuples.
+    """
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.names = count()
+        # Id -> constant, for the variables and constants of the rules.
+        self.terms: dict[int, ExprRef] = {}
+        # Name -> sort, for the domain relations used by the rules.
+        self.domain_sorts: dict[str, SortRef] = {}
+        self.base_edb: Optional[dict[str, set[tuple]]] = None
+        # Value id -> id of its constructor, for the `is` tests.
+        self.constructors = {
+            v.get_id(): v.decl().get_id()
+            for v in list(self.facts.values.values()) + self.facts.adata_domain
+            if v.sort() == self.attr_data_sort
+        }
+        # Assertion id -> (assertion, program, head constants).
+        self.programs: dict[int, tuple[ExprRef, list[list[Rule]], list[ExprRef]]] = {}
+
+    def compile(self, assertion: ExprRef) -> tuple[list[list[Rule]], list[ExprRef]]:
+        if assertion.get_id() not in self.programs:
+            strata: list[list[Rule]] = []
+            head = list(self.free_consts(assertion).values())
+            self.define("violation", head, assertion, strata, [])
+            self.programs[assertion.get_id()] = (assertion, strata, head)
+        _, strata, head = self.programs[assertion.get_id()]
+        return strata, head
+
+    def edb(self) -> dict[str, set[tuple]]:
+        """The relations of the facts, and the domains of the rules compiled so far."""
+        facts = self.facts
+        if self.base_edb is None:
+            self.base_edb = {
+                "association": {(s, a, t) for (s, a), ts in facts.targets.items() for t in ts},
+                "attribute": {(e, a, d) for (e, a), ds in facts.attr_values.items() for d in ds},
+                "elem_class": {(e, c.get_id()) for e, c in facts.elem_class.items()},
+            }
+        return self.base_edb | {
+            f"domain {name}": {(v.get_id(),) for v in self.domain(sort)}
+            for name, sort in self.domain_sorts.items()
+        }
+
+    def value(self, value_id: int) -> ExprRef:
+        """
+        The value with id `value_id`, in a tuple derived by the rules.
+        Raises `GroundingError` if the rules derived a value that is unknown.
+        """
+        if value_id in self.facts.values:
+            return self.facts.values[value_id]
+        if value_id in self.terms:
+            return self.terms[value_id]
+        for sort in self.domain_sorts.values():
+            for v in self.domain(sort):
+                if v.get_id() == value_id:
+                    return v
+        raise GroundingError(f"Unknown value {value_id} in a derived tuple.")
+
+    # Rules.
+
+    def define(
+        self,
+        pred: str,
+        head: list[ExprRef],
+        formula: ExprRef,
+        strata: list[list[Rule]],
+        context: list[Literal]
+    ) -> Atom:
+        """
+        Adds the rules of `pred`, true for the values of `head` satisfying
+        `formula`, and the positive atoms of `context` on them.
+        """
+        head_atom = Atom(pred, tuple(self.var(c) for c in head))
+        head_vars = term_vars(head_atom.args)
+        guards = [
+            lit for lit in context
+            if isinstance(lit, Atom) and not lit.negated and term_vars(lit.args) & head_vars
+        ]
+        rules = [Rule(head_atom, body) for body in self.bodies(formula, strata, guards)]
+        for rule in rules:
+            self.restrict_range(rule)
+        strata.append(rules)
+        return head_atom
+
+    def auxiliary(
+        self,
+        formula: ExprRef,
+        strata: list[list[Rule]],
+        context: list[Literal],
+        negated: bool = False,
+        variables: list[ExprRef] = []
+    ) -> Atom:
+        """An atom of a new predicate for `formula`, existentially quantified over `variables`."""
+        bound = {v.get_id() for v in variables}
+        head = [c for k, c in self.free_consts(formula).items() if k not in bound]
+        atom = self.define(f"aux{next(self.names)}", head, formula, strata, context)
+        return Atom(atom.pred, atom.args, negated)
+
+    def bodies(self, e: ExprRef, strata: list[list[Rule]], context: list[Literal]) -> list[list[Literal]]:
+        """The bodies of the rules whose disjunction is `e`, each starting with `context`."""
+        if is_or(e):
+            return [b for d in e.children() for b in self.bodies(d, strata, context)]
+        if is_implies(e):
+            return self.bodies(self.neg(e.arg(0)), strata, context) + self.bodies(e.arg(1), strata, context)
+        if is_quantifier(e) and e.is_exists():
+            return self.bodies(self.open(e)[2], strata, context)
+        if is_not(e) and is_quantifier(e.arg(0)) and e.arg(0).is_forall():
+            return self.bodies(self.neg(self.open(e.arg(0))[2]), strata, context)
+        if is_eq(e) and is_bool(e.arg(0)):
+            a, b = e.arg(0), e.arg(1)
+            return self.bodies(Or(And(a, b), And(self.neg(a), self.neg(b))), strata, context)
+        if is_not(e) and is_eq(e.arg(0)) and is_bool(e.arg(0).arg(0)):
+            a, b = e.arg(0).arg(0), e.arg(0).arg(1)
+            return self.bodies(Or(And(a, self.neg(b)), And(self.neg(a), b)), strata, context)
+
+        conjuncts = self.conjuncts(e)
+        if any(is_false(c) for c in conjuncts):
+            return []
+        body = list(context)
+        # Compound conjuncts come last, so that the others guard them.
+        for c in sorted(conjuncts, key=lambda c: not self.is_simple(c)):
+            body.extend(self.literals(c, strata, body))
+        return [body]
+
+    def is_simple(self, e: ExprRef) -> bool:
+        """Whether `e` is made of atoms and tests, needing no predicate of its own."""
+        if is_not(e):
+            e = e.arg(0)
+        if is_quantifier(e) or is_and(e) or is_or(e) or is_implies(e) or is_not(e):
+            return False
+        return not (is_eq(e) and is_bool(e.arg(0)))
+
+    def literals(self, e: ExprRef, strata: list[list[Rule]], context: list[Literal]) -> list[Literal]:
+        """The literals of conjunct `e` of a rule with body `context`."""
+        if is_true(e):
+            return []
+        if not self.is_simple(e):
+            if is_not(e) and is_quantifier(e.arg(0)) and e.arg(0).is_exists():
+                _, variables, body = self.open(e.arg(0))
+                return [self.auxiliary(body, strata, context, True, variables)]
+            if is_quantifier(e) and e.is_forall():
+                # Not exists a counterexample.
+                _, variables, body = self.open(e)
+                return [self.auxiliary(self.neg(body), strata, context, True, variables)]
+            if is_not(e) and not (is_quantifier(e.arg(0)) or (is_eq(e.arg(0)) and is_bool(e.arg(0).arg(0)))):
+                return [self.auxiliary(e.arg(0), strata, context, True)]
+            variables = self.open(e)[1] if is_quantifier(e) else []
+            bodies = self.bodies(e, strata, [])
+            if len(bodies) == 1:
+                return bodies[0]
+            return [self.auxiliary(e, strata, context, False, variables)]
+
+        negated = is_not(e)
+        if negated:
+            e = e.arg(0)
+        literals: list[Literal] = []
+        if (is_eq(e) or is_distinct(e)) and e.num_args() == 2:
+            a, b = (self.term(arg, literals) for arg in e.children())
+            return literals + [Test("eq" if is_eq(e) != negated else "neq", (a, b))]
+        decl = e.decl()
+        if decl.eq(self.association_rel) or decl.eq(self.attribute_rel):
+            args = tuple(self.term(arg, literals) for arg in e.children())
+            return literals + [Atom("association" if decl.eq(self.association_rel) else "attribute", args, negated)]
+        if decl.kind() == Z3_OP_DT_IS and decl.get_id() in self.recognized:
+            arg = self.term(e.arg(0), literals)
+            return literals + [Test("not is" if negated else "is", (arg,), self.recognized[decl.get_id()])]
+        raise GroundingError(f"Cannot compile {decl.name()} to Datalog.")
+
+    def var(self, c: ExprRef) -> Var:
+        self.terms[c.get_id()] = c
+        return Var(c.get_id())
+
+    def term(self, t: ExprRef, literals: list[Literal]) -> Term:
+        """The argument standing for term `t`, adding to `literals` those that define it."""
+        if is_int_value(t):
+            self.terms[t.get_id()] = t
+            return t.get_id()
+        decl = t.decl()
+        if decl.kind() == Z3_OP_DT_CONSTRUCTOR:
+            args = [self.term(arg, literals) for arg in t.children()]
+            if any(isinstance(arg, Var) for arg in args):
+                raise GroundingError(f"Cannot compile {decl.name()} of a variable to Datalog.")
+            self.terms[t.get_id()] = t
+            self.constructors[t.get_id()] = decl.get_id()
+            return t.get_id()
+        if decl.kind() == Z3_OP_UNINTERPRETED and t.num_args() == 0:
+            return self.var(t)
+        if decl.eq(self.element_class_fun):
+            elem = self.term(t.arg(0), literals)
+            # The application stands for the class, which the atom binds.
+            class_ = self.var(t)
+            literals.append(Atom("elem_class", (elem, class_)))
+            return class_
+        raise GroundingError(f"Cannot compile {decl.name()} to Datalog.")
+
+    def restrict_range(self, rule: Rule):
+        """
+        Adds domain atoms for the variables of `rule` that no positive atom
+        binds, such as those only compared or negated, or missing from the
+        body. Equalities bind a variable to a bound term.
+        """
+        bound: set[Var] = set()
+        for lit in rule.body:
+            if isinstance(lit, Atom) and not lit.negated:
+                bound |= term_vars(lit.args)
+        changed = True
+        while changed:
+            changed = False
+            for lit in rule.body:
+                if isinstance(lit, Test) and lit.kind == "eq":
+                    free = term_vars(lit.args) - bound
+                    if len(free) == 1 and len(set(lit.args)) == 2:
+                        bound |= free
+                        changed = True
+        needed = term_vars(rule.head.args)
+        for lit in rule.body:
+            needed |= term_vars(lit.args)
+        for var in sorted(needed - bound, key=lambda v: v.id):
+            sort = self.terms[var.id].sort()
+            self.domain(sort)
+            self.domain_sorts[str(sort)] = sort
+            rule.body.insert(0, Atom(f"domain {sort}", (var,)))
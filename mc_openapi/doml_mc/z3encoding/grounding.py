@@ -0,0 +1,513 @@
+import threading
+import time
+from itertools import product
+from typing import Optional
+
+from z3 import (
+    And,
+    BoolRef,
+    BoolVal,
+    DatatypeSortRef,
+    ExprRef,
+    FreshConst,
+    FuncDeclRef,
+    Not,
+    Or,
+    SortRef,
+    Z3_OP_DT_CONSTRUCTOR,
+    Z3_OP_DT_IS,
+    Z3_OP_UNINTERPRETED,
+    is_and,
+    is_bool,
+    is_distinct,
+    is_eq,
+    is_false,
+    is_implies,
+    is_int_value,
+    is_not,
+    is_or,
+    is_quantifier,
+    is_true,
+    substitute_vars,
+)
+
+from ..intermediate_model import IntermediateModel, MetaModel
+from ..intermediate_model.metamodel import get_mangled_attribute_defaults
+
+from .im_encoding import encode_adata
+from .types import Refs
+
+
+class GroundingError(Exception):
+    """The expression uses a construct that the grounder does not support."""
+    pass
+
+
+class GroundingTimeout(Exception):
+    pass
+
+
+class ModelFacts:
+    """
+    The tuples of the element class function and of the association and
+    attribute relations in the model, i.e., the only ones that are true,
+    indexed for the lookups of `Grounder`.
+    Values are identified by the ids of their Z3 terms, which are unique
+    within a context.
+    """
+
+    def __init__(
+        self,
+        im: IntermediateModel,
+        mm: MetaModel,
+        elem: Refs,
+        class_: Refs,
+        assoc: Refs,
+        attr: Refs,
+        AData: DatatypeSortRef,
+        ss: Refs,
+    ):
+        # Id -> term of every value met.
+        self.values: dict[int, ExprRef] = {}
+        self.elem_class: dict[int, ExprRef] = {}
+        self.class_elems: dict[int, list[ExprRef]] = {}
+        # (source, association) -> targets, and back.
+        self.targets: dict[tuple[int, int], set[int]] = {}
+        self.sources: dict[tuple[int, int], set[int]] = {}
+        # (element, attribute) -> values, and back.
+        self.attr_values: dict[tuple[int, int], set[int]] = {}
+        self.attr_elems: dict[tuple[int, int], set[int]] = {}
+        # Association -> sources and targets, attribute -> elements and values.
+        self.assoc_sources: dict[int, set[int]] = {}
+        self.assoc_targets: dict[int, set[int]] = {}
+        self.attr_any_elems: dict[int, set[int]] = {}
+        self.attr_any_values: dict[int, set[int]] = {}
+
+        for ename, e in im.items():
+            ev = self.value(elem[ename])
+            cv = self.value(class_[e.class_])
+            self.elem_class[ev] = class_[e.class_]
+            self.class_elems.setdefault(cv, []).append(elem[ename])
+            for aname, targets in e.associations.items():
+                av = self.value(assoc[aname])
+                for tname in targets:
+                    tv = self.value(elem[tname])
+                    self.targets.setdefault((ev, av), set()).add(tv)
+                    self.sources.setdefault((av, tv), set()).add(ev)
+                    self.assoc_sources.setdefault(av, set()).add(ev)
+                    self.assoc_targets.setdefault(av, set()).add(tv)
+            for aname, avalues in (get_mangled_attribute_defaults(mm, e.class_) | e.attributes).items():
+                av = self.value(attr[aname])
+                for v in avalues:
+                    dv = self.value(encode_adata(AData, ss, v))
+                    self.attr_values.setdefault((ev, av), set()).add(dv)
+                    self.attr_elems.setdefault((av, dv), set()).add(ev)
+                    self.attr_any_elems.setdefault(av, set()).add(ev)
+                    self.attr_any_values.setdefault(av, set()).add(dv)
+
+        # Attribute data in the model, and one more value, standing for all
+        # those that are not: no attribute has them, and they are all alike.
+        adata = {dv for dvs in self.attr_any_values.values() for dv in dvs}
+        ints = [self.values[dv].arg(0).as_long() for dv in adata if is_int_value(self.values[dv].arg(0))]
+        other = AData.int(max(ints, default=0) + 1)  # type: ignore
+        self.adata_domain = [self.values[dv] for dv in sorted(adata)] + [other]
+
+    def value(self, v: ExprRef) -> int:
+        self.values[v.get_id()] = v
+        return v.get_id()
+
+    def terms(self, ids: Optional[set[int]]) -> list[ExprRef]:
+        return [self.values[i] for i in sorted(ids or ())]
+
+
+Cases = list[tuple[BoolRef, ExprRef]]
+
+
+class AssertionWalker:
+    """
+    Helpers to translate requirement assertions on the model of `facts`:
+    quantified variables are replaced by fresh constants, standing for the
+    values they are bound to.
+    """
+
+    def __init__(
+        self,
+        facts: ModelFacts,
+        element_class_fun: FuncDeclRef,
+        association_rel: FuncDeclRef,
+        attribute_rel: FuncDeclRef,
+        attr_data_sort: DatatypeSortRef,
+    ):
+        self.facts = facts
+        self.element_class_fun = element_class_fun
+        self.association_rel = association_rel
+        self.attribute_rel = attribute_rel
+        self.attr_data_sort = attr_data_sort
+        ctx = attr_data_sort.ctx
+        self.true = BoolVal(True, ctx)
+        self.false = BoolVal(False, ctx)
+        # Recognizer -> constructor of attribute data.
+        self.recognized = {
+            attr_data_sort.recognizer(i).get_id(): attr_data_sort.constructor(i).get_id()
+            for i in range(attr_data_sort.num_constructors())
+        }
+        # Caches, by id of the expression. Expressions are kept, so that
+        # their ids are not reused.
+        self.opened: dict[int, tuple[ExprRef, list[ExprRef], ExprRef]] = {}
+        self.domains: dict[int, list[ExprRef]] = {}
+        self.consts: dict[int, tuple[ExprRef, dict[int, ExprRef]]] = {}
+        self.conjunct_lists: dict[int, tuple[ExprRef, list[ExprRef]]] = {}
+
+    def neg(self, a: BoolRef) -> BoolRef:
+        if is_true(a):
+            return self.false
+        if is_false(a):
+            return self.true
+        if is_not(a):
+            return a.arg(0)
+        return Not(a)
+
+    def domain(self, sort: SortRef) -> list[ExprRef]:
+        if sort == self.attr_data_sort:
+            return self.facts.adata_domain
+        if sort.get_id() not in self.domains:
+            if not isinstance(sort, DatatypeSortRef) or any(
+                sort.constructor(i).arity() > 0 for i in range(sort.num_constructors())
+            ):
+                raise GroundingError(f"Sort {sort} is not finite.")
+            self.domains[sort.get_id()] = [sort.constructor(i)() for i in range(sort.num_constructors())]
+        return self.domains[sort.get_id()]
+
+    def open(self, q: ExprRef) -> tuple[ExprRef, list[ExprRef], ExprRef]:
+        """Replaces the bound variables of quantifier `q` with fresh constants."""
+        if q.get_id() not in self.opened:
+            variables = [FreshConst(q.var_sort(i), q.var_name(i)) for i in range(q.num_vars())]
+            # Variable 0 is the innermost, i.e., the last one.
+            self.opened[q.get_id()] = (q, variables, substitute_vars(q.body(), *reversed(variables)))
+        return self.opened[q.get_id()]
+
+    def free_consts(self, e: ExprRef) -> dict[int, ExprRef]:
+        """The uninterpreted constants free in `e`, by id."""
+        if e.get_id() not in self.consts:
+            if is_quantifier(e):
+                _, variables, body = self.open(e)
+                bound = {v.get_id() for v in variables}
+                consts = {k: c for k, c in self.free_consts(body).items() if k not in bound}
+            elif e.decl().kind() == Z3_OP_UNINTERPRETED and e.num_args() == 0:
+                consts = {e.get_id(): e}
+            else:
+                consts = {}
+                for c in e.children():
+                    consts |= self.free_consts(c)
+            self.consts[e.get_id()] = (e, consts)
+        return self.consts[e.get_id()][1]
+
+    def conjuncts(self, e: ExprRef) -> list[ExprRef]:
+        """The formulas whose conjunction is `e`, pushing negations inwards."""
+        if e.get_id() not in self.conjunct_lists:
+            if is_and(e):
+                out = [c for arg in e.children() for c in self.conjuncts(arg)]
+            elif is_not(e) and is_or(e.arg(0)):
+                out = [c for arg in e.arg(0).children() for c in self.conjuncts(self.neg(arg))]
+            elif is_not(e) and is_implies(e.arg(0)):
+                out = self.conjuncts(e.arg(0).arg(0)) + self.conjuncts(self.neg(e.arg(0).arg(1)))
+            elif is_not(e) and is_not(e.arg(0)):
+                out = self.conjuncts(e.arg(0).arg(0))
+            else:
+                out = [e]
+            self.conjunct_lists[e.get_id()] = (e, out)
+        return self.conjunct_lists[e.get_id()][1]
+
+
+class Grounder(AssertionWalker):
+    """
+    Expands the quantifiers of a requirement assertion over the values of
+    their (finite) sorts, and evaluates the class function and the relations
+    on the tuples of `facts`, so that the assertion becomes a propositional
+    formula over the equalities of its free constants with their values.
+    Attribute data range over the values in the model, plus one for all others.
+
+    Quantifiers are expanded by a join: each variable only ranges over the
+    values that satisfy some atom of the body that any instance needs to be
+    true, given the variables bound so far, and instances falsified by their
+    bound atoms are dropped as soon as possible.
+    """
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.deadline: Optional[float] = None
+        self.interrupted: Optional[threading.Event] = None
+        self.var_cases: dict[int, Cases] = {}
+
+    def ground(
+        self,
+        assertion: ExprRef,
+        deadline: Optional[float] = None,
+        interrupted: Optional[threading.Event] = None
+    ) -> BoolRef:
+        """
+        Grounds `assertion`, by `deadline`, a `time.perf_counter()` value,
+        raising `GroundingTimeout` after it, or once `interrupted` is set.
+        Its free constants of finite sorts are left to the SAT solver; the
+        others, i.e., attribute data, are existentially quantified.
+        """
+        self.deadline = deadline
+        self.interrupted = interrupted
+        adata = [
+            c for c in self.free_consts(assertion).values()
+            if c.sort() == self.attr_data_sort
+        ]
+        if adata:
+            return self.exists(adata, assertion, {})
+        return self.formula(assertion, {})
+
+    # Boolean connectives, simplifying constants away.
+
+    def conj(self, args) -> BoolRef:
+        out = []
+        for a in args:
+            if is_false(a):
+                return self.false
+            if not is_true(a):
+                out.append(a)
+        if not out:
+            return self.true
+        return out[0] if len(out) == 1 else And(out)
+
+    def disj(self, args) -> BoolRef:
+        out = []
+        for a in args:
+            if is_true(a):
+                return self.true
+            if not is_false(a):
+                out.append(a)
+        if not out:
+            return self.false
+        return out[0] if len(out) == 1 else Or(out)
+
+    # Formulas.
+
+    def formula(self, e: ExprRef, env: dict[int, ExprRef]) -> BoolRef:
+        """Grounds the formula `e`, where `env` binds the constants standing for quantified variables."""
+        if e.get_id() in env:
+            return env[e.get_id()]
+        if is_true(e) or is_false(e):
+            return e
+        if is_quantifier(e):
+            _, variables, body = self.open(e)
+            if e.is_forall():
+                return self.neg(self.exists(variables, self.neg(body), env))
+            if e.is_exists():
+                return self.exists(variables, body, env)
+            raise GroundingError("Lambda expressions cannot be grounded.")
+        if is_and(e):
+            return self.conj(self.formula(c, env) for c in e.children())
+        if is_or(e):
+            return self.disj(self.formula(c, env) for c in e.children())
+        if is_not(e):
+            return self.neg(self.formula(e.arg(0), env))
+        if is_implies(e):
+            return self.disj([self.neg(self.formula(e.arg(0), env)), self.formula(e.arg(1), env)])
+        if is_eq(e) or (is_distinct(e) and e.num_args() == 2):
+            if is_bool(e.arg(0)):
+                a, b = self.formula(e.arg(0), env), self.formula(e.arg(1), env)
+                if (is_true(a) or is_false(a)) and (is_true(b) or is_false(b)):
+                    eq = self.true if a.eq(b) else self.false
+                else:
+                    eq = a == b
+            else:
+                eq = self.equal(self.cases(e.arg(0), env), self.cases(e.arg(1), env))
+            return eq if is_eq(e) else self.neg(eq)
+
+        decl = e.decl()
+        if decl.eq(self.association_rel):
+            return self.relation(e, env, self.facts.targets)
+        if decl.eq(self.attribute_rel):
+            return self.relation(e, env, self.facts.attr_values)
+        if decl.kind() == Z3_OP_DT_IS and decl.get_id() in self.recognized:
+            constructor = self.recognized[decl.get_id()]
+            return self.disj(c for c, v in self.cases(e.arg(0), env) if v.decl().get_id() == constructor)
+        if decl.kind() == Z3_OP_UNINTERPRETED and e.num_args() == 0:
+            return e
+        raise GroundingError(f"Cannot ground {decl.name()}.")
+
+    def equal(self, cases_a: Cases, cases_b: Cases) -> BoolRef:
+        by_value: dict[int, list[BoolRef]] = {}
+        for c, v in cases_b:
+            by_value.setdefault(v.get_id(), []).append(c)
+        return self.disj(
+            self.conj([ca, cb])
+            for ca, v in cases_a
+            for cb in by_value.get(v.get_id(), [])
+        )
+
+    def relation(self, e: ExprRef, env: dict[int, ExprRef], index: dict[tuple[int, int], set[int]]) -> BoolRef:
+        """Grounds an atom of the association or attribute relation, looking up its third argument in `index`."""
+        cases_s, cases_a, cases_t = (self.cases(arg, env) for arg in e.children())
+        by_value: dict[int, list[BoolRef]] = {}
+        for c, v in cases_t:
+            by_value.setdefault(v.get_id(), []).append(c)
+        out = []
+        for cs, s in cases_s:
+            for ca, a in cases_a:
+                related = index.get((s.get_id(), a.get_id()))
+                if not related:
+                    continue
+                if len(related) < len(by_value):
+                    matches = ((t, by_value.get(t, [])) for t in related)
+                else:
+                    matches = ((t, conds) for t, conds in by_value.items() if t in related)
+                for _, conds in matches:
+                    for ct in conds:
+                        out.append(self.conj([cs, ca, ct]))
+        return self.disj(out)
+
+    # Terms.
+
+    def cases(self, t: ExprRef, env: dict[int, ExprRef]) -> Cases:
+        """The values that term `t` may take, each with the condition under which it does."""
+        if t.get_id() in env:
+            return [(self.true, env[t.get_id()])]
+        if is_int_value(t):
+            return [(self.true, t)]
+        decl = t.decl()
+        if decl.kind() == Z3_OP_DT_CONSTRUCTOR:
+            if t.num_args() == 0:
+                return [(self.true, t)]
+            arg_cases = [self.cases(arg, env) for arg in t.children()]
+            return [
+                (self.conj(c for c, _ in combination), decl(*(v for _, v in combination)))
+                for combination in product(*arg_cases)
+            ]
+        if decl.eq(self.element_class_fun):
+            return [(c, self.facts.elem_class[v.get_id()]) for c, v in self.cases(t.arg(0), env)]
+        if decl.kind() == Z3_OP_UNINTERPRETED and t.num_args() == 0:
+            # Left to the SAT solver.
+            if t.get_id() not in self.var_cases:
+                self.var_cases[t.get_id()] = [(t == v, v) for v in self.domain(t.sort())]
+            return self.var_cases[t.get_id()]
+        raise GroundingError(f"Cannot ground {decl.name()}.")
+
+    # Quantifiers.
+
+    def exists(self, variables: list[ExprRef], body: ExprRef, env: dict[int, ExprRef]) -> BoolRef:
+        # Each disjunct only needs to bind its own variables.
+        if is_or(body):
+            return self.disj(self.exists(variables, d, env) for d in body.children())
+        consts = self.free_consts(body)
+        variables = [v for v in variables if v.get_id() in consts]
+        var_ids = {v.get_id() for v in variables}
+        conjuncts = self.conjuncts(body)
+        deps = [self.free_consts(c).keys() & var_ids for c in conjuncts]
+        ground = self.conj(self.formula(c, env) for c, d in zip(conjuncts, deps) if not d)
+        if is_false(ground):
+            return ground
+        instances: list[BoolRef] = []
+        self.instantiate(variables, conjuncts, deps, env, [ground], instances)
+        return self.disj(instances)
+
+    def instantiate(
+        self,
+        variables: list[ExprRef],
+        conjuncts: list[ExprRef],
+        deps: list[set[int]],
+        env: dict[int, ExprRef],
+        ground: list[BoolRef],
+        instances: list[BoolRef]
+    ):
+        """
+        Adds to `instances` the conjunction of the ground `conjuncts` for
+        each value of `variables` that does not falsify them.
+        """
+        if self.deadline is not None and time.perf_counter() > self.deadline \
+                or self.interrupted is not None and self.interrupted.is_set():
+            raise GroundingTimeout()
+        if not variables:
+            instances.append(self.conj(ground))
+            return
+
+        # The variable with the fewest values left goes first.
+        var, values = None, None
+        for v in variables:
+            candidates = self.candidates(v, conjuncts, env)
+            if candidates is not None and (values is None or len(candidates) < len(values)):
+                var, values = v, candidates
+        if var is None:
+            var, values = variables[0], self.domain(variables[0].sort())
+        rest = [v for v in variables if not v.eq(var)]
+        for value in values:
+            inner = dict(env)
+            inner[var.get_id()] = value
+            bound = list(ground)
+            for c, d in zip(conjuncts, deps):
+                if var.get_id() in d and all(i in inner for i in d):
+                    bound.append(self.formula(c, inner))
+                    if is_false(bound[-1]):
+                        break
+            else:
+                self.instantiate(rest, conjuncts, deps, inner, bound, instances)
+
+    def candidates(self, var: ExprRef, conjuncts: list[ExprRef], env: dict[int, ExprRef]) -> Optional[list[ExprRef]]:
+        """The fewest values of `var` that some conjunct allows, or None if none restricts them."""
+        best = None
+        for c in conjuncts:
+            if var.get_id() in self.free_consts(c):
+                values = self.atom_candidates(var, c, env)
+                if values is not None and (best is None or len(values) < len(best)):
+                    best = values
+        return best
+
+    def known(self, t: ExprRef, env: dict[int, ExprRef]) -> Optional[ExprRef]:
+        if t.get_id() in env:
+            return env[t.get_id()]
+        if t.decl().kind() == Z3_OP_DT_CONSTRUCTOR and t.num_args() == 0:
+            return t
+        return None
+
+    def atom_candidates(self, var: ExprRef, e: ExprRef, env: dict[int, ExprRef]) -> Optional[list[ExprRef]]:
+        facts = self.facts
+        if is_quantifier(e):
+            return None
+        if is_or(e):
+            values: dict[int, ExprRef] = {}
+            for d in e.children():
+                d_values = self.atom_candidates(var, d, env)
+                if d_values is None:
+                    return None
+                values |= {v.get_id(): v for v in d_values}
+            return list(values.values())
+        if is_eq(e):
+            a, b = e.arg(0), e.arg(1)
+            if b.eq(var):
+                a, b = b, a
+            if a.eq(var):
+                value = self.known(b, env)
+                return None if value is None else [value]
+            if b.decl().eq(self.element_class_fun):
+                a, b = b, a
+            if a.decl().eq(self.element_class_fun) and a.arg(0).eq(var):
+                value = self.known(b, env)
+                return None if value is None else facts.class_elems.get(value.get_id(), [])
+            return None
+        decl = e.decl()
+        if decl.eq(self.association_rel):
+            forward, backward, sources, targets = facts.targets, facts.sources, facts.assoc_sources, facts.assoc_targets
+        elif decl.eq(self.attribute_rel):
+            forward, backward, sources, targets = facts.attr_values, facts.attr_elems, facts.attr_any_elems, facts.attr_any_values
+        else:
+            return None
+        s, a, t = e.children()
+        a_value = self.known(a, env)
+        if a_value is None or s.eq(t):
+            return None
+        if s.eq(var):
+            t_value = self.known(t, env)
+            if t_value is None:
+                return facts.terms(sources.get(a_value.get_id()))
+            return facts.terms(backward.get((a_value.get_id(), t_value.get_id())))
+        if t.eq(var):
+            s_value = self.known(s, env)
+            if s_value is None:
+                return facts.terms(targets.get(a_value.get_id()))
+            return facts.terms(forward.get((s_value.get_id(), a_value.get_id())))
+        return None
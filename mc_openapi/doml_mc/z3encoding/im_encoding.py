@@ -8,10 +8,13 @@ from z3 import (
     DatatypeRef,
     DatatypeSortRef,
     ForAll,
+    BoolVal,
     FuncDeclRef,
     Function,
+    If,
     Not,
     Or,
+    RecAddDefinition,
     Solver,
 )
 
@@ -35,6 +38,13 @@ def mk_elem_sort_dict(
     return mk_enum_sort_dict("Element", list(im) + additional_elems, z3ctx=z3ctx)
 
 
+def def_elem_class_f(
+    elem_sort: DatatypeSortRef,
+    class_sort: DatatypeSortRef,
+) -> FuncDeclRef:
+    return Function("elem_class", elem_sort, class_sort)
+
+
 def def_elem_class_f_and_assert_classes(
     im: IntermediateModel,
     solver: Solver,
@@ -47,13 +57,36 @@ def def_elem_class_f_and_assert_classes(
     ### Effects
     This procedure is effectful on `solver`.
     """
-    elem_class_f = Function("elem_class", elem_sort, class_sort)
+    elem_class_f = def_elem_class_f(elem_sort, class_sort)
+    assert_im_classes(elem_class_f, solver, im, elem, class_)
+    return elem_class_f
+
+
+def assert_im_classes(
+    elem_class_f: FuncDeclRef,
+    solver: Solver,
+    im: IntermediateModel,
+    elem: Refs,
+    class_: Refs,
+) -> None:
+    """
+    ### Effects
+    This procedure is effectful on `solver`.
+    """
     for ename, e in im.items():
         solver.assert_and_track(
             elem_class_f(elem[ename]) == class_[e.class_],
             f"elem_class {ename} {e.class_}",
         )
-    return elem_class_f
+
+
+def encode_adata(AData: DatatypeSortRef, ss: Refs, v: Union[str, int, bool]) -> DatatypeRef:
+    if type(v) is str:
+        return AData.ss(ss[v])  # type: ignore
+    elif type(v) is int:
+        return AData.int(v)  # type: ignore
+    else:  # type(v) is bool
+        return AData.bool(v)  # type: ignore
 
 
 def assert_im_attributes(
@@ -71,15 +104,6 @@ def assert_im_attributes(
     ### Effects
     This procedure is effectful on `solver`.
     """
-
-    def encode_adata(v: Union[str, int, bool]) -> DatatypeRef:
-        if type(v) is str:
-            return AData.ss(ss[v])  # type: ignore
-        elif type(v) is int:
-            return AData.int(v)  # type: ignore
-        else:  # type(v) is bool
-            return AData.bool(v)  # type: ignore
-
     a = Const("a", attr_sort)
     d = Const("d", AData)
     for esn, im_es in im.items():
@@ -93,7 +117,7 @@ def assert_im_attributes(
                         *(
                             And(
                                 a == attr[aname],
-                                d == encode_adata(avalue),
+                                d == encode_adata(AData, ss, avalue),
                             )
                             for aname, avalues in mangled_attrs.items()
                             for avalue in avalues
@@ -109,6 +133,37 @@ def assert_im_attributes(
         solver.assert_and_track(assn, f"attribute_values {esn}")
 
 
+def define_im_attributes(
+    attr_rel: FuncDeclRef,
+    im: IntermediateModel,
+    mm: MetaModel,
+    elem_sort: DatatypeSortRef,
+    elem: Refs,
+    attr_sort: DatatypeSortRef,
+    attr: Refs,
+    AData: DatatypeSortRef,
+    ss: Refs,
+) -> None:
+    """
+    Defines `attr_rel`, declared by `def_attribute_table_rel`, as a lookup
+    table on the element and then on the attribute. Z3 unfolds the
+    definition on the terms it meets, so no quantifier is instantiated.
+    """
+    e = Const("e", elem_sort)
+    a = Const("a", attr_sort)
+    d = Const("d", AData)
+    ctx = elem_sort.ctx
+    table = BoolVal(False, ctx)
+    for esn, im_es in reversed(im.items()):
+        mangled_attrs = get_mangled_attribute_defaults(mm, im_es.class_) | im_es.attributes
+        values = BoolVal(False, ctx)
+        for aname, avalues in reversed(mangled_attrs.items()):
+            values = If(a == attr[aname], Or(*(d == encode_adata(AData, ss, v) for v in avalues), ctx), values)
+        if mangled_attrs:
+            table = If(e == elem[esn], values, table)
+    RecAddDefinition(attr_rel, [e, a, d], table)
+
+
 def assert_im_associations(
     assoc_rel: FuncDeclRef,
     solver: Solver,
@@ -169,12 +224,51 @@ def assert_im_associations_q(
         solver.assert_and_track(assn, f"associations {esn} {etn}")
 
 
-def mk_stringsym_sort_dict(
+def assert_im_associations_sparse(
+    assoc_rel: FuncDeclRef,
+    solver: Solver,
     im: IntermediateModel,
-    mm: MetaModel,
-    z3ctx: Context
-) -> SortAndRefs:
-    strings = (
+    elem: Refs,
+    elem_sort: DatatypeSortRef,
+    assoc_sort: DatatypeSortRef,
+    assoc: Refs,
+) -> None:
+    """
+    Asserts one definition of `assoc_rel` per source element, listing only
+    the (association, target) pairs that are actually present in `im`.
+    All other tuples are false, so the encoding grows with the number of
+    links instead of with the square of the number of elements.
+
+    ### Effects
+    This procedure is effectful on `solver`.
+    """
+
+    a = Const("a", assoc_sort)
+    et = Const("et", elem_sort)
+    for esn, im_es in im.items():
+        links = [
+            And(a == assoc[amn], et == elem[etn])
+            for amn, etns in im_es.associations.items()
+            for etn in sorted(etns)
+        ]
+        if links:
+            assn = ForAll(
+                [a, et],
+                Iff(assoc_rel(elem[esn], a, et), Or(*links)),
+            )
+        else:
+            assn = ForAll(
+                [a, et],
+                Not(assoc_rel(elem[esn], a, et))
+            )
+        solver.assert_and_track(assn, f"associations {esn}")
+
+
+def get_string_values(
+    im: IntermediateModel,
+    mm: MetaModel
+) -> set[str]:
+    return (
         {
             v
             for e in im.values()
@@ -192,4 +286,14 @@ def mk_stringsym_sort_dict(
         }
         | {"SCRIPT", "IMAGE"}  # GeneratorKind values
     )
-    return mk_stringsym_sort_from_strings(list(strings), z3ctx=z3ctx)
+
+
+def mk_stringsym_sort_dict(
+    im: IntermediateModel,
+    mm: MetaModel,
+    z3ctx: Context
+) -> SortAndRefs:
+    strings = get_string_values(im, mm)
+    # Sorting makes symbol names independent of set ordering, which
+    # differs between processes.
+    return mk_stringsym_sort_from_strings(sorted(strings), z3ctx=z3ctx)
@@ -4,6 +4,7 @@ from z3 import (
     DatatypeSortRef,
     FuncDeclRef,
     Function,
+    RecFunction,
 )
 from ..intermediate_model import MetaModel
 
@@ -47,6 +48,18 @@ def def_attribute_rel(
     return Function("attribute", elem_sort, attr_sort, AData, BoolSort(ctx=elem_sort.ctx))
 
 
+def def_attribute_table_rel(
+    attr_sort: DatatypeSortRef,
+    elem_sort: DatatypeSortRef,
+    AData: DatatypeSortRef
+) -> FuncDeclRef:
+    """
+    Declares the attribute relation as a function to be defined by
+    `define_im_attributes`, rather than by assertions.
+    """
+    return RecFunction("attribute", elem_sort, attr_sort, AData, BoolSort(ctx=elem_sort.ctx))
+
+
 def def_association_rel(
     assoc_sort: DatatypeSortRef,
     elem_sort: DatatypeSortRef
@@ -1,5 +1,22 @@
 import datetime
-from .doml_mc import ModelChecker, MCResult
+from contextlib import closing
+from dataclasses import asdict
+import json
+from concurrent.futures import wait
+from flask import Response, current_app, request, stream_with_context
+from .doml_mc import ModelChecker, MCResult, MCResults
+from .doml_mc.imc import Engine
+from .doml_mc.mc_result import Profile
+from .doml_mc.jobs import Job, JobQueueFull, JobState
+from .doml_mc.mc import RESULT_GRACE, PendingResults, get_requirements, unchecked_results
+from .doml_mc.result_cache import ResultCache
+from .doml_mc.session import CheckSession, MalformedModel
+from .doml_mc.worker_pool import PoolFull
+from .doml_mc.xmi_parser.doml_model import infer_domlx_version
+
+
+# Longest time a request may wait for a job to finish, in seconds.
+MAX_JOB_WAIT = 30
 
 
 def make_error(user_msg, debug_msg=None):
@@ -9,18 +26,368 @@ def make_error(user_msg, debug_msg=None):
     return result
 
 
-def post(body, requirement=None):
+def make_result(results):
+    res, msg = results.summarize()
+    if res == MCResult.sat:
+        return {"result": "sat"}
+    else:
+        return {"result": res.name,
+                "description": msg}
+
+
+def is_cacheable(results):
+    """Results with requirements that timed out are not cached: they may be checked in time later."""
+    return all(res != MCResult.dontknow for res, _ in results.results)
+
+
+def lookup_results(doml_xmi, cache):
+    """
+    Looks up the results of checking `doml_xmi` in `cache`, first by its
+    text and then by its intermediate model.
+    Returns the results, or None and a `ModelChecker` for the model, and the
+    cache keys under which to store its results once checked.
+    """
+    doml_version = infer_domlx_version(doml_xmi)
+    consistency_checks = current_app.config["CONSISTENCY_CHECKS"]
+    req_names = [req.assert_name for req in get_requirements(doml_version, consistency_checks).get_all_requirements()]
+    xmi_key = ResultCache.key(doml_xmi, doml_version, req_names)
+    results = cache.get(xmi_key) if cache else None
+    if results is not None:
+        return results, None, []
+
+    dmc = ModelChecker(doml_xmi, doml_version, portfolio=current_app.config["PORTFOLIO"])
+    model_key = ResultCache.model_key(dmc.intermediate_model, doml_version, req_names)
+    results = cache.get(model_key) if cache else None
+    if results is not None:
+        if cache:
+            cache.put(xmi_key, results)
+        return results, None, []
+    return None, dmc, [model_key, xmi_key]
+
+
+# Media types of the responses of /modelcheck: the last two stream results.
+RESPONSE_TYPES = ["application/json", "application/x-ndjson", "text/event-stream"]
+
+
+def make_record(record: dict, mimetype: str) -> str:
+    """Formats a record of a streamed response as an NDJSON line or as a Server-Sent Event."""
+    data = json.dumps(record, default=str)
+    if mimetype == "text/event-stream":
+        return f"event: {record['type']}\ndata: {data}\n\n"
+    return data + "\n"
+
+
+def stream_results(
+    doml_version, dmc, results, keys, profile, mimetype, fail_fast=False, engine=Engine.NATIVE, max_violations=1
+):
+    """
+    Yields a record with the result of each requirement, as soon as it is
+    checked, and a final record with the summary of all results.
+    `results` are the cached ones, if any, else `dmc` checks the model.
+    """
+    cache = current_app.config["RESULT_CACHE"]
+    consistency_checks = current_app.config["CONSISTENCY_CHECKS"]
+    reqs = get_requirements(doml_version, consistency_checks).get_all_requirements()
+    if results is not None:
+        records = ((i, result, None) for i, result in enumerate(results.results))
+        cache_status = "HIT"
+    else:
+        pool = current_app.config["WORKER_POOL"]
+        check_profile = Profile()
+        records = dmc.iter_common_requirements(
+            consistency_checks=consistency_checks, timeout=50, pool=pool, engine=engine, profile=check_profile,
+            max_violations=max_violations
+        )
+        cache_status = "MISS"
+
+    checked = {}
+    with closing(records):
+        for i, (res, msg), req_profile in records:
+            checked[i] = (res, msg), req_profile
+            record = {"type": "requirement", "requirement": reqs[i].assert_name, "result": res.name}
+            if res == MCResult.unsat:
+                record["description"] = msg
+            # Cached results have no profile.
+            if profile and req_profile is not None:
+                record["profile"] = asdict(req_profile)
+            yield make_record(record, mimetype)
+            if fail_fast and res == MCResult.unsat:
+                break
+
+    if cache_status == "MISS":
+        order = sorted(checked)
+        results = MCResults([checked[i][0] for i in order], check_profile)
+        check_profile.requirements = [checked[i][1] for i in order]
+        if cache and len(results.results) == len(reqs) and is_cacheable(results):
+            for key in keys:
+                cache.put(key, results)
+    current_app.config["METRICS"].record(results, cache_status)
+    yield make_record({"type": "summary"} | make_result(results), mimetype)
+
+
+def post(body, requirement=None, profile=False, fail_fast=False, engine="native", max_violations=1):
     doml_xmi = body
+    engine = Engine(engine)
+    mimetype = request.accept_mimetypes.best_match(RESPONSE_TYPES, RESPONSE_TYPES[0])
+    # Cached results only describe one violation per requirement.
+    cache = current_app.config["RESULT_CACHE"] if max_violations == 1 else None
+    try:
+        if mimetype != "application/json":
+            doml_version = infer_domlx_version(doml_xmi)
+            results, dmc, keys = lookup_results(doml_xmi, cache)
+            if cache is None:
+                keys = []
+            return Response(
+                stream_with_context(stream_results(
+                    doml_version, dmc, results, keys, profile, mimetype, fail_fast, engine, max_violations
+                )),
+                mimetype=mimetype, headers={"X-Cache": "MISS" if results is None else "HIT"}
+            )
+
+        results, dmc, keys = lookup_results(doml_xmi, cache)
+        if results is None:
+            pool = current_app.config["WORKER_POOL"]
+            results = dmc.check_common_requirements(
+                threads=pool.size, consistency_checks=current_app.config["CONSISTENCY_CHECKS"],
+                timeout=50, pool=pool, engine=engine, fail_fast=fail_fast, max_violations=max_violations
+            )
+            headers = {"X-Cache": "MISS"}
+            # Results of a fail-fast check leave out some requirements, unless all are satisfied.
+            if cache and is_cacheable(results) and (not fail_fast or results.summarize()[0] == MCResult.sat):
+                for key in keys:
+                    cache.put(key, results)
+        else:
+            headers = {"X-Cache": "HIT"}
+        current_app.config["METRICS"].record(results, headers["X-Cache"])
+
+        response = make_result(results)
+        if profile:
+            response["profile"] = results.profile.to_dict()
+        return response, 200, headers
+
+    except PoolFull as e:
+        return make_error("The model checker is overloaded, please try again later.", debug_msg=str(e)), 503
+
+    except Exception as e:
+        return make_error("The supplied DOMLX model is malformed or its DOML version is unsupported.", debug_msg=str(e)), 400
+
+
+def parse_batch(body):
+    """
+    Returns the (name, DOMLX model) pairs of a batch in NDJSON format:
+    one JSON object per line, with the model in `model` and an optional `name`.
+    """
+    if isinstance(body, bytes):
+        body = body.decode("utf-8")
+    items = []
+    for line in body.splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        if not isinstance(item, dict) or not isinstance(item.get("model"), str):
+            raise ValueError(f"Batch item {len(items)} has no model.")
+        items.append((str(item.get("name", len(items))), item["model"].encode("utf-8")))
+    if not items:
+        raise ValueError("The batch is empty.")
+    return items
+
+
+def post_batch(body, profile=False):
+    try:
+        items = parse_batch(body)
+    except Exception as e:
+        return make_error("The batch is malformed: it must contain one JSON object with a model per line.", debug_msg=str(e)), 400
+
+    cache = current_app.config["RESULT_CACHE"]
+    pool = current_app.config["WORKER_POOL"]
+    consistency_checks = current_app.config["CONSISTENCY_CHECKS"]
+    # Per item: results, or pending results and cache keys, or an error.
+    outcomes = []
+    # Items with the same model share their pending results.
+    pending_by_model: dict[bytes, PendingResults] = {}
+    try:
+        for _, doml_xmi in items:
+            if doml_xmi in pending_by_model:
+                outcomes.append(("pending", pending_by_model[doml_xmi], []))
+                continue
+            try:
+                results, dmc, keys = lookup_results(doml_xmi, cache)
+            except Exception as e:
+                outcomes.append(("error", e, []))
+                continue
+            if results is not None:
+                outcomes.append(("results", results, []))
+                continue
+            # All work items are submitted before waiting for any of them,
+            # so that the pool checks several models at once.
+            pending = dmc.submit_common_requirements(
+                pool, threads=pool.size, consistency_checks=consistency_checks, timeout=50, engine=Engine.NATIVE
+            )
+            pending_by_model[doml_xmi] = pending
+            outcomes.append(("pending", pending, keys))
+    except PoolFull as e:
+        for pending in pending_by_model.values():
+            pending.cancel()
+        return make_error("The model checker is overloaded, please try again later.", debug_msg=str(e)), 503
+
     try:
-        dmc = ModelChecker(doml_xmi)
-        results = dmc.check_common_requirements(threads=2, consistency_checks=False, timeout=50)
-        res, msg = results.summarize()
+        wait(
+            [future for pending in pending_by_model.values() for future in pending.futures],
+            timeout=max((pending.remaining() for pending in pending_by_model.values()), default=0) + RESULT_GRACE
+        )
+    finally:
+        for pending in pending_by_model.values():
+            pending.cancel()
 
-        if res == MCResult.sat:
-            return {"result": "sat"}
+    response = []
+    merged: dict[int, MCResults] = {}
+    for (name, _), (kind, outcome, keys) in zip(items, outcomes):
+        if kind == "error":
+            response.append({"name": name, "error": make_error(
+                "The supplied DOMLX model is malformed or its DOML version is unsupported.", debug_msg=str(outcome)
+            )})
+            continue
+        if kind == "results":
+            results, cache_status = outcome, "HIT"
         else:
-            return {"result": res.name,
-                    "description": msg}
+            try:
+                if id(outcome) not in merged:
+                    merged[id(outcome)] = outcome.result() if outcome.done() else outcome.timed_out()
+                results = merged[id(outcome)]
+            except Exception as e:
+                response.append({"name": name, "error": make_error(
+                    "An error occurred while checking the model.", debug_msg=str(e)
+                )})
+                continue
+            cache_status = "MISS"
+            if cache and is_cacheable(results):
+                for key in keys:
+                    cache.put(key, results)
+        current_app.config["METRICS"].record(results, cache_status)
+        item_response = {"name": name, "cache": cache_status} | make_result(results)
+        if profile:
+            item_response["profile"] = results.profile.to_dict()
+        response.append(item_response)
+    return {"results": response}, 200
+
+
+def check_job(app, job: Job):
+    """Checks the model of `job`, within its deadline. Run by the `JobQueue` of `app`."""
+    with app.app_context():
+        cache = current_app.config["RESULT_CACHE"]
+        results, dmc, keys = lookup_results(job.xmi_model, cache)
+        if results is None:
+            pool = current_app.config["WORKER_POOL"]
+            pending = dmc.submit_common_requirements(
+                pool, threads=pool.size, consistency_checks=current_app.config["CONSISTENCY_CHECKS"],
+                timeout=max(job.remaining(), 0.001), engine=Engine.NATIVE
+            )
+            try:
+                completed = job.wait_futures(pending.futures)
+            finally:
+                pending.cancel()
+            results = pending.result() if completed else pending.timed_out()
+            cache_status = "MISS"
+            if cache and is_cacheable(results):
+                for key in keys:
+                    cache.put(key, results)
+        else:
+            cache_status = "HIT"
+        current_app.config["METRICS"].record(results, cache_status)
+        return results
+
+
+def expired_job(app, job: Job):
+    """
+    The results of `job` if its deadline passed before it started: all its
+    requirements timed out. Run by the `JobQueue` of `app`.
+    """
+    with app.app_context():
+        doml_version = infer_domlx_version(job.xmi_model)
+        reqs = get_requirements(doml_version, current_app.config["CONSISTENCY_CHECKS"]).get_all_requirements()
+        return unchecked_results([req.assert_name for req in reqs])
+
+
+def make_job(job: Job, profile=False):
+    response = {"job": job.id, "state": job.state.name}
+    if job.state == JobState.done:
+        response |= make_result(job.results)
+        if profile:
+            response["profile"] = job.results.profile.to_dict()
+    elif job.state == JobState.failed:
+        response["error"] = make_error(
+            "The supplied DOMLX model is malformed or its DOML version is unsupported.", debug_msg=job.error
+        )
+    return response
+
 
+def post_job(body):
+    try:
+        infer_domlx_version(body)
     except Exception as e:
         return make_error("The supplied DOMLX model is malformed or its DOML version is unsupported.", debug_msg=str(e)), 400
+
+    try:
+        job = current_app.config["JOBS"].submit(body)
+    except JobQueueFull as e:
+        return make_error("The model checker is overloaded, please try again later.", debug_msg=str(e)), 503
+    return make_job(job), 202, {"Location": f"/jobs/{job.id}"}
+
+
+def get_job(job_id, wait=0, profile=False):
+    job = current_app.config["JOBS"].get(job_id)
+    if job is None:
+        return make_error(f"Job {job_id} does not exist or has expired."), 404
+    if wait > 0:
+        job.wait(min(wait, MAX_JOB_WAIT))
+    return make_job(job, profile), 200
+
+
+def delete_job(job_id):
+    if not current_app.config["JOBS"].cancel(job_id):
+        return make_error(f"Job {job_id} does not exist or has expired."), 404
+    return None, 204
+
+
+def post_session(body):
+    try:
+        session = CheckSession(
+            body, consistency_checks=current_app.config["CONSISTENCY_CHECKS"], timeout=50, engine=Engine.NATIVE
+        )
+    except MalformedModel as e:
+        return make_error("The supplied DOMLX model is malformed or its DOML version is unsupported.", debug_msg=str(e)), 400
+    except Exception as e:
+        return make_error("An error occurred while checking the model.", debug_msg=str(e)), 500
+
+    current_app.config["SESSIONS"].add(session)
+    current_app.config["METRICS"].record(session.checked, "MISS")
+    return make_result(session.results) | {"session": session.id}, 201
+
+
+def put_session(session_id, body):
+    session = current_app.config["SESSIONS"].get(session_id)
+    if session is None:
+        return make_error(f"Session {session_id} does not exist or has expired."), 404
+
+    try:
+        with session.lock:
+            results = session.update(body)
+            checked = session.checked
+            rechecked = list(session.rechecked)
+    except MalformedModel as e:
+        return make_error("The supplied DOMLX model is malformed or its DOML version is unsupported.", debug_msg=str(e)), 400
+    except Exception as e:
+        return make_error("An error occurred while checking the model.", debug_msg=str(e)), 500
+
+    current_app.config["METRICS"].record(checked, "MISS")
+    return make_result(results) | {"session": session_id, "rechecked": rechecked}, 200
+
+
+def delete_session(session_id):
+    if not current_app.config["SESSIONS"].remove(session_id):
+        return make_error(f"Session {session_id} does not exist or has expired."), 404
+    return None, 204
+
+
+def get_metrics():
+    return current_app.config["METRICS"].render(), 200, {"Content-Type": "text/plain; version=0.0.4"}
@@ -0,0 +1,107 @@
+import threading
+from collections import Counter
+
+from .doml_mc.mc_result import MCResult, MCResults
+
+
+def _labels(**labels: str) -> str:
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class Metrics:
+    """
+    Aggregates the model checking activity of this server process,
+    and renders it in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checks: Counter[tuple[str, str]] = Counter()
+        self.phase_seconds: Counter[str] = Counter()
+        self.phase_count: Counter[str] = Counter()
+        self.requirement_seconds: Counter[tuple[str, str]] = Counter()
+        self.requirement_count: Counter[tuple[str, str]] = Counter()
+        self.requirement_results: Counter[tuple[str, str]] = Counter()
+        # Definitive answers by requirement and solver configuration,
+        # i.e., the wins of each configuration of a portfolio.
+        self.solver_wins: Counter[tuple[str, str]] = Counter()
+        self.z3_conflicts: Counter[str] = Counter()
+        self.z3_quant_instantiations: Counter[str] = Counter()
+        self.z3_max_memory = 0.0
+
+    def record(self, results: MCResults, cache: str):
+        """Records a /modelcheck request, `cache` being HIT or MISS."""
+        res, _ = results.summarize()
+        profile = results.profile
+        with self.lock:
+            self.checks[res.name, cache] += 1
+            for phase, time in profile.phases.items():
+                self.phase_seconds[phase] += time
+                self.phase_count[phase] += 1
+            for req in profile.requirements:
+                self.requirement_seconds[req.name, req.engine] += req.time
+                self.requirement_count[req.name, req.engine] += 1
+                self.z3_conflicts[req.name] += req.statistics.get("conflicts", 0)
+                self.z3_quant_instantiations[req.name] += req.statistics.get("quant instantiations", 0)
+                self.z3_max_memory = max(self.z3_max_memory, req.statistics.get("max memory", 0.0))
+            # Results and profiles are only aligned if no check timed out.
+            if len(profile.requirements) == len(results.results):
+                for req, (req_res, _) in zip(profile.requirements, results.results):
+                    self.requirement_results[req.name, req_res.name] += 1
+                    if req.solver and req_res != MCResult.dontknow:
+                        self.solver_wins[req.name, req.solver] += 1
+
+    def render(self) -> str:
+        lines = []
+
+        def metric(name: str, type_: str, help: str, samples: list[tuple[str, str, float]]):
+            """`samples` are (name suffix, labels, value) triples."""
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {type_}")
+            lines.extend(f"{name}{suffix}{labels} {value}" for suffix, labels, value in samples)
+
+        def summary(sums: Counter, counts: Counter, label_names: tuple[str, ...]) -> list[tuple[str, str, float]]:
+            samples = []
+            for key, total in sums.items():
+                labels = _labels(**dict(zip(label_names, key if isinstance(key, tuple) else (key,))))
+                samples.append(("_sum", labels, total))
+                samples.append(("_count", labels, counts[key]))
+            return samples
+
+        with self.lock:
+            metric(
+                "mc_checks_total", "counter", "Model checking requests by result and cache outcome.",
+                [("", _labels(result=res, cache=cache), n) for (res, cache), n in self.checks.items()]
+            )
+            metric(
+                "mc_phase_seconds", "summary", "Time spent parsing and encoding models.",
+                summary(self.phase_seconds, self.phase_count, ("phase",))
+            )
+            metric(
+                "mc_requirement_seconds", "summary", "Time spent checking each requirement.",
+                summary(self.requirement_seconds, self.requirement_count, ("requirement", "engine"))
+            )
+            metric(
+                "mc_requirement_results_total", "counter", "Results of each requirement.",
+                [("", _labels(requirement=req, result=res), n) for (req, res), n in self.requirement_results.items()]
+            )
+            metric(
+                "mc_solver_wins_total", "counter", "Definitive Z3 answers of each requirement by solver configuration.",
+                [("", _labels(requirement=req, solver=solver), n) for (req, solver), n in self.solver_wins.items()]
+            )
+            metric(
+                "mc_z3_conflicts_total", "counter", "Conflicts found by Z3 while checking each requirement.",
+                [("", _labels(requirement=req), n) for req, n in self.z3_conflicts.items()]
+            )
+            metric(
+                "mc_z3_quant_instantiations_total", "counter", "Quantifier instantiations made by Z3 while checking each requirement.",
+                [("", _labels(requirement=req), n) for req, n in self.z3_quant_instantiations.items()]
+            )
+            metric(
+                "mc_z3_max_memory_megabytes", "gauge", "Maximum memory used by Z3.",
+                [("", "", self.z3_max_memory)]
+            )
+        return "\n".join(lines) + "\n"
@@ -1,7 +1,32 @@
+from benchmarks.generator import ModelSize, generate_model
 from mc_openapi import __version__
+from mc_openapi.handlers import expired_job
 from mc_openapi.doml_mc.common_reqs import CommonRequirements
-from mc_openapi.doml_mc import DOMLVersion
+from mc_openapi.doml_mc import DOMLVersion, MCResult, ModelChecker
+from mc_openapi.doml_mc.imc import AssociationEncoding, AttributeEncoding, Engine, IntermediateModelChecker, RequirementStore
+from mc_openapi.doml_mc.intermediate_model.doml_element import DOMLElement
+from mc_openapi.doml_mc.jobs import JobQueue, JobState
+from mc_openapi.doml_mc.mc import get_requirements, schedule_reqs
+from mc_openapi.doml_mc.portfolio import get_solver_configs
+from mc_openapi.doml_mc.requirement_costs import requirement_costs
+from mc_openapi.doml_mc.worker_pool import WorkerPool
+from mc_openapi.doml_mc.z3encoding.grounding import GroundingError
+from mc_openapi.doml_mc.session import CheckSession
+from mc_openapi.doml_mc.intermediate_model import metamodel
+from mc_openapi.doml_mc.intermediate_model.metamodel import MetaModels, get_metamodel_bundle, metamodel_digest, read_metamodel_doc
+from mc_openapi.doml_mc.xmi_parser.doml_model import EClassIndices, XMIParser, doml_rsets
+from mc_openapi.doml_mc.xmi_parser.special_parsers import SpecialParsers
+from concurrent.futures import wait
+from flask import Flask
+from functools import partial
+import glob
+import json
+import os
+import pytest
 import requests
+import threading
+import time
+import uuid
 
 
 def test_version():
@@ -53,6 +78,510 @@ def test_post_common_reqs_V2_0():
         assert err_desc in payload["description"]
 
 
+def test_post_result_cache_V2_0():
+    with open("tests/doml/v2.0/nginx-openstack_v2.0_wrong_vm_iface.domlx", "r") as f:
+        doml = f.read()
+
+    first = requests.post("http://0.0.0.0:8080/modelcheck", data=doml)
+    second = requests.post("http://0.0.0.0:8080/modelcheck", data=doml)
+    assert first.status_code == second.status_code == requests.codes.ok
+    assert second.headers["X-Cache"] == "HIT"
+    assert first.json() == second.json()
+
+
+def test_post_result_cache_reformatted_V2_0():
+    with open("tests/doml/v2.0/nginx-openstack_v2.0_wrong_iface_uniq.domlx", "r") as f:
+        doml = f.read()
+
+    first = requests.post("http://0.0.0.0:8080/modelcheck", data=doml)
+    second = requests.post("http://0.0.0.0:8080/modelcheck", data=doml.replace("  ", "\t"))
+    assert first.status_code == second.status_code == requests.codes.ok
+    assert second.headers["X-Cache"] == "HIT"
+    assert first.json() == second.json()
+
+
+def test_session_V2_0():
+    with open("tests/doml/v2.0/nginx-openstack_v2.0.domlx", "r") as f:
+        doml = f.read()
+    with open("tests/doml/v2.0/nginx-openstack_v2.0_wrong_iface_uniq.domlx", "r") as f:
+        wrong_doml = f.read()
+
+    r = requests.post("http://0.0.0.0:8080/sessions", data=doml)
+    assert r.status_code == requests.codes.created
+    session_id = r.json()["session"]
+    assert r.json()["result"] == "sat"
+
+    r = requests.put(f"http://0.0.0.0:8080/sessions/{session_id}", data=wrong_doml)
+    payload = r.json()
+    assert r.status_code == requests.codes.ok
+    assert payload["result"] == "unsat"
+    assert "share the same IP address." in payload["description"]
+    assert "iface_uniq" in payload["rechecked"]
+
+    r = requests.put(f"http://0.0.0.0:8080/sessions/{session_id}", data="<not a model/>")
+    assert r.status_code == requests.codes.bad_request
+    r = requests.put(f"http://0.0.0.0:8080/sessions/{session_id}", data=wrong_doml)
+    assert r.status_code == requests.codes.ok
+    assert r.json()["result"] == "unsat"
+    assert r.json()["rechecked"] == []
+
+    r = requests.delete(f"http://0.0.0.0:8080/sessions/{session_id}")
+    assert r.status_code == requests.codes.no_content
+    r = requests.put(f"http://0.0.0.0:8080/sessions/{session_id}", data=doml)
+    assert r.status_code == requests.codes.not_found
+
+
+def test_session_profile_V2_0():
+    with open("tests/doml/v2.0/nginx-openstack_v2.0.domlx", "rb") as f:
+        doml = f.read()
+    with open("tests/doml/v2.0/nginx-openstack_v2.0_wrong_iface_uniq.domlx", "rb") as f:
+        wrong_doml = f.read()
+
+    session = CheckSession(doml, timeout=50, engine=Engine.NATIVE)
+    assert session.imc is None
+    results = session.update(wrong_doml)
+    names = [req.assert_name for req in session.req_store.get_all_requirements()]
+    assert [req.name for req in results.profile.requirements] == names
+    assert [req.name for req in session.checked.profile.requirements] == session.rechecked
+
+
+def test_post_stream_V2_0():
+    with open("tests/doml/v2.0/nginx-openstack_v2.0_wrong_all_infrastructure_elements_deployed.domlx", "r") as f:
+        doml = f.read()
+
+    r = requests.post(
+        "http://0.0.0.0:8080/modelcheck", data=doml,
+        headers={"Accept": "application/x-ndjson"}, stream=True
+    )
+    assert r.status_code == requests.codes.ok
+    records = [json.loads(line) for line in r.iter_lines() if line]
+    assert {rec["type"] for rec in records[:-1]} == {"requirement"}
+    assert len(records) - 1 == len(CommonRequirements[DOMLVersion.V2_0].get_all_requirements())
+    assert any(rec["result"] == "unsat" for rec in records[:-1])
+    assert records[-1]["type"] == "summary"
+    assert records[-1]["result"] == "unsat"
+
+    r = requests.post(
+        "http://0.0.0.0:8080/modelcheck", data=doml,
+        headers={"Accept": "text/event-stream"}
+    )
+    assert r.status_code == requests.codes.ok
+    assert r.headers["Content-Type"].startswith("text/event-stream")
+    assert r.text.startswith("event: requirement\ndata: ")
+    assert "event: summary\ndata: " in r.text
+
+
+def test_post_stream_profile_V2_0():
+    with open("tests/doml/v2.0/faas.domlx", "r") as f:
+        # A model never checked before by the server, so that the first check is not cached.
+        doml = f.read().replace('name="web"', f'name="web_{uuid.uuid4().hex}"')
+
+    for cache_status in ["MISS", "HIT"]:
+        r = requests.post(
+            "http://0.0.0.0:8080/modelcheck", params={"profile": "true"}, data=doml,
+            headers={"Accept": "application/x-ndjson"}
+        )
+        assert r.status_code == requests.codes.ok
+        assert r.headers["X-Cache"] == cache_status
+        records = [json.loads(line) for line in r.text.splitlines() if line]
+        assert records[-1]["type"] == "summary"
+        requirements = records[:-1]
+        assert len(requirements) == len(CommonRequirements[DOMLVersion.V2_0].get_all_requirements())
+        if cache_status == "MISS":
+            assert all(rec["profile"]["name"] == rec["requirement"] for rec in requirements)
+        else:
+            assert all("profile" not in rec for rec in requirements)
+
+
+def test_fail_fast_V2_0():
+    with open("tests/doml/v2.0/nginx-openstack_v2.0_wrong_vm_iface.domlx", "rb") as f:
+        doml = f.read()
+
+    dmc = ModelChecker(doml, DOMLVersion.V2_0)
+    results = dmc.check_common_requirements(fail_fast=True)
+    assert results.summarize()[0] == MCResult.unsat
+    assert [res for res, _ in results.results].count(MCResult.unsat) == 1
+    assert len(results.results) == len(results.profile.requirements)
+
+    r = requests.post("http://0.0.0.0:8080/modelcheck", params={"fail_fast": "true"}, data=doml)
+    payload = r.json()
+    assert r.status_code == requests.codes.ok
+    assert payload["result"] == "unsat"
+    assert "is connected to no network interface." in payload["description"]
+
+
+def test_cancel_interrupts_workers_V2_0():
+    # Checking this requirement on such a model takes Z3 several seconds.
+    doml = generate_model(DOMLVersion.V2_0, ModelSize.from_elements(100))
+    dmc = ModelChecker(doml, DOMLVersion.V2_0)
+    engine = {req.assert_name: Engine.NATIVE for req in CommonRequirements[DOMLVersion.V2_0].get_all_requirements()}
+    engine["software_package_iface_net"] = Engine.Z3
+
+    pool = WorkerPool(size=1)
+    try:
+        pending = dmc.submit_common_requirements(pool, engine=engine)
+        time.sleep(1)
+        pending.cancel()
+        _, not_done = wait(pending.futures, timeout=5)
+        assert not not_done
+        assert pending.cancel_flag.is_set()
+        results = pending.timed_out()
+        assert results.timed_out_requirements() == ["software_package_iface_net"]
+    finally:
+        pool.shutdown()
+
+
+def test_deadline_keeps_partial_results_V2_0():
+    with open("tests/doml/v2.0/nginx-openstack_v2.0_wrong_vm_iface.domlx", "rb") as f:
+        doml = f.read()
+
+    # The budget is over before any requirement is checked with Z3.
+    dmc = ModelChecker(doml, DOMLVersion.V2_0)
+    results = dmc.check_common_requirements(timeout=0.001, engine={"vm_iface": Engine.NATIVE})
+    res, msg = results.summarize()
+    assert res == MCResult.unsat
+    assert "is connected to no network interface." in msg
+    assert "Timed out: unable to check requirements" in msg
+    assert "iface_uniq" in results.timed_out_requirements()
+    assert "vm_iface" not in results.timed_out_requirements()
+
+    # Requirements left are labelled with the engine selected for them.
+    for engine in [Engine.SAT, Engine.DATALOG]:
+        results = dmc.check_common_requirements(timeout=0.001, engine=engine)
+        assert {req.engine for req in results.profile.requirements} == {engine.value}
+
+
+def loaded_versions():
+    # Without loading the missing entries of the lazy dicts.
+    return [set(dict.keys(d)) for d in [MetaModels, doml_rsets, SpecialParsers, EClassIndices]]
+
+
+def test_worker_pool_warm_up():
+    pool = WorkerPool(size=1)
+    try:
+        assert pool.submit(loaded_versions).result() == [set(DOMLVersion)] * 4
+    finally:
+        pool.shutdown()
+
+
+def test_worker_pool_recycling():
+    pool = WorkerPool(size=1, max_tasks_per_worker=2)
+    try:
+        pids = []
+        for _ in range(4):
+            pids.append(pool.submit(os.getpid).result())
+            # The worker is replaced by the callback of its last task.
+            time.sleep(0.2)
+        assert pids[0] == pids[1] != pids[2] == pids[3]
+    finally:
+        pool.shutdown()
+
+
+def test_threads_V2_0():
+    with open("tests/doml/v2.0/nginx-openstack_v2.0_wrong_vm_iface.domlx", "rb") as f:
+        doml = f.read()
+
+    dmc = ModelChecker(doml, DOMLVersion.V2_0)
+    expected = dmc.check_common_requirements(threads=1)
+    results = dmc.check_common_requirements(threads=2)
+    assert results.results == expected.results
+    assert [req.name for req in results.profile.requirements] == [req.name for req in expected.profile.requirements]
+
+    # Requirements left at the deadline are named, the others keep their result.
+    results = dmc.check_common_requirements(threads=2, timeout=0.001, engine={"vm_iface": Engine.NATIVE})
+    assert len(results.results) == len(expected.results)
+    assert "iface_uniq" in results.timed_out_requirements()
+    assert "vm_iface" not in results.timed_out_requirements()
+
+
+def test_portfolio_V2_0():
+    with open("tests/doml/v2.0/nginx-openstack_v2.0_wrong_vm_iface.domlx", "rb") as f:
+        doml = f.read()
+
+    expected = ModelChecker(doml, DOMLVersion.V2_0).check_common_requirements(threads=1).summarize()
+    dmc = ModelChecker(doml, DOMLVersion.V2_0, portfolio=get_solver_configs(["default", "no_mbqi"]))
+    results = dmc.check_common_requirements(threads=1)
+    assert results.summarize() == expected
+    solvers = {req.solver for req in results.profile.requirements if req.engine == "z3"}
+    assert solvers and solvers <= {"default", "no_mbqi"}
+    # The threads racing the configurations end with the check.
+    assert not [thread for thread in threading.enumerate() if thread.name.startswith("mc-portfolio")]
+
+
+def test_sat_engine_V2_0():
+    for name in ["nginx-openstack_v2.0_wrong_iface_uniq", "nginx-openstack_v2.0_wrong_software_package_iface_net"]:
+        with open(f"tests/doml/v2.0/{name}.domlx", "rb") as f:
+            doml = f.read()
+
+        dmc = ModelChecker(doml, DOMLVersion.V2_0)
+        expected = dmc.check_common_requirements(consistency_checks=True)
+        results = dmc.check_common_requirements(consistency_checks=True, engine=Engine.SAT)
+        assert results.results == expected.results
+        assert {req.engine for req in results.profile.requirements} == {"sat"}
+
+
+def test_interrupt_stops_grounding_V2_0():
+    with open("tests/doml/v2.0/nginx-openstack_v2.0_wrong_iface_uniq.domlx", "rb") as f:
+        doml = f.read()
+
+    dmc = ModelChecker(doml)
+    imc = IntermediateModelChecker(dmc.metamodel, dmc.inv_assoc, dmc.intermediate_model)
+    req = next(req for req in CommonRequirements[DOMLVersion.V2_0].get_all_requirements() if req.assert_name == "iface_uniq")
+    imc.interrupt()
+    (res, _), profile = imc.check_sat_requirement(req)
+    assert res == MCResult.dontknow and profile.engine == "sat"
+    # Checks started afterwards are not interrupted.
+    results = imc.check_requirements(RequirementStore([req]), engine=Engine.SAT)
+    assert results.summarize()[0] == MCResult.unsat
+
+
+def test_datalog_engine_V2_0():
+    for name in ["nginx-openstack_v2.0_wrong_iface_uniq", "nginx-openstack_v2.0_wrong_software_package_iface_net"]:
+        with open(f"tests/doml/v2.0/{name}.domlx", "rb") as f:
+            doml = f.read()
+
+        dmc = ModelChecker(doml, DOMLVersion.V2_0)
+        expected = dmc.check_common_requirements(consistency_checks=True)
+        results = dmc.check_common_requirements(consistency_checks=True, engine=Engine.DATALOG)
+        assert results.results == expected.results
+        assert {req.engine for req in results.profile.requirements} == {"datalog"}
+
+    # Values unknown to the compiler make the check fall back to Z3.
+    imc = IntermediateModelChecker(dmc.metamodel, dmc.inv_assoc, dmc.intermediate_model)
+    imc.check_requirements(CommonRequirements[DOMLVersion.V2_0], engine=Engine.DATALOG)
+    with pytest.raises(GroundingError):
+        imc.datalog.value(-1)
+
+
+def test_max_violations_V2_0():
+    with open("tests/doml/v2.0/faas.domlx", "rb") as f:
+        # Also leaves image_resize undeployed, besides notification.
+        doml = f.read().replace(b'<deployments component="//@application/@components.0" node="//@infrastructure/@faas.0"/>', b"")
+    dmc = ModelChecker(doml, DOMLVersion.V2_0)
+
+    def check_deployed(**kwargs):
+        results = dmc.check_common_requirements(**kwargs)
+        return next(
+            (result, req) for req, result in zip(results.profile.requirements, results.results)
+            if req.name == "all_SoftwareComponents_deployed"
+        )
+
+    (res, msg), _ = check_deployed()
+    assert res == MCResult.unsat and msg.count("is not deployed") == 1
+    for engine in [Engine.NATIVE, Engine.Z3, Engine.SAT, Engine.DATALOG]:
+        (res, msg), req = check_deployed(engine=engine, max_violations=10)
+        assert res == MCResult.unsat
+        assert "'image_resize' is not deployed" in msg and "'notification' is not deployed" in msg
+        assert req.statistics["violations"] == 2
+
+
+def test_schedule_reqs():
+    # More workers than requirements never checked before: one task each.
+    names = ["sched_a", "sched_b", "sched_c"]
+    assert sorted(schedule_reqs(names, 8)) == [[0], [1], [2]]
+
+    for name, time in zip(names, [2.0, 0.01, 0.02]):
+        requirement_costs.record(name, time, MCResult.sat)
+    tasks = schedule_reqs(names + ["sched_new"], 2)
+    # New requirements come first, then by decreasing time, cheap ones together.
+    assert tasks == [[3], [0], [2, 1]]
+
+
+def test_post_batch_V2_0():
+    batch = []
+    for name in ["nginx-openstack_v2.0", "nginx-openstack_v2.0_wrong_vm_iface", "nginx-openstack_v2.0"]:
+        with open(f"tests/doml/v2.0/{name}.domlx", "r") as f:
+            batch.append(json.dumps({"name": name, "model": f.read()}))
+    batch.append(json.dumps({"name": "malformed", "model": "<doml"}))
+
+    r = requests.post(
+        "http://0.0.0.0:8080/modelcheck/batch", data="\n".join(batch),
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert r.status_code == requests.codes.ok
+    results = r.json()["results"]
+    assert [res["name"] for res in results] == [
+        "nginx-openstack_v2.0", "nginx-openstack_v2.0_wrong_vm_iface", "nginx-openstack_v2.0", "malformed"
+    ]
+    assert results[0]["result"] == results[2]["result"] == "sat"
+    assert results[1]["result"] == "unsat"
+    assert "error" in results[3]
+
+    r = requests.post(
+        "http://0.0.0.0:8080/modelcheck/batch", data="not json",
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert r.status_code == requests.codes.bad_request
+
+
+def test_jobs_V2_0():
+    with open("tests/doml/v2.0/nginx-openstack_v2.0_wrong_software_package_iface_net.domlx", "r") as f:
+        doml = f.read()
+
+    r = requests.post("http://0.0.0.0:8080/jobs", data=doml)
+    assert r.status_code == requests.codes.accepted
+    job_id = r.json()["job"]
+    assert r.headers["Location"] == f"/jobs/{job_id}"
+
+    r = requests.get(f"http://0.0.0.0:8080/jobs/{job_id}", params={"wait": 30})
+    payload = r.json()
+    assert r.status_code == requests.codes.ok
+    assert payload["state"] == "done"
+    assert payload["result"] == "unsat"
+
+    r = requests.delete(f"http://0.0.0.0:8080/jobs/{job_id}")
+    assert r.status_code == requests.codes.no_content
+    r = requests.get(f"http://0.0.0.0:8080/jobs/{job_id}")
+    assert r.status_code == requests.codes.not_found
+
+    r = requests.post("http://0.0.0.0:8080/jobs", data="<doml")
+    assert r.status_code == requests.codes.bad_request
+
+
+def test_expired_job_V2_0():
+    with open("tests/doml/v2.0/nginx-openstack_v2.0.domlx", "rb") as f:
+        doml = f.read()
+
+    app = Flask(__name__)
+    app.config["CONSISTENCY_CHECKS"] = False
+    # Jobs are past their deadline as soon as they are submitted.
+    jobs = JobQueue(lambda job: pytest.fail("expired job was run"), partial(expired_job, app), workers=1, deadline=0)
+    job = jobs.submit(doml)
+    assert job.wait(10)
+    assert job.state == JobState.done
+    names = [req.assert_name for req in CommonRequirements[DOMLVersion.V2_0].get_all_requirements()]
+    assert [res for res, _ in job.results.results] == [MCResult.dontknow] * len(names)
+    assert job.results.timed_out_requirements() == names
+
+
+def test_post_profile_V2_0():
+    with open("tests/doml/v2.0/nginx-openstack_v2.0_wrong_all_concrete_map_something.domlx", "r") as f:
+        doml = f.read()
+
+    r = requests.post("http://0.0.0.0:8080/modelcheck", params={"profile": "true"}, data=doml)
+    payload = r.json()
+    assert r.status_code == requests.codes.ok
+    assert payload["result"] == "unsat"
+    assert "profile" in payload
+
+    r = requests.get("http://0.0.0.0:8080/metrics")
+    assert r.status_code == requests.codes.ok
+    assert 'mc_checks_total{result="unsat"' in r.text
+
+
+def test_profile_V2_0():
+    with open("tests/doml/v2.0/nginx-openstack_v2.0.domlx", "rb") as f:
+        doml = f.read()
+
+    results = ModelChecker(doml).check_common_requirements(engine={"vm_iface": Engine.NATIVE})
+    profile = results.profile
+    assert {"parse", "encode_classes", "encode_attributes", "encode_associations"} <= profile.phases.keys()
+    assert profile.assertions > 0
+    assert [req.name for req in profile.requirements] == \
+        [req.assert_name for req in CommonRequirements[DOMLVersion.V2_0].get_all_requirements()]
+    assert profile.requirements[0].engine == "native"
+    assert all("conflicts" in req.statistics for req in profile.requirements[1:])
+
+
+def test_sparse_association_encoding_V2_0():
+    for req in CommonRequirements[DOMLVersion.V2_0].get_all_requirements():
+        with open(f"tests/doml/v2.0/nginx-openstack_v2.0_wrong_{req.assert_name}.domlx", "rb") as f:
+            doml = f.read()
+
+        dmc = ModelChecker(doml)
+        results = [
+            IntermediateModelChecker(dmc.metamodel, dmc.inv_assoc, dmc.intermediate_model, enc)
+            .check_requirements(CommonRequirements[DOMLVersion.V2_0]).results
+            for enc in AssociationEncoding
+        ]
+        assert [res for res, _ in results[0]] == [res for res, _ in results[1]]
+
+
+def test_table_attribute_encoding_V2_0():
+    for req in CommonRequirements[DOMLVersion.V2_0].get_all_requirements():
+        with open(f"tests/doml/v2.0/nginx-openstack_v2.0_wrong_{req.assert_name}.domlx", "rb") as f:
+            doml = f.read()
+
+        dmc = ModelChecker(doml)
+        results = [
+            IntermediateModelChecker(dmc.metamodel, dmc.inv_assoc, dmc.intermediate_model, attr_encoding=enc)
+            .check_requirements(CommonRequirements[DOMLVersion.V2_0]).results
+            for enc in AttributeEncoding
+        ]
+        assert results[0] == results[1]
+
+
+def test_requirement_expressions_cached_V2_0():
+    with open("tests/doml/v2.0/nginx-openstack_v2.0_wrong_iface_uniq.domlx", "rb") as f:
+        doml = f.read()
+
+    dmc = ModelChecker(doml)
+    assert get_requirements(dmc.doml_version, True) is get_requirements(dmc.doml_version, True)
+    imc = IntermediateModelChecker(dmc.metamodel, dmc.inv_assoc, dmc.intermediate_model)
+    reqs = get_requirements(dmc.doml_version, True)
+    first = imc.check_requirements(reqs)
+    expressions = [imc.requirement_expression(req) for req in reqs.get_all_requirements()]
+    assert imc.check_requirements(reqs).results == first.results
+    assert all(imc.requirement_expression(req) is e for req, e in zip(reqs.get_all_requirements(), expressions))
+
+
+def test_native_engine_V2_0():
+    for req in CommonRequirements[DOMLVersion.V2_0].get_all_requirements():
+        with open(f"tests/doml/v2.0/nginx-openstack_v2.0_wrong_{req.assert_name}.domlx", "rb") as f:
+            doml = f.read()
+
+        dmc = ModelChecker(doml)
+        z3_results = dmc.check_common_requirements(engine=Engine.Z3)
+        native_results = dmc.check_common_requirements(engine=Engine.NATIVE)
+        assert z3_results.results == native_results.results
+
+
+def test_streaming_parser():
+    for path in glob.glob("tests/doml/**/*.domlx", recursive=True):
+        with open(path, "rb") as f:
+            doml = f.read()
+
+        pyecore_im = ModelChecker(doml, parser=XMIParser.PYECORE).intermediate_model
+        streaming_im = ModelChecker(doml, parser=XMIParser.STREAMING).intermediate_model
+        assert list(streaming_im.items()) == list(pyecore_im.items())
+
+
+def test_metamodel_bundle():
+    bundle = get_metamodel_bundle()
+    for ver in DOMLVersion:
+        assert bundle[ver.value][0] == metamodel_digest(read_metamodel_doc(ver)), \
+            "Stale bundle: run python -m mc_openapi.doml_mc.intermediate_model.bundle"
+
+
+def test_truncated_metamodel_bundle(monkeypatch):
+    ver = DOMLVersion.V2_0
+    digest, pickled = get_metamodel_bundle()[ver.value]
+    monkeypatch.setattr(metamodel, "_bundle", {ver.value: (digest, pickled[:len(pickled) // 2])})
+    expected = MetaModels[ver]
+    metamodel.load_metamodel(ver)
+    assert MetaModels[ver] == expected
+
+
+def test_native_consistency_V2_0():
+    with open("tests/doml/v2.0/nginx-openstack_v2.0.domlx", "rb") as f:
+        doml = f.read()
+
+    dmc = ModelChecker(doml)
+    im = dmc.intermediate_model
+    # Break the inverse of some association and the type of some attribute.
+    ename, e = next((n, e) for n, e in im.items() if "infrastructure_NetworkInterface::belongsTo" in e.associations)
+    im[ename] = DOMLElement(ename, e.class_, e.attributes | {"commons_DOMLElement::name": [42]}, {}, e.user_friendly_name)
+
+    imc = IntermediateModelChecker(dmc.metamodel, dmc.inv_assoc, im)
+    reqs = get_requirements(dmc.doml_version, True)
+    z3_results = imc.check_requirements(reqs, engine=Engine.Z3)
+    native_results = imc.check_requirements(reqs, engine=Engine.NATIVE)
+    assert z3_results.results == native_results.results
+    assert [req.engine for req in native_results.profile.requirements] == ["native"] * len(reqs)
+    assert "Attribute name from class commons_DOMLElement has a type different from String." in \
+        [msg for _, msg in native_results.results]
+
+
 # V2_1 tests
 def test_post_nginx_sat_V2_1():
     with open("tests/doml/v2.1/nginx-aws-ec2.domlx", "r") as f: